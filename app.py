@@ -4,20 +4,61 @@ bike4mind addon for Home Assistant
 Translates OpenAI Chat Completion API to bike4mind quest polling API
 """
 
+import asyncio
 import os
+import sys
 import time
 import json
 import re
 import uuid
-from typing import Optional, Dict, List, Any, Set
+import gzip
+import hashlib
+import heapq
+import itertools
+import random
+import bisect
+import mmap
+import queue
+import logging
+import logging.handlers
+import contextvars
+import contextlib
+import threading
+import socket
+import sqlite3
+import abc
+import concurrent.futures
+from collections import OrderedDict, deque
+from typing import Optional, Dict, List, Any, Set, Callable, AsyncIterator
 from datetime import datetime, timedelta
+from json.encoder import encode_basestring_ascii
 
 import httpx
 from fastapi import FastAPI, HTTPException, Request, Depends, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse
+from fastapi.responses import StreamingResponse, JSONResponse, HTMLResponse, PlainTextResponse, Response, RedirectResponse
 from fastapi.exceptions import RequestValidationError
 from pydantic import BaseModel, ValidationError
 
+try:
+    import websockets  # Installed with uvicorn[standard]; only needed for quest_completion_mode=websocket
+except ImportError:
+    websockets = None
+
+try:
+    import h2  # httpx[http2]; bike4mind requests fall back to HTTP/1.1 without it
+except ImportError:
+    h2 = None
+
+try:
+    import orjson  # Optional faster JSON encoder for chat responses; the stdlib one is used without it
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # Optional; /visual is served gzip-compressed without it
+except ImportError:
+    brotli = None
+
 # Configuration from environment variables
 B4M_API_KEY = os.environ.get('B4M_API_KEY')
 HA_B4M_SESSION_ID = os.environ.get('HA_B4M_SESSION_ID')
@@ -29,12 +70,80 @@ SHIM_API_KEY = os.environ.get('SHIM_API_KEY')
 # Session management
 SESSION_TTL_SEC = int(os.environ.get('SESSION_TTL_SEC', '600'))  # 10 minutes
 MAX_TURNS = int(os.environ.get('MAX_TURNS', '20'))
+SESSION_MAX_ENTRIES = int(os.environ.get('SESSION_MAX_ENTRIES', '10000'))
+SESSION_SWEEP_SEC = int(os.environ.get('SESSION_SWEEP_SEC', '30'))
+SESSION_SNAPSHOT_PATH = os.environ.get('SESSION_SNAPSHOT_PATH', '')  # e.g. /data/shim_sessions.json
+
+# bike4mind session pool (opt-in): one upstream session per shim session instead of HA_B4M_SESSION_ID for all
+SESSION_POOL_SIZE = int(os.environ.get('SESSION_POOL_SIZE', '0'))  # ready sessions kept; 0 disables the pool
+SESSION_POOL_DELETE_RETIRED = os.environ.get('SESSION_POOL_DELETE_RETIRED', 'true').lower() == 'true'
+
+# Conversation context: history depth and reply length per quest
+CONTEXT_MODE = os.environ.get('CONTEXT_MODE', 'budget').lower()  # fixed, budget or summary
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', '2000'))  # prompt + history + reply
+
+# Quest journal (opt-in): prompts, poll timelines and replies for warm restarts and replay
+QUEST_JOURNAL_PATH = os.environ.get('QUEST_JOURNAL_PATH', '')  # e.g. /data/quest_journal.jsonl
+QUEST_JOURNAL_MAX_MB = int(os.environ.get('QUEST_JOURNAL_MAX_MB', '8'))
 
 # Performance tuning
 TIMEOUT_MS = int(os.environ.get('TIMEOUT_MS', '60000'))  # 60 seconds
 POLL_INTERVAL_MS = int(os.environ.get('POLL_INTERVAL_MS', '1500'))  # 1.5 seconds
 POLL_MAX_INTERVAL_MS = int(os.environ.get('POLL_MAX_INTERVAL_MS', '5000'))  # 5 seconds
 
+# Quest completion settings
+# poll = fixed interval with 1.2x backoff, adaptive = learned per-model schedule,
+# longpoll/sse/websocket = push-style where the backend offers it (falls back to adaptive)
+QUEST_COMPLETION_MODE = os.environ.get('QUEST_COMPLETION_MODE', 'adaptive').lower()
+QUEST_EVENTS_URL = os.environ.get('QUEST_EVENTS_URL', '')  # e.g. {base}/sessions/{session_id}/chat/{quest_id}/events
+QUEST_LONGPOLL_WAIT_SEC = int(os.environ.get('QUEST_LONGPOLL_WAIT_SEC', '20'))
+ADAPTIVE_DENSE_INTERVAL_MS = int(os.environ.get('ADAPTIVE_DENSE_INTERVAL_MS', '250'))
+QUEST_POLL_RATE = float(os.environ.get('QUEST_POLL_RATE', '10'))  # status GETs per second, all quests
+QUEST_POLL_CONCURRENCY = int(os.environ.get('QUEST_POLL_CONCURRENCY', '4'))
+
+# Upstream resilience (retries, hedging, circuit breaker)
+B4M_RETRIES = int(os.environ.get('B4M_RETRIES', '2'))
+B4M_RETRY_BASE_MS = int(os.environ.get('B4M_RETRY_BASE_MS', '250'))
+B4M_HEDGE_ENABLED = os.environ.get('B4M_HEDGE_ENABLED', 'false').lower() == 'true'
+B4M_HEDGE_MIN_MS = int(os.environ.get('B4M_HEDGE_MIN_MS', '500'))
+B4M_BREAKER_ERROR_RATE = float(os.environ.get('B4M_BREAKER_ERROR_RATE', '0.5'))
+B4M_BREAKER_MIN_REQUESTS = int(os.environ.get('B4M_BREAKER_MIN_REQUESTS', '5'))
+B4M_BREAKER_WINDOW_SEC = float(os.environ.get('B4M_BREAKER_WINDOW_SEC', '30'))
+B4M_BREAKER_COOLDOWN_SEC = float(os.environ.get('B4M_BREAKER_COOLDOWN_SEC', '30'))
+B4M_FALLBACK_REPLY = os.environ.get(
+    'B4M_FALLBACK_REPLY', "Sorry, I can't reach bike4mind right now. Please try again in a minute."
+)
+
+# Streaming settings
+STREAM_PARTIAL_REPLIES = os.environ.get('STREAM_PARTIAL_REPLIES', 'true').lower() == 'true'
+STREAM_POLL_INTERVAL_MS = int(os.environ.get('STREAM_POLL_INTERVAL_MS', '400'))
+
+# Speculative quest creation (start the quest before the full history is validated)
+SPECULATIVE_QUESTS = os.environ.get('SPECULATIVE_QUESTS', 'false').lower() == 'true'
+SPECULATIVE_THREAD_MIN_BYTES = int(os.environ.get('SPECULATIVE_THREAD_MIN_BYTES', '65536'))
+
+# Response cache settings (opt-in)
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'false').lower() == 'true'
+RESPONSE_CACHE_TTL_SEC = int(os.environ.get('RESPONSE_CACHE_TTL_SEC', '300'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', str(1024 * 1024)))
+RESPONSE_CACHE_BYPASS_PATTERN = os.environ.get(
+    'RESPONSE_CACHE_BYPASS_PATTERN',
+    r'\b(time|date|today|tonight|tomorrow|yesterday|now|current|currently|latest|news|weather|forecast|timer|remind)\b'
+)
+
+# Upstream connection pools
+B4M_HTTP2 = os.environ.get('B4M_HTTP2', 'true').lower() == 'true'
+B4M_POOL_SIZE = int(os.environ.get('B4M_POOL_SIZE', '10'))
+B4M_KEEPALIVE_SEC = float(os.environ.get('B4M_KEEPALIVE_SEC', '60'))
+HA_POOL_SIZE = int(os.environ.get('HA_POOL_SIZE', '4'))
+HA_KEEPALIVE_SEC = float(os.environ.get('HA_KEEPALIVE_SEC', '30'))
+UPSTREAM_PRECONNECT = os.environ.get('UPSTREAM_PRECONNECT', 'true').lower() == 'true'
+
+# Multi-worker mode: uvicorn worker processes sharing sessions, rate limits and VISUAL_ASSIST state
+WORKERS = int(os.environ.get('WORKERS', '1'))
+SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH', '/tmp/b4m_shared_state.db')  # e.g. /data/b4m_shared_state.db
+
 # Integration settings
 HA_TOOL_FUNCTION_NAME = os.environ.get('HA_TOOL_FUNCTION_NAME', 'homeassistant.call_service')
 
@@ -43,6 +152,10 @@ VISUAL_ASSIST_ENABLED = os.environ.get('VISUAL_ASSIST_ENABLED', 'false').lower()
 VISUAL_ASSIST_THINKING_GIF_URL = os.environ.get('VISUAL_ASSIST_THINKING_GIF_URL', '')
 VISUAL_ASSIST_SPEAKING_GIF_URL = os.environ.get('VISUAL_ASSIST_SPEAKING_GIF_URL', '')
 VISUAL_ASSIST_IDLE_GIF_URL = os.environ.get('VISUAL_ASSIST_IDLE_GIF_URL', '')
+VISUAL_ASSIST_CLIENT_QUEUE = max(1, int(os.environ.get('VISUAL_ASSIST_CLIENT_QUEUE', '1')))  # unsent frames kept per client (at least 1)
+VISUAL_ASSIST_SEND_TIMEOUT_SEC = float(os.environ.get('VISUAL_ASSIST_SEND_TIMEOUT_SEC', '5'))
+VISUAL_ASSIST_ASSET_CACHE = os.environ.get('VISUAL_ASSIST_ASSET_CACHE', 'true').lower() == 'true'  # serve GIFs locally
+VISUAL_ASSIST_ASSET_DIR = os.environ.get('VISUAL_ASSIST_ASSET_DIR', '/tmp/b4m_visual_assets')  # e.g. /data/visual_assets
 
 # EXTROVERT settings
 EXTROVERT_ENABLED = os.environ.get('EXTROVERT_ENABLED', 'false').lower() == 'true'
@@ -51,57 +164,1261 @@ EXTROVERT_HA_TOKEN = os.environ.get('EXTROVERT_HA_TOKEN', os.environ.get('SUPERV
 EXTROVERT_RATE_LIMIT = int(os.environ.get('EXTROVERT_RATE_LIMIT', '10'))
 EXTROVERT_TTS_ENTITY_ID = os.environ.get('EXTROVERT_TTS_ENTITY_ID', 'tts.piper')
 EXTROVERT_TTS_VOICE = os.environ.get('EXTROVERT_TTS_VOICE', '')
+EXTROVERT_QUEUE_SIZE = int(os.environ.get('EXTROVERT_QUEUE_SIZE', '20'))
+EXTROVERT_CONCURRENCY = int(os.environ.get('EXTROVERT_CONCURRENCY', '2'))
+EXTROVERT_JOB_HISTORY = int(os.environ.get('EXTROVERT_JOB_HISTORY', '100'))
+EXTROVERT_TTS_PIPELINE = os.environ.get('EXTROVERT_TTS_PIPELINE', 'false').lower() == 'true'
+
+# Scheduled EXTROVERT prompts: quests run ahead of their cron time and triggers are answered from the result
+EXTROVERT_SCHEDULE_PATH = os.environ.get('EXTROVERT_SCHEDULE_PATH', '')  # e.g. /data/extrovert_schedules.json
+EXTROVERT_SCHEDULE_LEAD_SEC = float(os.environ.get('EXTROVERT_SCHEDULE_LEAD_SEC', '300'))  # default per prompt
+EXTROVERT_SCHEDULE_MAX_AGE_SEC = float(os.environ.get('EXTROVERT_SCHEDULE_MAX_AGE_SEC', '1800'))  # default per prompt
+EXTROVERT_SCHEDULE_STAGGER_SEC = float(os.environ.get('EXTROVERT_SCHEDULE_STAGGER_SEC', '15'))  # between quest starts
+
+# Playback events: one Home Assistant WebSocket subscription to media_player states (at EXTROVERT_HA_URL)
+HA_PLAYBACK_EVENTS = os.environ.get('HA_PLAYBACK_EVENTS', 'true').lower() == 'true'
+HA_WEBSOCKET_URL = os.environ.get('HA_WEBSOCKET_URL', '')  # derived from EXTROVERT_HA_URL when empty
+VISUAL_ASSIST_MEDIA_PLAYERS = [p.strip() for p in os.environ.get('VISUAL_ASSIST_MEDIA_PLAYERS', '').split(',')
+                               if p.strip()]  # players that speak chat replies (voice satellites)
+
+# Local intent fast path (uses the HA API at EXTROVERT_HA_URL for the entity index)
+INTENT_FASTPATH_ENABLED = os.environ.get('INTENT_FASTPATH_ENABLED', 'false').lower() == 'true'
+INTENT_MIN_CONFIDENCE = float(os.environ.get('INTENT_MIN_CONFIDENCE', '0.8'))
+INTENT_REFRESH_SEC = int(os.environ.get('INTENT_REFRESH_SEC', '300'))
+
+# Logging
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'info').upper()
+LOG_MODULE_LEVELS = os.environ.get('LOG_MODULE_LEVELS', '')  # e.g. "quest=debug,tts=warning"
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_POLL_SAMPLE = int(os.environ.get('LOG_POLL_SAMPLE', '10'))
 
 # Initialize FastAPI
-app = FastAPI(title="bike4mind addon", version="1.3.17")
+app = FastAPI(title="bike4mind addon", version="1.4.25")
+
+# Structured logging
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def log_fields(**fields: Any) -> Dict[str, Any]:
+    """`extra=` payload for structured key/value fields on a log record"""
+    return {"fields": fields}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the current request ID and sample high-frequency messages
+
+    Records logged with `extra={"sample": "<key>"}` pass only once every
+    LOG_POLL_SAMPLE calls per key. Runs on the logging thread's caller, i.e.
+    the event loop, so the context variable is still visible.
+    """
+
+    def __init__(self, sample_every: int):
+        super().__init__()
+        self.sample_every = max(sample_every, 1)
+        self.sample_counts: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample_key = getattr(record, "sample", None)
+        if sample_key is not None:
+            count = self.sample_counts.get(sample_key, 0)
+            self.sample_counts[sample_key] = count + 1
+            if count % self.sample_every:
+                return False
+            record.sampled = self.sample_every
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if getattr(record, "sampled", None):
+            entry["sampled"] = record.sampled
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextLogFormatter(logging.Formatter):
+    """Human-readable line: message followed by key=value fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [record.getMessage()]
+        if getattr(record, "request_id", None):
+            parts.append(f"request_id={record.request_id}")
+        parts.extend(f"{key}={value}" for key, value in (getattr(record, "fields", None) or {}).items())
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class BackgroundLogHandler(logging.handlers.QueueHandler):
+    """Formats on the caller, writes on a QueueListener thread so slow log pipes never block the loop"""
+
+    def __init__(self, stream, formatter: logging.Formatter):
+        super().__init__(queue.SimpleQueue())
+        self.setFormatter(formatter)
+        writer = logging.StreamHandler(stream)
+        writer.setFormatter(logging.Formatter("%(message)s"))
+        self.listener = logging.handlers.QueueListener(self.queue, writer)
+        self.listener.start()
+        self.listening = True
+
+    def close(self):
+        # Also called by logging.config.dictConfig (e.g. uvicorn startup); stop() flushes the queue
+        if self.listening:
+            self.listening = False
+            self.listener.stop()
+        super().close()
+
+
+def setup_logging(stream=None):
+    """Route every `b4m.*` logger through one background handler"""
+    root = logging.getLogger("b4m")
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    formatter = TextLogFormatter() if LOG_FORMAT == "text" else JsonLogFormatter()
+    handler = BackgroundLogHandler(stream or sys.stdout, formatter)
+    handler.addFilter(RequestContextFilter(LOG_POLL_SAMPLE))
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for item in filter(None, (part.strip() for part in LOG_MODULE_LEVELS.split(","))):
+        module, _, level = item.partition("=")
+        logging.getLogger(f"b4m.{module.strip()}").setLevel(level.strip().upper())
+
+
+setup_logging()
+log = logging.getLogger("b4m.app")
+session_log = logging.getLogger("b4m.session")
+quest_log = logging.getLogger("b4m.quest")
+intent_log = logging.getLogger("b4m.intent")
+tts_log = logging.getLogger("b4m.tts")
+extrovert_log = logging.getLogger("b4m.extrovert")
+
+
+# Metrics
+class Counter:
+    """Monotonic counter, optionally split by one label
+
+    All updates happen on the event loop thread, so plain increments are
+    safe without locks.
+    """
+
+    def __init__(self, name: str, help_text: str, label: Optional[str] = None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.values: Dict[Optional[str], float] = {}
+
+    def inc(self, label_value: Optional[str] = None, amount: float = 1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        if not self.values and self.label is None:
+            lines.append(f"{self.name} 0")
+        for label_value, value in sorted(self.values.items(), key=lambda item: item[0] or ""):
+            labels = f'{{{self.label}="{label_value}"}}' if self.label else ""
+            lines.append(f"{self.name}{labels} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is one bisect and three additions"""
+
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005, 0.01)
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> "HistogramTimer":
+        return HistogramTimer(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound:g}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum:.6f}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class HistogramTimer:
+    """Context manager that observes elapsed seconds, also on exceptions"""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+    """Process-wide metrics, rendered in the Prometheus text format at /metrics"""
+
+    def __init__(self):
+        self.auth_seconds = Histogram(
+            "shim_auth_seconds", "Time spent checking the shim API key", Histogram.FAST_BUCKETS)
+        self.quest_create_seconds = Histogram(
+            "b4m_quest_create_seconds", "bike4mind quest creation request latency")
+        self.quest_first_poll_seconds = Histogram(
+            "b4m_quest_first_poll_seconds", "Time from quest creation to its first status check")
+        self.quest_polls = Histogram(
+            "b4m_quest_polls", "Status checks needed per polled quest", (1, 2, 3, 5, 8, 13, 21, 34, 55))
+        self.quest_seconds = Histogram(
+            "b4m_quest_seconds", "Time from quest creation until its reply is available")
+        self.tool_call_extract_seconds = Histogram(
+            "shim_tool_call_extract_seconds", "Time spent extracting tool calls from a reply", Histogram.FAST_BUCKETS)
+        self.tts_seconds = Histogram(
+            "ha_tts_seconds", "Home Assistant TTS service call latency")
+        self.broadcast_seconds = Histogram(
+            "visual_broadcast_seconds", "VISUAL_ASSIST state broadcast fan-out time", Histogram.FAST_BUCKETS)
+        self.visual_frames = Counter(
+            "visual_frames_total", "VISUAL_ASSIST frames per client: sent, coalesced (dropped as stale) or failed", "result")
+        self.playback_waits = Counter(
+            "tts_playback_waits_total", "Waits for speech to end: event (media_player went idle), estimate "
+            "(no playback events) or timeout", "outcome")
+        self.extrovert_schedule = Counter(
+            "extrovert_schedule_total", "Scheduled EXTROVERT prompts: run or run_failed (quests run ahead), "
+            "hit, stale or not_ready (triggers)", "event")
+        self.visual_responses = Counter(
+            "visual_responses_total", "/visual page and asset responses: sent, not_modified or redirect", "result")
+        self.timeouts = Counter(
+            "shim_timeouts_total", "Upstream timeouts", "upstream")
+        self.responses = Counter(
+            "shim_http_responses_total", "HTTP responses sent, by status class", "code")
+        self.cache_lookups = Counter(
+            "shim_cache_lookups_total", "Response cache lookups", "result")
+        self.rate_limited = Counter(
+            "shim_rate_limited_total", "Requests rejected by a rate limit", "endpoint")
+        self.speculative_quests = Counter(
+            "shim_speculative_quests_total", "Quests started before body validation", "result")
+        self.resilience = Counter(
+            "b4m_resilience_events_total", "bike4mind retries, hedges and circuit breaker events", "event")
+        self.quest_history_turns = Histogram(
+            "b4m_quest_history_turns", "History turns sent with each quest (historyCount or summarized)",
+            (0, 1, 2, 4, 6, 10))
+        self.quest_context = Counter(
+            "b4m_quest_context_total", "Quests created, by prompt kind", "kind")
+        self.tool_call_blocks = Counter(
+            "shim_tool_call_blocks_total", "JSON blocks in replies that held tool calls or failed to decode", "result")
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in vars(self).values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class RequestContextMiddleware:
+    """Pure ASGI middleware: assigns the request ID and counts responses by status class
+
+    The ID comes from an incoming X-Request-ID header or is generated, is
+    echoed back on the response, and is visible to every log record written
+    while handling the request (including tasks it spawns).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:12]
+        token = request_id_var.set(request_id)
+
+        async def send_with_context(message):
+            if message["type"] == "http.response.start":
+                metrics.responses.inc(f"{message['status'] // 100}xx")
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_context)
+        finally:
+            request_id_var.reset(token)
+
+
+app.add_middleware(RequestContextMiddleware)
+
+# HTTP clients: one pool per upstream so slow TTS calls can't starve quest polls
+http_client: Optional[httpx.AsyncClient] = None  # bike4mind
+ha_client: Optional[httpx.AsyncClient] = None  # Home Assistant supervisor
+
+
+class PoolStats:
+    """Connection-pool wait time per upstream, measured with httpcore trace events
+
+    Wait is the time from handing the request to the client until it either
+    starts connecting (new connection) or starts sending headers on a pooled
+    connection.
+    """
+
+    POOL_EVENTS = ("connection.connect_tcp.started", "http11.send_request_headers.started",
+                   "http2.send_request_headers.started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.requests = 0
+        self.new_connections = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.recent_waits: deque = deque(maxlen=512)
+        self.http_versions: Dict[str, int] = {}
+
+    async def on_request(self, request: httpx.Request):
+        requested = time.monotonic()
+        recorded = False
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            nonlocal recorded
+            if recorded or event_name not in self.POOL_EVENTS:
+                return
+            recorded = True
+            wait = time.monotonic() - requested
+            self.requests += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.recent_waits.append(wait)
+            if event_name.startswith("connection."):
+                self.new_connections += 1
+
+        request.extensions["trace"] = trace
+
+    async def on_response(self, response: httpx.Response):
+        version = response.http_version
+        self.http_versions[version] = self.http_versions.get(version, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        recent = sorted(self.recent_waits)
+
+        def pct(p: float) -> float:
+            return round(recent[min(int(p * len(recent)), len(recent) - 1)] * 1000, 2) if recent else 0.0
+
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "pool_wait_ms_avg": round(self.wait_total / self.requests * 1000, 2) if self.requests else 0.0,
+            "pool_wait_ms_p50": pct(0.5),
+            "pool_wait_ms_p95": pct(0.95),
+            "pool_wait_ms_max": round(self.wait_max * 1000, 2),
+            "http_versions": dict(self.http_versions),
+        }
+
+
+b4m_pool_stats = PoolStats("bike4mind")
+ha_pool_stats = PoolStats("home_assistant")
+
+
+def build_upstream_client(stats: PoolStats, pool_size: int, keepalive_sec: float,
+                          timeout: httpx.Timeout, http2: bool = False) -> httpx.AsyncClient:
+    """AsyncClient with its own bounded pool and pool-wait instrumentation"""
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_sec
+        ),
+        event_hooks={"request": [stats.on_request], "response": [stats.on_response]}
+    )
+
 
-# HTTP client
-http_client: Optional[httpx.AsyncClient] = None
+async def preconnect(client: httpx.AsyncClient, url: str, name: str, headers: Optional[Dict[str, str]] = None):
+    """Open a pooled connection at startup so the first real call skips DNS/TCP/TLS"""
+    started = time.monotonic()
+    try:
+        response = await client.get(url, headers=headers or {})
+        log.info(f"🔌 {name} pre-connected", extra=log_fields(
+            ms=round((time.monotonic() - started) * 1000), http_version=response.http_version,
+            status=response.status_code))
+    except httpx.HTTPError as e:
+        log.warning(f"⚠️ {name} pre-connect failed", extra=log_fields(error=f"{type(e).__name__}: {e}"))
+
+# Shared state (multi-worker mode)
+class SharedState(abc.ABC):
+    """State shared by the uvicorn worker processes; one instance per process
+
+    A backend provides shim session turns, token buckets, numbered slots
+    held by a live process, time-limited leases, a table of recent
+    EXTROVERT jobs and a pub/sub channel. Each operation is atomic across
+    processes. SQLiteSharedState covers workers on one host; a backend for
+    several hosts would implement the same abstract methods.
+
+    Operations may wait for other workers, so callers on the event loop go
+    through `run()` (or `publish_soon()` from synchronous code).
+    """
+
+    def __init__(self):
+        self.background: Set[asyncio.Task] = set()
+
+    async def run(self, operation: Callable[..., Any], *args) -> Any:
+        """Run a blocking operation off the event loop"""
+        return operation(*args)
+
+    def publish_soon(self, channel: str, message: Dict[str, Any]):
+        """publish() from synchronous code on the event loop; runs in the background, in call order"""
+        task = asyncio.create_task(self.run(self.publish, channel, message))
+        self.background.add(task)
+        task.add_done_callback(self._published)
+
+    def _published(self, task: asyncio.Task):
+        self.background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("⚠️ Shared state publish failed", extra=log_fields(error=repr(task.exception())))
+
+    @abc.abstractmethod
+    def session_turn(self, user_id: str, ttl_sec: float, max_turns: int,
+                     checkout: Optional[Callable[[], str]] = None) -> tuple:
+        """Count a turn, starting a new session if expired or at max_turns
+
+        A session without a bike4mind session gets one from `checkout` (which may return None).
+        Returns (turn_count, was_reset, bike4mind session, bike4mind session of the replaced session).
+        """
+
+    @abc.abstractmethod
+    def session_delete(self, user_id: str) -> tuple:
+        """Returns (deleted, its bike4mind session)"""
+
+    @abc.abstractmethod
+    def session_sweep(self, ttl_sec: float, max_entries: int) -> tuple:
+        """Drop expired sessions, then the least recently used beyond max_entries
+
+        Returns (expired, evicted, bike4mind sessions of the dropped sessions).
+        """
+
+    @abc.abstractmethod
+    def session_count(self) -> int:
+        """Number of live sessions"""
+
+    @abc.abstractmethod
+    def take_token(self, name: str, rate: float, capacity: float) -> tuple:
+        """Take one token from a bucket if there is one; returns (taken, tokens left)"""
+
+    @abc.abstractmethod
+    def acquire_slot(self, name: str, limit: int) -> Optional[int]:
+        """Lowest free slot below limit for this process, or None; slots of dead processes are reclaimed"""
+
+    @abc.abstractmethod
+    def release_slot(self, name: str, slot: int):
+        """Give back a slot taken with acquire_slot()"""
+
+    @abc.abstractmethod
+    def claim_lease(self, name: str, holder: str, seconds: float) -> float:
+        """Take or extend a lease for `seconds`; returns 0, or the seconds until another holder's lease ends"""
+
+    @abc.abstractmethod
+    def put_job(self, job_id: str, data: Dict[str, Any], keep: int):
+        """Store a job's status, keeping the `keep` most recently updated jobs"""
+
+    @abc.abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job's status as stored by any worker, or None"""
+
+    @abc.abstractmethod
+    def publish(self, channel: str, message: Dict[str, Any]):
+        """Send a message to the other workers' subscribers; the last message per channel is kept"""
+
+    @abc.abstractmethod
+    def subscribe(self, channel: str, callback: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        """Call `callback` on the event loop for messages from other workers; returns the last message"""
+
+    def reset(self):
+        """Forget slots and leases of a previous run (called once before the workers start)"""
+
+    def start(self):
+        """Begin receiving published messages (called on the worker's event loop)"""
+
+    def stop(self):
+        """Stop receiving and release this process's slots"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class SQLiteSharedState(SharedState):
+    """SharedState in a SQLite database (WAL), with unix datagram sockets for pub/sub
+
+    Each thread of each process opens its own connection. Operations are
+    short transactions; read-modify-write ones use BEGIN IMMEDIATE, so they
+    are serialized across workers and can wait up to 2 seconds for another
+    worker's write lock. Callers on the event loop go through `run()`, a
+    single thread per process, so that wait never blocks the loop; as it is
+    one thread, operations run in the order they were submitted. Every worker binds a socket in
+    `<path>.bus/`; publishing sends to each socket there except its own and
+    removes sockets nobody listens on (workers that died).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            user_id TEXT PRIMARY KEY, created REAL, last_access REAL, turn_count INTEGER, upstream TEXT);
+        CREATE INDEX IF NOT EXISTS sessions_by_created ON sessions (created);
+        CREATE INDEX IF NOT EXISTS sessions_by_access ON sessions (last_access);
+        CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL, updated REAL);
+        CREATE TABLE IF NOT EXISTS slots (name TEXT, slot INTEGER, pid INTEGER, PRIMARY KEY (name, slot));
+        CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT, until REAL);
+        CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT);
+        CREATE TABLE IF NOT EXISTS channels (name TEXT PRIMARY KEY, message TEXT);
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self.bus_dir = f"{path}.bus"
+        self.local = threading.local()
+        self.executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.executor_pid = 0
+        self.sock: Optional[socket.socket] = None
+        self.sock_path = ""
+        self.callbacks: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # A connection must not be shared with a forked child or between threads; each opens its own
+        if getattr(self.local, "pid", 0) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=2.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(self.SCHEMA)
+            if "upstream" not in [row[1] for row in db.execute("PRAGMA table_info(sessions)")]:
+                with contextlib.suppress(sqlite3.OperationalError):  # Another worker added it first
+                    db.execute("ALTER TABLE sessions ADD COLUMN upstream TEXT")  # Database of 1.4.17
+            self.local.db, self.local.pid = db, os.getpid()
+        return self.local.db
+
+    async def run(self, operation: Callable[..., Any], *args) -> Any:
+        if self.executor is None or self.executor_pid != os.getpid():
+            self.executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="shared-state")
+            self.executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, operation, *args)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def session_turn(self, user_id: str, ttl_sec: float, max_turns: int,
+                     checkout: Optional[Callable[[], str]] = None) -> tuple:
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT created, turn_count, upstream FROM sessions WHERE user_id = ?",
+                             (user_id,)).fetchone()
+            if row and now - row[0] <= ttl_sec and row[1] < max_turns:
+                upstream = row[2] or (checkout() if checkout else None)
+                db.execute("UPDATE sessions SET last_access = ?, turn_count = turn_count + 1, upstream = ? "
+                           "WHERE user_id = ?", (now, upstream, user_id))
+                return row[1] + 1, False, upstream, None
+            upstream = checkout() if checkout else None
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, 1, ?)", (user_id, now, now, upstream))
+            return 1, row is not None, upstream, row[2] if row else None
+
+    def session_delete(self, user_id: str) -> tuple:
+        rows = self._connect().execute("DELETE FROM sessions WHERE user_id = ? RETURNING upstream",
+                                       (user_id,)).fetchall()
+        return bool(rows), rows[0][0] if rows else None
+
+    def session_sweep(self, ttl_sec: float, max_entries: int) -> tuple:
+        with self._transaction() as db:
+            retired = [row[0] for row in db.execute(
+                "DELETE FROM sessions WHERE created < ? RETURNING upstream", (time.time() - ttl_sec,)).fetchall()]
+            expired = len(retired)
+            excess = db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - max_entries
+            evicted = 0
+            if excess > 0:
+                rows = db.execute(
+                    "DELETE FROM sessions WHERE user_id IN (SELECT user_id FROM sessions ORDER BY last_access LIMIT ?) "
+                    "RETURNING upstream", (excess,)).fetchall()
+                evicted = len(rows)
+                retired += [row[0] for row in rows]
+        return expired, evicted, retired
+
+    def session_count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def take_token(self, name: str, rate: float, capacity: float) -> tuple:
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(now - row[1], 0.0) * rate)
+            taken = tokens >= 1
+            if taken:
+                tokens -= 1
+            db.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (name, tokens, now))
+        return taken, tokens
+
+    def acquire_slot(self, name: str, limit: int) -> Optional[int]:
+        with self._transaction() as db:
+            taken = set()
+            for slot, pid in db.execute("SELECT slot, pid FROM slots WHERE name = ?", (name,)).fetchall():
+                if self._alive(pid):
+                    taken.add(slot)
+                else:
+                    db.execute("DELETE FROM slots WHERE name = ? AND slot = ?", (name, slot))
+            free = next((slot for slot in range(limit) if slot not in taken), None)
+            if free is not None:
+                db.execute("INSERT INTO slots VALUES (?, ?, ?)", (name, free, os.getpid()))
+        return free
+
+    def release_slot(self, name: str, slot: int):
+        self._connect().execute("DELETE FROM slots WHERE name = ? AND slot = ? AND pid = ?", (name, slot, os.getpid()))
+
+    def claim_lease(self, name: str, holder: str, seconds: float) -> float:
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute("SELECT holder, until FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != holder and row[1] > now:
+                return row[1] - now
+            db.execute("INSERT OR REPLACE INTO leases VALUES (?, ?, ?)", (name, holder, now + seconds))
+        return 0.0
+
+    def put_job(self, job_id: str, data: Dict[str, Any], keep: int):
+        with self._transaction() as db:
+            # REPLACE gives the row a new rowid, so the newest `keep` updates survive the trim
+            db.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?)", (job_id, json.dumps(data)))
+            db.execute("DELETE FROM jobs WHERE rowid <= (SELECT MAX(rowid) FROM jobs) - ?", (keep,))
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _peers(self) -> List[str]:
+        try:
+            return [os.path.join(self.bus_dir, name) for name in os.listdir(self.bus_dir) if name.endswith(".sock")]
+        except FileNotFoundError:
+            return []
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        self._connect().execute("INSERT OR REPLACE INTO channels VALUES (?, ?)", (channel, json.dumps(message)))
+        if self.sock is None:
+            return
+        data = json.dumps({"channel": channel, "message": message}).encode()
+        for path in self._peers():
+            if path == self.sock_path:
+                continue
+            try:
+                self.sock.sendto(data, path)
+                self.sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                with contextlib.suppress(OSError):
+                    os.unlink(path)
+            except BlockingIOError:
+                self.dropped += 1  # That worker's receive buffer is full
+
+    def subscribe(self, channel: str, callback: Callable[[Dict[str, Any]], None]) -> Optional[Dict[str, Any]]:
+        self.callbacks.setdefault(channel, []).append(callback)
+        row = self._connect().execute("SELECT message FROM channels WHERE name = ?", (channel,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _receive(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                envelope = json.loads(data)
+            except ValueError:
+                continue
+            self.received += 1
+            for callback in self.callbacks.get(envelope.get("channel"), []):
+                callback(envelope["message"])
+
+    def reset(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM slots")
+            db.execute("DELETE FROM leases")
+        for path in self._peers():
+            with contextlib.suppress(OSError):
+                os.unlink(path)
+
+    def start(self):
+        os.makedirs(self.bus_dir, exist_ok=True)
+        self.sock_path = os.path.join(self.bus_dir, f"{os.getpid()}.sock")
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.sock_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.sock_path)
+        self.sock.setblocking(False)
+        asyncio.get_running_loop().add_reader(self.sock.fileno(), self._receive)
+
+    def stop(self):
+        if self.sock:
+            asyncio.get_running_loop().remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+            with contextlib.suppress(OSError):
+                os.unlink(self.sock_path)
+        self._connect().execute("DELETE FROM slots WHERE pid = ?", (os.getpid(),))
+        if self.executor is not None and self.executor_pid == os.getpid():
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        db = self._connect()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": self.session_count(),
+            "slots": dict(db.execute("SELECT name, COUNT(*) FROM slots GROUP BY name").fetchall()),
+            "bus_peers": len(self._peers()),
+            "messages_sent": self.sent,
+            "messages_received": self.received,
+            "messages_dropped": self.dropped,
+        }
+
+
+shared_state: Optional[SharedState] = SQLiteSharedState(SHARED_STATE_PATH) if WORKERS > 1 else None
+worker_slot: Optional[int] = None  # This worker's number (0..WORKERS-1) in multi-worker mode
+
+# bike4mind session pool
+class B4MSessionPool:
+    """bike4mind sessions created ahead of time and handed out to shim sessions
+
+    A background task keeps `size` fresh sessions ready, so giving a new or
+    reset shim session its own upstream session never waits for bike4mind.
+    If the pool is empty (a burst of new users, or creation failing) that
+    turn goes to the shared HA_B4M_SESSION_ID and the shim session tries
+    again on its next turn. Sessions
+    of expired, reset or evicted shim sessions are retired and, unless
+    SESSION_POOL_DELETE_RETIRED is off, deleted upstream by the same task.
+    """
+
+    MAX_BACKOFF_SEC = 60.0
+
+    def __init__(self, size: int, delete_retired: bool):
+        self.size = size
+        self.delete_retired = delete_retired
+        self.ready: deque = deque()
+        self.retired: deque = deque()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.created = 0
+        self.create_failures = 0
+        self.checkouts = 0
+        self.fallbacks = 0
+        self.deleted = 0
+        self.delete_failures = 0
+
+    def checkout(self) -> Optional[str]:
+        """A fresh session for a shim session, or None if none is ready"""
+        self.wakeup.set()
+        if not self.ready:
+            self.fallbacks += 1
+            return None
+        self.checkouts += 1
+        return self.ready.popleft()
+
+    def retire(self, session_id: Optional[str]):
+        if session_id and session_id != HA_B4M_SESSION_ID:
+            self.retired.append(session_id)
+            self.wakeup.set()
+
+    def start(self):
+        self.task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            self.wakeup.clear()
+            while len(self.ready) < self.size:
+                # Refill the whole shortfall at once, so a burst of new users is covered quickly
+                results = await asyncio.gather(
+                    *(self._create() for _ in range(self.size - len(self.ready))), return_exceptions=True)
+                errors = [r for r in results if isinstance(r, BaseException)]
+                for result in results:
+                    if not isinstance(result, BaseException):
+                        self.ready.append(result)
+                        self.created += 1
+                for error in errors:
+                    if not isinstance(error, Exception):
+                        raise error  # Cancelled: the pool is stopping
+                if errors:
+                    self.create_failures += len(errors)
+                    session_log.warning("⚠️ bike4mind session creation failed", extra=log_fields(
+                        error=f"{type(errors[0]).__name__}: {errors[0]}", failed=len(errors), retry_sec=backoff))
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.MAX_BACKOFF_SEC)
+                else:
+                    backoff = 1.0
+            while self.retired:
+                session_id = self.retired.popleft()
+                if not self.delete_retired:
+                    continue
+                try:
+                    response = await http_client.delete(f"{B4M_BASE}/sessions/{session_id}", headers=b4m_headers())
+                    response.raise_for_status()
+                    self.deleted += 1
+                except Exception as e:  # Any failure would end the task, and with it the pool
+                    self.delete_failures += 1
+                    session_log.warning("⚠️ bike4mind session deletion failed", extra=log_fields(
+                        b4m_session=session_id, error=f"{type(e).__name__}: {e}"))
+            if len(self.ready) >= self.size:
+                await self.wakeup.wait()
+
+    async def _create(self) -> str:
+        response = await http_client.post(f"{B4M_BASE}/sessions", headers=b4m_headers(), json={
+            "name": f"Home Assistant {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+            "userId": B4M_USER_ID,
+        })
+        response.raise_for_status()
+        data = response.json()
+        session_id = data.get("_id") or data.get("id") or (data.get("session") or {}).get("_id") or \
+            (data.get("session") or {}).get("id")
+        if not session_id:
+            raise ValueError(f"no session ID in response: {str(data)[:200]}")
+        return session_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "ready": len(self.ready),
+            "created": self.created,
+            "create_failures": self.create_failures,
+            "checkouts": self.checkouts,
+            "fallbacks": self.fallbacks,
+            "retired_pending": len(self.retired),
+            "deleted": self.deleted,
+            "delete_failures": self.delete_failures,
+        }
+
+
+b4m_session_pool = B4MSessionPool(SESSION_POOL_SIZE, SESSION_POOL_DELETE_RETIRED) if SESSION_POOL_SIZE else None
 
 # Session tracking (internal shim sessions)
-shim_sessions: Dict[str, Dict[str, Any]] = {}
+class ShimSession:
+    """Per-user shim session; monotonic timestamps"""
+
+    __slots__ = ("user_id", "created", "last_access", "turn_count", "upstream_id")
+
+    def __init__(self, user_id: str, created: float):
+        self.user_id = user_id
+        self.created = created
+        self.last_access = created
+        self.turn_count = 0
+        self.upstream_id: Optional[str] = None  # bike4mind session from the pool
+
+
+class SessionStore:
+    """Bounded shim session store with TTL expiry and LRU eviction
+
+    Sessions live in an OrderedDict kept in access order, so the least
+    recently used session is evicted once max_entries is reached. Expiry
+    (created + ttl) is tracked in a heap drained by a background sweeper;
+    heap entries of replaced or evicted sessions are skipped lazily and the
+    heap is compacted when it grows past twice the live session count.
+    With a session pool, each session gets its own bike4mind session on its
+    first turn, and that session is retired whenever the shim session is
+    reset, evicted, expired or deleted.
+    """
+
+    def __init__(self, ttl_sec: float, max_turns: int, max_entries: int, pool: Optional[B4MSessionPool] = None):
+        self.ttl_sec = ttl_sec
+        self.max_turns = max_turns
+        self.max_entries = max_entries
+        self.pool = pool
+        self.sessions: "OrderedDict[str, ShimSession]" = OrderedDict()
+        self.expiry: List[tuple] = []  # (expires_at, created, user_id)
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self.sessions
+
+    def _retire(self, session: Optional[ShimSession]):
+        if session is not None and self.pool:
+            self.pool.retire(session.upstream_id)
+
+    def _create(self, user_id: str, created: float) -> ShimSession:
+        session = ShimSession(user_id, created)
+        self._retire(self.sessions.get(user_id))
+        self.sessions[user_id] = session
+        self.sessions.move_to_end(user_id)
+        heapq.heappush(self.expiry, (created + self.ttl_sec, created, user_id))
+        while len(self.sessions) > self.max_entries:
+            self._retire(self.sessions.popitem(last=False)[1])
+            self.evictions += 1
+        if len(self.expiry) > 2 * len(self.sessions) + 1024:
+            self._compact()
+        return session
+
+    def get_or_create(self, user_id: str) -> ShimSession:
+        now = time.monotonic()
+        session = self.sessions.get(user_id)
+        if session is None:
+            return self._create(user_id, now)
+        if now - session.created > self.ttl_sec or session.turn_count >= self.max_turns:
+            session_log.info("♻️ Session reset (TTL or turn limit)", extra=log_fields(user_id=user_id))
+            return self._create(user_id, now)
+        session.last_access = now
+        self.sessions.move_to_end(user_id)
+        return session
+
+    def record_turn(self, user_id: str) -> tuple:
+        """Count a turn; returns (turn_count, bike4mind session ID or None for the shared session)"""
+        session = self.get_or_create(user_id)
+        session.turn_count += 1
+        if self.pool and session.upstream_id is None:
+            session.upstream_id = self.pool.checkout()
+        return session.turn_count, session.upstream_id
+
+    def delete(self, user_id: str) -> bool:
+        session = self.sessions.pop(user_id, None)
+        self._retire(session)
+        return session is not None
+
+    def sweep(self) -> int:
+        """Drop expired sessions; returns how many were removed"""
+        now = time.monotonic()
+        removed = 0
+        while self.expiry and self.expiry[0][0] <= now:
+            _, created, user_id = heapq.heappop(self.expiry)
+            session = self.sessions.get(user_id)
+            if session is not None and session.created == created:
+                del self.sessions[user_id]
+                self._retire(session)
+                removed += 1
+        self.expirations += removed
+        return removed
+
+    def _compact(self):
+        self.expiry = [(s.created + self.ttl_sec, s.created, s.user_id) for s in self.sessions.values()]
+        heapq.heapify(self.expiry)
+
+    async def sweep_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+            if SESSION_SNAPSHOT_PATH:
+                await self.save_snapshot(SESSION_SNAPSHOT_PATH)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "saved_at": time.time(),
+            "sessions": [
+                {"user_id": s.user_id, "age": now - s.created, "idle": now - s.last_access, "turn_count": s.turn_count,
+                 "upstream_id": s.upstream_id}
+                for s in self.sessions.values()
+            ]
+        }
+
+    async def save_snapshot(self, path: str):
+        """Write sessions to disk (atomic replace) off the event loop"""
+        data = json.dumps(self.snapshot())
+
+        def write():
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as e:
+            session_log.warning("⚠️ Session snapshot failed", extra=log_fields(error=str(e)))
+
+    def load_snapshot(self, path: str):
+        """Restore sessions saved before a restart; downtime counts towards TTL"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            session_log.warning("⚠️ Session snapshot unreadable", extra=log_fields(error=str(e)))
+            return
+        now = time.monotonic()
+        downtime = max(time.time() - data.get("saved_at", time.time()), 0)
+        for entry in data.get("sessions", []):
+            age = entry["age"] + downtime
+            if age > self.ttl_sec:
+                continue
+            session = self._create(entry["user_id"], now - age)
+            session.last_access = now - entry["idle"] - downtime
+            session.turn_count = entry["turn_count"]
+            session.upstream_id = entry.get("upstream_id") if self.pool else None
+        session_log.info("💾 Restored shim sessions", extra=log_fields(count=len(self.sessions)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "max_entries": self.max_entries,
+            "expiry_heap": len(self.expiry),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            **({"upstream_pool": self.pool.stats()} if self.pool else {}),
+        }
+
+
+class SharedSessionStore:
+    """Shim sessions kept in the shared state backend (multi-worker mode)
+
+    Offers the SessionStore calls the request path and admin endpoints use.
+    Expiry and the max_entries bound are applied by the periodic sweep;
+    sessions persist in the backend, so there are no snapshots. A session's
+    bike4mind session is stored with it, so every worker uses the same one;
+    the worker that resets, sweeps or deletes the session retires it.
+    """
+
+    def __init__(self, state: SharedState, ttl_sec: float, max_turns: int, max_entries: int,
+                 pool: Optional[B4MSessionPool] = None):
+        self.state = state
+        self.ttl_sec = ttl_sec
+        self.max_turns = max_turns
+        self.max_entries = max_entries
+        self.pool = pool
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return self.state.session_count()
+
+    def _retire(self, upstream_ids: List[Optional[str]]):
+        if self.pool:
+            for upstream_id in upstream_ids:
+                self.pool.retire(upstream_id)
+
+    async def record_turn(self, user_id: str) -> tuple:
+        checkout = None
+        if self.pool:
+            loop = asyncio.get_running_loop()
+
+            def checkout() -> Optional[str]:
+                # Called in the shared state thread; the pool belongs to the event loop
+                result: concurrent.futures.Future = concurrent.futures.Future()
+                loop.call_soon_threadsafe(lambda: result.set_result(self.pool.checkout()))
+                return result.result()
+
+        turn_count, reset, upstream_id, retired = await self.state.run(
+            self.state.session_turn, user_id, self.ttl_sec, self.max_turns, checkout)
+        if reset:
+            session_log.info("♻️ Session reset (TTL or turn limit)", extra=log_fields(user_id=user_id))
+            self._retire([retired])
+        return turn_count, upstream_id
+
+    async def delete(self, user_id: str) -> bool:
+        deleted, retired = await self.state.run(self.state.session_delete, user_id)
+        self._retire([retired])
+        return deleted
+
+    async def sweep(self) -> int:
+        expired, evicted, retired = await self.state.run(self.state.session_sweep, self.ttl_sec, self.max_entries)
+        self.expirations += expired
+        self.evictions += evicted
+        self._retire(retired)
+        return expired
+
+    async def sweep_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            await self.sweep()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self),
+            "max_entries": self.max_entries,
+            "backend": "shared",
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            **({"upstream_pool": self.pool.stats()} if self.pool else {}),
+        }
+
+
+if shared_state:
+    shim_sessions = SharedSessionStore(shared_state, SESSION_TTL_SEC, MAX_TURNS, SESSION_MAX_ENTRIES, b4m_session_pool)
+else:
+    shim_sessions = SessionStore(SESSION_TTL_SEC, MAX_TURNS, SESSION_MAX_ENTRIES, b4m_session_pool)
 
 # VISUAL_ASSIST WebSocket connection manager
+class VisualClient:
+    """A /ws connection with its own sender task and a bounded queue of unsent frames
+
+    A pong owed for a ping is a flag rather than a queued frame, so it never
+    displaces a state change; it is sent after them, with the state current
+    at that point.
+    """
+
+    __slots__ = ("websocket", "pending", "pong", "wakeup", "task")
+
+    def __init__(self, websocket: WebSocket, depth: int):
+        self.websocket = websocket
+        self.pending: deque = deque(maxlen=depth)
+        self.pong = False
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def offer(self, frame: str) -> bool:
+        """Queue a frame; returns False if the oldest unsent frame was dropped for it"""
+        coalesced = len(self.pending) == self.pending.maxlen
+        self.pending.append(frame)
+        self.wakeup.set()
+        return not coalesced
+
+    def ping(self):
+        self.pong = True
+        self.wakeup.set()
+
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Set[WebSocket] = set()
+    """Fans state changes out to the /ws clients
+
+    Each frame is serialized once. Every client has a sender task that sends
+    from a queue of at most VISUAL_ASSIST_CLIENT_QUEUE frames; when a slow
+    client's queue is full the oldest frame is dropped, since only the
+    latest state matters. broadcast_state() only queues, so it never waits
+    for a client. A send that takes longer than VISUAL_ASSIST_SEND_TIMEOUT_SEC
+    disconnects that client.
+    """
+
+    def __init__(self, depth: int = 1, send_timeout: float = 5.0):
+        self.active_connections: Dict[WebSocket, VisualClient] = {}
         self.current_state: str = "idle"
+        self.current_frame = self.frame(self.current_state)
+        self.depth = depth
+        self.send_timeout = send_timeout
+
+    @staticmethod
+    def frame(state: str) -> str:
+        return json.dumps({"type": "state_change", "state": state, "timestamp": int(time.time())})
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.add(websocket)
+        client = VisualClient(websocket, self.depth)
+        self.active_connections[websocket] = client
         # Send current state to newly connected client
-        await websocket.send_json({
-            "type": "state_change",
-            "state": self.current_state,
-            "timestamp": int(time.time())
-        })
+        client.offer(self.current_frame)
+        client.task = asyncio.create_task(self._sender(client))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.discard(websocket)
-
-    async def broadcast_state(self, state: str):
+        client = self.active_connections.pop(websocket, None)
+        if client and client.task and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    def ping(self, websocket: WebSocket):
+        client = self.active_connections.get(websocket)
+        if client:
+            client.ping()
+
+    def follow(self, state: SharedState):
+        """Multi-worker mode: also deliver state changes published by the other workers"""
+        last = state.subscribe("visual_state", lambda message: self.deliver(message["state"], json.dumps(message)))
+        if last:
+            self.current_state = last["state"]
+            self.current_frame = json.dumps(last)
+
+    def broadcast_state(self, state: str):
+        frame = self.frame(state)
+        if shared_state:
+            shared_state.publish_soon("visual_state", json.loads(frame))
+        self.deliver(state, frame)
+
+    def deliver(self, state: str, frame: str):
+        """Queue a serialized state change for the clients connected to this worker"""
         self.current_state = state
-        message = {
-            "type": "state_change",
-            "state": state,
-            "timestamp": int(time.time())
-        }
-        # Send to all connected clients
-        disconnected = set()
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except:
-                disconnected.add(connection)
-        # Remove disconnected clients
-        self.active_connections -= disconnected
+        self.current_frame = frame
+        with metrics.broadcast_seconds.time():
+            for client in self.active_connections.values():
+                if not client.offer(frame):
+                    metrics.visual_frames.inc("coalesced")
 
-visual_assist_manager = ConnectionManager() if VISUAL_ASSIST_ENABLED else None
+    async def _sender(self, client: VisualClient):
+        try:
+            while True:
+                while not client.pending and not client.pong:
+                    client.wakeup.clear()
+                    await client.wakeup.wait()
+                state_change = bool(client.pending)
+                if state_change:
+                    frame = client.pending.popleft()
+                else:
+                    client.pong = False
+                    frame = json.dumps({"type": "pong", "state": self.current_state})
+                await asyncio.wait_for(client.websocket.send_text(frame), self.send_timeout)
+                if state_change:
+                    metrics.visual_frames.inc("sent")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.visual_frames.inc("failed")
+            log.debug("🔌 VISUAL_ASSIST client dropped", extra=log_fields(error=f"{type(e).__name__}: {e}"))
+            self.disconnect(client.websocket)
+            with contextlib.suppress(Exception):
+                await client.websocket.close()
 
-# EXTROVERT state tracking
-extrovert_busy: bool = False
-extrovert_request_times: List[float] = []
+visual_assist_manager = (ConnectionManager(VISUAL_ASSIST_CLIENT_QUEUE, VISUAL_ASSIST_SEND_TIMEOUT_SEC)
+                         if VISUAL_ASSIST_ENABLED else None)
 
 
 # Pydantic models
@@ -121,20 +1438,30 @@ class ExtrovertRequest(BaseModel):
     prompt: str
     context: Optional[Dict[str, Any]] = None
     tts_config: Optional[Dict[str, Any]] = None
+    priority: str = "normal"  # high, normal or low
+    wait: bool = False  # Block until spoken and return the result (pre-1.4.9 behaviour)
+    schedule: Optional[str] = None  # Scheduled prompt to answer from; matched by prompt text when not given
+
+
+class ExtrovertScheduleRequest(BaseModel):
+    prompt: str
+    cron: str  # When the automation fires, in local time: "0 7 * * *" is 7:00 every day
+    lead_sec: Optional[float] = None  # Run the quest this long before; EXTROVERT_SCHEDULE_LEAD_SEC by default
+    max_age_sec: Optional[float] = None  # Oldest result a trigger may use; EXTROVERT_SCHEDULE_MAX_AGE_SEC by default
 
 
 # Exception handlers
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    """Log validation errors with request body for debugging"""
-    try:
-        body = await request.body()
-        print(f"⚠️ EXTROVERT: Validation error (422)")
-        print(f"   Path: {request.url.path}")
-        print(f"   Received body: {body.decode('utf-8')}")
-        print(f"   Validation errors: {exc.errors()}")
-    except Exception as e:
-        print(f"⚠️ EXTROVERT: Validation error (422) - Could not log body: {e}")
+    """Log validation errors; the request body itself is only logged at debug level"""
+    errors = [{"loc": list(error.get("loc", ())), "msg": error.get("msg")} for error in exc.errors()]
+    log.warning("⚠️ Validation error (422)", extra=log_fields(path=request.url.path, errors=errors))
+    if log.isEnabledFor(logging.DEBUG):
+        try:
+            body = await request.body()
+            log.debug("Rejected request body", extra=log_fields(body=body[:1000].decode('utf-8', 'replace')))
+        except Exception as e:
+            log.debug("Could not read rejected request body", extra=log_fields(error=str(e)))
 
     return JSONResponse(
         status_code=422,
@@ -149,32 +1476,111 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 # Startup/shutdown handlers
 @app.on_event("startup")
 async def startup_event():
-    """Initialize HTTP client on startup"""
-    global http_client
-    http_client = httpx.AsyncClient(timeout=httpx.Timeout(15.0, connect=5.0))
-    print(f"🚀 bike4mind addon v{app.version} started")
-    print(f"   B4M Base: {B4M_BASE}")
-    print(f"   Session ID: {HA_B4M_SESSION_ID[:8]}..." if HA_B4M_SESSION_ID else "   ⚠️ No session ID configured")
-    print(f"   Auth: {'Enabled' if SHIM_API_KEY else 'Disabled (not recommended)'}")
-    print(f"   VISUAL_ASSIST: {'Enabled' if VISUAL_ASSIST_ENABLED else 'Disabled'}")
-    print(f"   EXTROVERT: {'Enabled' if EXTROVERT_ENABLED else 'Disabled'}")
+    """Initialize HTTP clients on startup"""
+    global http_client, ha_client, worker_slot, quest_journal
+    setup_logging()  # uvicorn's logging config closes handlers installed at import time
+    use_http2 = B4M_HTTP2 and h2 is not None
+    http_client = build_upstream_client(
+        b4m_pool_stats, B4M_POOL_SIZE, B4M_KEEPALIVE_SEC, httpx.Timeout(15.0, connect=5.0), http2=use_http2
+    )
+    ha_client = build_upstream_client(
+        ha_pool_stats, HA_POOL_SIZE, HA_KEEPALIVE_SEC, httpx.Timeout(10.0, connect=5.0)
+    )
+    log.info(f"🚀 bike4mind addon v{app.version} started", extra=log_fields(
+        b4m_base=B4M_BASE,
+        session_id=f"{HA_B4M_SESSION_ID[:8]}..." if HA_B4M_SESSION_ID else None,
+        auth=bool(SHIM_API_KEY),
+        visual_assist=VISUAL_ASSIST_ENABLED,
+        extrovert=EXTROVERT_ENABLED,
+        intent_fastpath=INTENT_FASTPATH_ENABLED,
+        b4m_pool=B4M_POOL_SIZE,
+        b4m_http_version="HTTP/2" if use_http2 else "HTTP/1.1",
+        workers=WORKERS,
+        session_pool=SESSION_POOL_SIZE,
+        json_encoder="orjson" if orjson is not None else "json",
+    ))
+    if not HA_B4M_SESSION_ID:
+        log.warning("⚠️ No session ID configured")
+    if not SHIM_API_KEY:
+        log.warning("⚠️ Auth disabled (not recommended)")
+    if B4M_HTTP2 and h2 is None:
+        log.warning("⚠️ HTTP/2 requested but the h2 package is not installed")
+    if SPECULATIVE_QUESTS and CONTEXT_MODE != "fixed":
+        log.warning("⚠️ speculative_quests has no effect unless context_mode is fixed")
+    if UPSTREAM_PRECONNECT:
+        asyncio.create_task(preconnect(http_client, B4M_BASE, "bike4mind"))
+        if EXTROVERT_ENABLED or INTENT_FASTPATH_ENABLED:
+            asyncio.create_task(preconnect(
+                ha_client, f"{EXTROVERT_HA_URL}/", "Home Assistant",
+                {"Authorization": f"Bearer {EXTROVERT_HA_TOKEN}"}
+            ))
+    if b4m_session_pool:
+        b4m_session_pool.start()  # Pre-creates the pool's sessions before the first new shim session needs one
+    if playback_monitor:
+        playback_monitor.start()
+    elif HA_PLAYBACK_EVENTS and (VISUAL_ASSIST_ENABLED or EXTROVERT_ENABLED):
+        tts_log.warning("⚠️ Playback events need the websockets package and a Home Assistant token; "
+                        "using estimated speech lengths")
+    if visual_idle:
+        visual_idle.start()
+    if shared_state:
+        shared_state.start()
+        worker_slot = await shared_state.run(shared_state.acquire_slot, "worker", WORKERS)
+        log.info("👥 Worker joined", extra=log_fields(worker=worker_slot, pid=os.getpid(), workers=WORKERS))
+        if visual_assist_manager:
+            visual_assist_manager.follow(shared_state)
+        if SESSION_SNAPSHOT_PATH:
+            session_log.warning("⚠️ Session snapshots are not used with multiple workers; sessions persist in "
+                                "SHARED_STATE_PATH")
+        if quest_journal and worker_slot is None:
+            quest_log.warning("⚠️ More processes than WORKERS; quest journal disabled in this one")
+            quest_journal = None
+        elif quest_journal and worker_slot:
+            # One journal per worker: worker 0 keeps the configured path, the others get -w<N> files
+            root, ext = os.path.splitext(QUEST_JOURNAL_PATH)
+            quest_journal.path = f"{root}-w{worker_slot}{ext}"
+    elif SESSION_SNAPSHOT_PATH:
+        shim_sessions.load_snapshot(SESSION_SNAPSHOT_PATH)
+    if quest_journal:
+        unfinished = await asyncio.to_thread(quest_journal.start)
+        for record in unfinished:
+            asyncio.create_task(resume_quest(record))
+        if unfinished:
+            quest_log.info("💾 Resuming unfinished quests", extra=log_fields(count=len(unfinished)))
+    asyncio.create_task(shim_sessions.sweep_loop(SESSION_SWEEP_SEC))
+    if intent_engine:
+        asyncio.create_task(intent_engine.refresh_loop())
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close HTTP client on shutdown"""
+    """Close HTTP clients on shutdown"""
     global http_client
+    await quest_multiplexer.stop()
+    if b4m_session_pool:
+        await b4m_session_pool.stop()
+    if visual_idle:
+        await visual_idle.stop()
+    if playback_monitor:
+        await playback_monitor.stop()
+    if SESSION_SNAPSHOT_PATH and not shared_state:
+        await shim_sessions.save_snapshot(SESSION_SNAPSHOT_PATH)
+    if shared_state:
+        shared_state.stop()
+    if quest_journal:
+        await asyncio.to_thread(quest_journal.stop)
+    if ha_client:
+        await ha_client.aclose()
     if http_client:
         await http_client.aclose()
-        print("🛑 bike4mind addon stopped")
+        log.info("🛑 bike4mind addon stopped")
+    for handler in logging.getLogger("b4m").handlers:
+        handler.close()
 
 
 # Authentication dependency
-async def verify_shim_auth(request: Request):
-    """Verify shim API key if configured"""
-    if not SHIM_API_KEY:
-        return  # Auth disabled
-
+def check_shim_key(request: Request):
+    """Raise 401 unless the request carries the shim API key"""
     # Check Authorization: Bearer header
     auth_header = request.headers.get('Authorization')
     if auth_header and auth_header.startswith('Bearer '):
@@ -190,200 +1596,2119 @@ async def verify_shim_auth(request: Request):
     raise HTTPException(status_code=401, detail="Unauthorized")
 
 
+async def verify_shim_auth(request: Request):
+    """Verify shim API key if configured"""
+    if not SHIM_API_KEY:
+        return  # Auth disabled
+
+    with metrics.auth_seconds.time():
+        check_shim_key(request)
+
+
 # Helper functions
-def get_or_create_shim_session(user_id: Optional[str]) -> Dict[str, Any]:
+def get_or_create_shim_session(user_id: Optional[str]) -> ShimSession:
     """Get or create internal shim session for tracking"""
-    session_id = user_id or "default"
+    return shim_sessions.get_or_create(user_id or "default")
+
+
+async def record_shim_turn(user_id: Optional[str]) -> tuple:
+    """Count a turn in the user's shim session; returns (turn count, its bike4mind session or None)"""
+    if shared_state:
+        return await shim_sessions.record_turn(user_id or "default")
+    return shim_sessions.record_turn(user_id or "default")
+
+
+def b4m_headers() -> Dict[str, str]:
+    """Headers for bike4mind API calls"""
+    return {
+        "X-API-Key": B4M_API_KEY,
+        "Content-Type": "application/json"
+    }
+
 
-    if session_id not in shim_sessions:
-        shim_sessions[session_id] = {
-            "created": datetime.now(),
-            "last_access": datetime.now(),
-            "turn_count": 0
+class UpstreamUnavailable(HTTPException):
+    """bike4mind is failing: the circuit breaker is open or retries are exhausted"""
+
+    def __init__(self, detail: str = "bike4mind is unavailable"):
+        super().__init__(status_code=503, detail=detail)
+
+
+class CircuitBreaker:
+    """Fails fast once the upstream error rate crosses a threshold
+
+    Outcomes are kept for `window_sec`; with at least `min_requests` of them
+    and an error rate at or above `error_rate` the breaker opens. After
+    `cooldown_sec` a single probe request is let through (half-open): success
+    closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, error_rate: float, min_requests: int, window_sec: float, cooldown_sec: float):
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.window_sec = window_sec
+        self.cooldown_sec = cooldown_sec
+        self.outcomes: deque = deque()
+        self.failures = 0
+        self.state = "closed"
+        self.reopen_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() < self.reopen_at:
+                self.rejected_total += 1
+                return False
+            self.state = "half_open"
+            self.probe_started = None
+        if self.state == "half_open":
+            # A probe that never reported back (e.g. cancelled) stops blocking after one cooldown
+            now = time.monotonic()
+            if self.probe_started is not None and now - self.probe_started < self.cooldown_sec:
+                self.rejected_total += 1
+                return False
+            self.probe_started = now
+        return True
+
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() < self.reopen_at
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        if self.state == "half_open":
+            self.probe_started = None
+            if ok:
+                self._close()
+            else:
+                self._open(now)
+            return
+        if self.state == "open":
+            return
+        self.outcomes.append((now, ok))
+        if not ok:
+            self.failures += 1
+        while self.outcomes and self.outcomes[0][0] < now - self.window_sec:
+            _, old_ok = self.outcomes.popleft()
+            if not old_ok:
+                self.failures -= 1
+        if len(self.outcomes) >= self.min_requests and self.failures / len(self.outcomes) >= self.error_rate:
+            self._open(now)
+
+    def _open(self, now: float):
+        self.state = "open"
+        self.reopen_at = now + self.cooldown_sec
+        self.opened_total += 1
+        metrics.resilience.inc("breaker_opened")
+        log.warning("🔌 bike4mind circuit breaker open", extra=log_fields(
+            failures=self.failures, requests=len(self.outcomes), cooldown_sec=self.cooldown_sec))
+
+    def _close(self):
+        self.state = "closed"
+        self.outcomes.clear()
+        self.failures = 0
+        log.info("🔌 bike4mind circuit breaker closed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": "open" if self.is_open() else ("half_open" if self.state != "closed" else "closed"),
+            "window_requests": len(self.outcomes),
+            "window_failures": self.failures,
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total,
         }
-    else:
-        # Check TTL
-        session = shim_sessions[session_id]
-        age = datetime.now() - session["created"]
-        if age > timedelta(seconds=SESSION_TTL_SEC) or session["turn_count"] >= MAX_TURNS:
-            # Reset session
-            shim_sessions[session_id] = {
-                "created": datetime.now(),
-                "last_access": datetime.now(),
-                "turn_count": 0
-            }
-            print(f"♻️ Session {session_id} reset (TTL or turn limit)")
-        else:
-            session["last_access"] = datetime.now()
 
-    return shim_sessions[session_id]
+
+class LatencyWindow:
+    """Most recent request latencies, for a p95-based hedge delay"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self.samples: deque = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(pct * len(ordered)), len(ordered) - 1)]
+
+
+b4m_breaker = CircuitBreaker(B4M_BREAKER_ERROR_RATE, B4M_BREAKER_MIN_REQUESTS,
+                             B4M_BREAKER_WINDOW_SEC, B4M_BREAKER_COOLDOWN_SEC)
+quest_create_latency = LatencyWindow()
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: httpx.HTTPError) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS
+    return isinstance(error, httpx.TransportError)
+
+
+async def post_quest(payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    started = time.monotonic()
+    response = await http_client.post(f"{B4M_BASE}/ai/llm", json=payload, headers=headers)
+    response.raise_for_status()
+    quest_create_latency.record(time.monotonic() - started)
+    return response.json()
 
 
-async def create_b4m_quest(message: str) -> Optional[str]:
-    """Create bike4mind quest and return quest ID"""
+async def post_quest_hedged(payload: Dict[str, Any], headers: Dict[str, str]) -> Dict[str, Any]:
+    """POST the quest; if it is slower than the recent p95, race a second identical request
+
+    Both requests carry the same Idempotency-Key, so an upstream that honours
+    it creates one quest. The first successful response wins.
+    """
+    p95 = quest_create_latency.percentile(0.95) if B4M_HEDGE_ENABLED else None
+    if p95 is None:
+        return await post_quest(payload, headers)
+
+    tasks = [asyncio.create_task(post_quest(payload, headers))]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=max(p95, B4M_HEDGE_MIN_MS / 1000))
+        if not done:
+            metrics.resilience.inc("hedge")
+            tasks.append(asyncio.create_task(post_quest(payload, headers)))
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not tasks[0]:
+                        metrics.resilience.inc("hedge_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# Conversation context
+class ContextPlan:
+    """What a quest carries besides the prompt: history depth, reply budget and an optional summary"""
+
+    __slots__ = ("kind", "history_count", "max_tokens", "summary", "summary_turns")
+
+    def __init__(self, kind: str, history_count: int, max_tokens: int, summary: str = "", summary_turns: int = 0):
+        self.kind = kind
+        self.history_count = history_count
+        self.max_tokens = max_tokens
+        self.summary = summary
+        self.summary_turns = summary_turns
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class ContextManager:
+    """Chooses how much conversation history each quest carries
+
+    The prompt is classified as a device command, a follow-up, a question or
+    a long-form request, and each kind has a history depth and max_tokens.
+    Both are cut to fit the token budget (prompt + history + reply); a turn
+    is sized from the history in the request. History never reaches back
+    past the turns of the user's shim session or those the request carries.
+    In summary mode the request's earlier turns are condensed into a short
+    prefix of the message and historyCount is 0, which also keeps turns of
+    other users of the shared bike4mind session out of the prompt.
+    """
+
+    PROFILES = {  # kind: (history turns, max_tokens)
+        "command": (0, 150),
+        "question": (2, 400),
+        "followup": (6, 400),
+        "long": (2, 1000),
+    }
+    DEFAULT_TURN_TOKENS = 80
+    MIN_MAX_TOKENS = 64
+    SUMMARY_MESSAGE_CHARS = 160
+
+    COMMAND = re.compile(
+        r"^(?:please\s+)?(?:turn|switch|set|dim|brighten|open|close|lock|unlock|toggle|activate|"
+        r"start|stop|pause|resume|play|mute|unmute)\b", re.I)
+    FOLLOWUP = re.compile(
+        r"^(?:and|also|what about|how about|why|then|so)\b|"
+        r"\b(?:it|its|that|this|those|them|they|he|she|him|her|there|again|instead)\b", re.I)
+    LONG = re.compile(
+        r"\b(?:explain|describe|summari[sz]e|compare|story|tell me about|write|plan|recipe|"
+        r"step by step|in detail)\b", re.I)
+    MARKUP = re.compile(r"```.*?(?:```|$)|\{.*\}", re.S)
+    SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+    def __init__(self, mode: str, budget: int):
+        self.mode = mode
+        self.budget = budget
+
+    def classify(self, prompt: str) -> str:
+        if self.COMMAND.match(prompt.strip()):
+            return "command"
+        if self.FOLLOWUP.search(prompt):
+            return "followup"
+        if self.LONG.search(prompt):
+            return "long"
+        return "question"
+
+    def plan(self, prompt: str, history: Optional[List[Message]] = None,
+             session_turns: Optional[int] = None) -> ContextPlan:
+        """Plan for `prompt`; `history` holds the request's messages before it, `session_turns`
+        the turn count of the user's shim session including this one"""
+        if self.mode == "fixed":
+            return ContextPlan("fixed", 10, 500)
+        kind = self.classify(prompt)
+        turns, max_tokens = self.PROFILES[kind]
+        prior = [m for m in history or () if m.role in ("user", "assistant")]
+        prior_turns = sum(m.role == "user" for m in prior)
+        turn_tokens = self.DEFAULT_TURN_TOKENS
+        if prior:
+            turns = min(turns, prior_turns)
+            turn_tokens = max(estimate_tokens("".join(m.content for m in prior)) // max(prior_turns, 1), 1)
+        if session_turns is not None:
+            turns = min(turns, session_turns - 1)
+
+        available = self.budget - estimate_tokens(prompt)
+        max_tokens = max(min(max_tokens, available), self.MIN_MAX_TOKENS)
+        available -= max_tokens
+        turns = max(0, min(turns, available // turn_tokens))
+        if self.mode == "summary" and prior and turns:
+            summary, used = self.summarize(prior, turns, available * 4)
+            return ContextPlan(kind, 0, max_tokens, summary, used)
+        return ContextPlan(kind, turns, max_tokens)
+
+    def summarize(self, prior: List[Message], turns: int, max_chars: int) -> tuple:
+        """First sentence of each message in the last `turns` turns, newest kept first; returns (summary, turns)"""
+        parts: List[str] = []
+        used = chars = 0
+        for message in reversed(prior):
+            text = self.MARKUP.sub(" ", message.content)
+            text = " ".join(self.SENTENCE_END.split(text.strip(), 1)[0].split())[:self.SUMMARY_MESSAGE_CHARS]
+            if text:
+                part = f"{'User' if message.role == 'user' else 'Assistant'}: {text}"
+                if chars + len(part) > max_chars:
+                    break
+                parts.append(part)
+                chars += len(part) + 1
+            if message.role == "user":
+                used += 1
+                if used == turns:
+                    break
+        return " ".join(reversed(parts)), used
+
+
+context_manager = ContextManager(CONTEXT_MODE, CONTEXT_TOKEN_BUDGET)
+
+
+# bike4mind session of each recent quest created outside HA_B4M_SESSION_ID (status URLs need it)
+quest_sessions: "OrderedDict[str, str]" = OrderedDict()
+QUEST_SESSIONS_MAX = 4096
+
+
+def remember_quest_session(quest_id: str, session_id: Optional[str]):
+    if session_id and session_id != HA_B4M_SESSION_ID:
+        quest_sessions[quest_id] = session_id
+        while len(quest_sessions) > QUEST_SESSIONS_MAX:
+            quest_sessions.popitem(last=False)
+
+
+def quest_session(quest_id: str) -> str:
+    return quest_sessions.get(quest_id, HA_B4M_SESSION_ID)
+
+
+async def create_b4m_quest(message: str, context: Optional[ContextPlan] = None,
+                           session_id: Optional[str] = None) -> Optional[str]:
+    """Create bike4mind quest and return quest ID
+
+    Without a context plan it is made from the message alone; without a
+    session ID the quest goes to HA_B4M_SESSION_ID.
+    """
+    session_id = session_id or HA_B4M_SESSION_ID
     if not B4M_API_KEY or not HA_B4M_SESSION_ID or not B4M_USER_ID:
         raise HTTPException(status_code=500, detail="bike4mind credentials not configured")
 
-    # Prepend current date and time to the message
+    # The same prompt was in flight when the add-on restarted: wait for that quest instead
+    if quest_journal:
+        resumed = quest_journal.claim_resumed(message, session_id)
+        if resumed:
+            quest_log.info("💾 Reusing resumed quest", extra=log_fields(quest_id=resumed))
+            return resumed
+
+    context = context or context_manager.plan(message)
+    metrics.quest_context.inc(context.kind)
+    metrics.quest_history_turns.observe(context.history_count or context.summary_turns)
+    quest_log.debug("🧠 Quest context", extra=log_fields(
+        kind=context.kind, history=context.history_count, max_tokens=context.max_tokens,
+        summary_turns=context.summary_turns))
+
+    # Prepend current date and time (and the conversation summary) to the message
     current_datetime = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     message_with_timestamp = f"[Current date/time: {current_datetime}] {message}"
+    if context.summary:
+        message_with_timestamp = f"[Earlier in this conversation: {context.summary}] {message_with_timestamp}"
 
     payload = {
-        "sessionId": HA_B4M_SESSION_ID,
+        "sessionId": session_id,
         "message": message_with_timestamp,
-        "historyCount": 10,
+        "historyCount": context.history_count,
         "fabFileIds": [],
         "messageFileIds": [],
         "params": {
             "model": B4M_MODEL,
             "temperature": 0.7,
-            "max_tokens": 500,
+            "max_tokens": context.max_tokens,
             "stream": False
         },
         "promptMeta": {
             "session": {
-                "id": HA_B4M_SESSION_ID,
+                "id": session_id,
                 "userId": B4M_USER_ID
             }
         }
-    }
+    }
+
+    if not b4m_breaker.allow():
+        raise UpstreamUnavailable("bike4mind circuit breaker open")
+
+    headers = {**b4m_headers(), "Idempotency-Key": uuid.uuid4().hex}
+    with metrics.quest_create_seconds.time():
+        for attempt in range(B4M_RETRIES + 1):
+            if attempt:
+                # Full jitter: spread retries from many satellites over the backoff window
+                await asyncio.sleep(random.uniform(0, B4M_RETRY_BASE_MS / 1000 * 2 ** attempt))
+                if not b4m_breaker.allow():
+                    raise UpstreamUnavailable("bike4mind circuit breaker open")
+                metrics.resilience.inc("retry")
+            try:
+                data = await post_quest_hedged(payload, headers)
+                b4m_breaker.record(True)
+                break
+            except httpx.HTTPError as e:
+                if not is_retryable(e):
+                    b4m_breaker.record(True)  # bike4mind answered; the request itself was rejected
+                    quest_log.error("❌ bike4mind quest creation failed", extra=log_fields(error=str(e)))
+                    raise HTTPException(status_code=502, detail=f"bike4mind API error: {str(e)}")
+                b4m_breaker.record(False)
+                quest_log.warning("⚠️ bike4mind quest creation failed", extra=log_fields(
+                    attempt=attempt + 1, error=f"{type(e).__name__}: {e}"))
+        else:
+            raise UpstreamUnavailable("bike4mind quest creation failed after retries")
+
+    try:
+        # Quest ID may be in multiple locations depending on API response format
+        quest_id = (
+            data.get('questId') or
+            data.get('id') or
+            (data.get('quest', {}).get('id')) or
+            (data.get('quest', {}).get('_id'))
+        )
+        if not quest_id:
+            quest_log.warning("⚠️ No quest ID in response", extra=log_fields(response=data))
+            return None
+
+        remember_quest_session(quest_id, session_id)
+        if quest_journal:
+            quest_journal.record("create", quest_id, prompt=message, model=B4M_MODEL,
+                                 request_id=request_id_var.get(), session=session_id)
+        return quest_id
+    except AttributeError:
+        quest_log.warning("⚠️ Unexpected quest creation response", extra=log_fields(response=data))
+        return None
+
+
+def extract_quest_reply(data: Dict[str, Any]) -> Optional[str]:
+    """Extract reply text from a quest status payload (priority order)"""
+    # 1. Check replies array
+    if data.get('replies') and isinstance(data['replies'], list):
+        return '\n'.join(data['replies'])
+    # 2. Check reply field
+    if data.get('reply'):
+        return data['reply']
+    # 3. Check questMasterReply
+    if data.get('questMasterReply'):
+        return data['questMasterReply']
+    # 4. Check researchModeResults
+    if data.get('researchModeResults'):
+        results = [r.get('response') for r in data['researchModeResults'] if r.get('response')]
+        if results:
+            return '\n\n'.join(results)
+    return None
+
+
+async def fetch_quest_status(quest_id: str, params: Optional[Dict[str, Any]] = None,
+                             timeout: Optional[float] = None) -> Dict[str, Any]:
+    """Single GET of the quest status endpoint"""
+    kwargs: Dict[str, Any] = {"headers": b4m_headers()}
+    if params:
+        kwargs["params"] = params
+    if timeout:
+        kwargs["timeout"] = timeout
+    try:
+        response = await http_client.get(
+            f"{B4M_BASE}/sessions/{quest_session(quest_id)}/chat/{quest_id}",
+            **kwargs
+        )
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        if is_retryable(e):
+            b4m_breaker.record(False)
+        raise
+    b4m_breaker.record(True)
+    data = response.json()
+    if quest_journal:
+        quest_journal.record("poll", quest_id, status=data.get('status'))
+    return data
+
+
+def quest_events_url(quest_id: str) -> str:
+    """Expand QUEST_EVENTS_URL template for a quest"""
+    return QUEST_EVENTS_URL.format(base=B4M_BASE, session_id=quest_session(quest_id), quest_id=quest_id)
+
+
+# Called with each "running" status payload while a quest is in progress
+QuestUpdateCallback = Callable[[Dict[str, Any]], None]
+
+
+class QuestLatencyTracker:
+    """Learns typical quest latency per model (EWMA of mean and absolute deviation)"""
+
+    MIN_SAMPLES = 3
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, model: str, latency: float):
+        entry = self.stats.get(model)
+        if entry is None:
+            self.stats[model] = {"mean": latency, "dev": latency / 4, "samples": 1}
+            return
+        error = latency - entry["mean"]
+        entry["mean"] += self.alpha * error
+        entry["dev"] += self.alpha * (abs(error) - entry["dev"])
+        entry["samples"] += 1
+
+    def estimate(self, model: str) -> Optional[tuple]:
+        """Return (expected_latency, deviation) once enough samples are known"""
+        entry = self.stats.get(model)
+        if not entry or entry["samples"] < self.MIN_SAMPLES:
+            return None
+        return entry["mean"], entry["dev"]
+
+
+class PollingStrategy:
+    """Fixed-interval polling with 1.2x backoff (the original loop)"""
+
+    name = "poll"
+
+    def initial_delay(self, model: str) -> float:
+        return 0.0
+
+    def next_delay(self, model: str, elapsed: float, attempt: int) -> float:
+        return min((POLL_INTERVAL_MS / 1000) * (1.2 ** (attempt - 1)), POLL_MAX_INTERVAL_MS / 1000)
+
+    async def wait(self, quest_id: str, model: str, started: float, deadline: float,
+                   on_update: Optional[QuestUpdateCallback] = None) -> Dict[str, Any]:
+        """Poll until the quest is done or stopped, return the final status payload
+
+        Polls are issued by the shared quest_multiplexer on this strategy's
+        schedule. With on_update (streaming), every running payload is passed
+        to the callback and polling stays at STREAM_POLL_INTERVAL_MS so partial
+        replies arrive promptly.
+        """
+        delay = 0.0 if on_update else self.initial_delay(model) - (time.monotonic() - started)
+        first_check = time.monotonic() + max(delay, 0.0)
+        return await quest_multiplexer.wait(quest_id, self, model, started, deadline, on_update, first_check)
+
+
+class AdaptivePollingStrategy(PollingStrategy):
+    """Polling scheduled around the learned finish time of each model
+
+    Sparse checks until shortly before the expected finish, dense checks
+    through the expected window, then a growing interval for slow outliers.
+    Falls back to the original backoff until enough latencies are known.
+    """
+
+    name = "adaptive"
+
+    def __init__(self, tracker: QuestLatencyTracker):
+        self.tracker = tracker
+
+    def _window(self, model: str) -> Optional[tuple]:
+        estimate = self.tracker.estimate(model)
+        if not estimate:
+            return None
+        mean, dev = estimate
+        dev = max(dev, mean * 0.1, ADAPTIVE_DENSE_INTERVAL_MS / 1000)
+        return max(mean - 1.5 * dev, 0.0), mean + 2 * dev
+
+    def initial_delay(self, model: str) -> float:
+        window = self._window(model)
+        if not window:
+            return 0.0
+        return min(window[0], POLL_MAX_INTERVAL_MS / 1000)
+
+    def next_delay(self, model: str, elapsed: float, attempt: int) -> float:
+        window = self._window(model)
+        if not window:
+            return super().next_delay(model, elapsed, attempt)
+        dense = ADAPTIVE_DENSE_INTERVAL_MS / 1000
+        window_start, window_end = window
+        if elapsed < window_start:
+            return max(min(window_start - elapsed, POLL_MAX_INTERVAL_MS / 1000), dense)
+        if elapsed <= window_end:
+            return dense
+        # Late quest: back off proportionally to how far past the window we are
+        return min(max(dense, (elapsed - window_end) * 0.5), POLL_MAX_INTERVAL_MS / 1000)
+
+
+class PushStrategy:
+    """Base for push-style strategies; remembers unsupported backends and falls back"""
+
+    name = "push"
+    streams_partials = True  # Whether running events are delivered (needed for streaming)
+
+    def __init__(self, fallback: PollingStrategy):
+        self.fallback = fallback
+        self.supported: Optional[bool] = None
+
+    def disable(self, reason: str):
+        if self.supported is not False:
+            quest_log.warning(f"⚠️ Quest {self.name} unavailable, using {self.fallback.name} polling",
+                              extra=log_fields(reason=reason))
+        self.supported = False
+
+    async def wait(self, quest_id: str, model: str, started: float, deadline: float,
+                   on_update: Optional[QuestUpdateCallback] = None) -> Dict[str, Any]:
+        if self.supported is not False and (on_update is None or self.streams_partials):
+            try:
+                data = await self.subscribe(quest_id, deadline, on_update)
+                if data is not None:
+                    self.supported = True
+                    return data
+            except HTTPException:
+                raise
+            except Exception as e:
+                quest_log.warning(f"⚠️ Quest {self.name} error", extra=log_fields(
+                    quest_id=quest_id, error=f"{type(e).__name__}: {e}"))
+        return await self.fallback.wait(quest_id, model, started, deadline, on_update)
+
+    async def subscribe(self, quest_id: str, deadline: float,
+                        on_update: Optional[QuestUpdateCallback] = None) -> Optional[Dict[str, Any]]:
+        """Return the final status payload, or None to fall back to polling"""
+        raise NotImplementedError
+
+    async def complete(self, quest_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Push events may only carry the status; fetch the full payload if needed"""
+        if data.get('status') == 'done' and not extract_quest_reply(data):
+            return await fetch_quest_status(quest_id)
+        return data
+
+
+class LongPollStrategy(PushStrategy):
+    """GET with ?wait=N; the backend holds the request until the quest changes"""
+
+    name = "longpoll"
+    streams_partials = False  # Held requests only return on completion; streaming polls instead
+
+    async def subscribe(self, quest_id: str, deadline: float,
+                        on_update: Optional[QuestUpdateCallback] = None) -> Optional[Dict[str, Any]]:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise HTTPException(status_code=504, detail="bike4mind quest timeout")
+            wait = max(min(QUEST_LONGPOLL_WAIT_SEC, remaining), 1)
+            requested = time.monotonic()
+            data = await fetch_quest_status(quest_id, params={"wait": int(wait)}, timeout=wait + 5)
+            if data.get('status') in ('done', 'stopped'):
+                return data
+            # A backend that ignores ?wait answers immediately with "running"
+            if self.supported is not True and time.monotonic() - requested < min(wait / 2, 1.0):
+                self.disable("backend ignored wait parameter")
+                return None
+            self.supported = True
+
+
+class SSEStrategy(PushStrategy):
+    """Server-Sent Events subscription at QUEST_EVENTS_URL"""
+
+    name = "sse"
+
+    async def subscribe(self, quest_id: str, deadline: float,
+                        on_update: Optional[QuestUpdateCallback] = None) -> Optional[Dict[str, Any]]:
+        if not QUEST_EVENTS_URL:
+            self.disable("quest_events_url not configured")
+            return None
+        headers = {**b4m_headers(), "Accept": "text/event-stream"}
+        timeout = httpx.Timeout(max(deadline - time.monotonic(), 1), connect=5.0)
+        async with http_client.stream("GET", quest_events_url(quest_id), headers=headers, timeout=timeout) as response:
+            if response.status_code in (404, 405, 501) or \
+                    not response.headers.get('content-type', '').startswith('text/event-stream'):
+                self.disable(f"HTTP {response.status_code}")
+                return None
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith('data:'):
+                    continue
+                try:
+                    data = json.loads(line[5:].strip())
+                except json.JSONDecodeError:
+                    continue
+                if data.get('status') in ('done', 'stopped'):
+                    return await self.complete(quest_id, data)
+                if on_update and data.get('status') == 'running':
+                    on_update(data)
+        return None
+
+
+class WebSocketStrategy(PushStrategy):
+    """WebSocket subscription at QUEST_EVENTS_URL (ws:// or wss://)"""
+
+    name = "websocket"
+
+    async def subscribe(self, quest_id: str, deadline: float,
+                        on_update: Optional[QuestUpdateCallback] = None) -> Optional[Dict[str, Any]]:
+        if not QUEST_EVENTS_URL:
+            self.disable("quest_events_url not configured")
+            return None
+        if websockets is None:
+            self.disable("websockets package not installed")
+            return None
+        url = quest_events_url(quest_id)
+        try:
+            async with websockets.connect(url, additional_headers={"X-API-Key": B4M_API_KEY}) as ws:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise HTTPException(status_code=504, detail="bike4mind quest timeout")
+                    message = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                    try:
+                        data = json.loads(message)
+                    except json.JSONDecodeError:
+                        continue
+                    if data.get('status') in ('done', 'stopped'):
+                        return await self.complete(quest_id, data)
+                    if on_update and data.get('status') == 'running':
+                        on_update(data)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="bike4mind quest timeout")
+        except websockets.exceptions.InvalidStatus as e:
+            self.disable(f"HTTP {e.response.status_code}")
+            return None
+
+
+class TokenBucket:
+    """O(1) token bucket: `rate` tokens per second, up to `capacity` banked"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def delay(self) -> float:
+        """Seconds until the next token is available"""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    async def take(self) -> bool:
+        """try_acquire for callers on the event loop"""
+        return self.try_acquire()
+
+    async def acquire(self):
+        while not await self.take():
+            await asyncio.sleep(self.delay())
+
+
+class SharedTokenBucket(TokenBucket):
+    """TokenBucket whose tokens live in the shared state backend, so the limit holds across workers"""
+
+    def __init__(self, state: SharedState, name: str, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.state = state
+        self.name = name
+
+    def try_acquire(self) -> bool:
+        taken, self.tokens = self.state.take_token(self.name, self.rate, self.capacity)
+        return taken
+
+    async def take(self) -> bool:
+        taken, self.tokens = await self.state.run(self.state.take_token, self.name, self.rate, self.capacity)
+        return taken
+
+    def delay(self) -> float:
+        """Seconds until the next token, as of the last take"""
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+def make_token_bucket(name: str, rate: float, capacity: float) -> TokenBucket:
+    """Process-local bucket, or one shared by all workers in multi-worker mode"""
+    if shared_state:
+        return SharedTokenBucket(shared_state, name, rate, capacity)
+    return TokenBucket(rate, capacity)
+
+
+class PendingQuest:
+    """A quest registered with the multiplexer; resolved through `future`"""
+
+    def __init__(self, quest_id: str, strategy: PollingStrategy, model: str, started: float, deadline: float):
+        self.quest_id = quest_id
+        self.strategy = strategy
+        self.model = model
+        self.started = started
+        self.deadline = deadline
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.callbacks: List[QuestUpdateCallback] = []
+        self.waiters = 0
+        self.attempt = 0
+        self.request_id = request_id_var.get()
+
+
+class QuestMultiplexer:
+    """Central registry that polls every in-flight quest from one scheduler task
+
+    Quests are kept in a heap ordered by their next check time. The scheduler
+    staggers status GETs through a global token bucket (QUEST_POLL_RATE per
+    second) with at most QUEST_POLL_CONCURRENCY in flight, and resolves each
+    quest's future when it is done, stopped or past its deadline.
+    """
+
+    def __init__(self, rate: float, concurrency: int):
+        self.budget = make_token_bucket("quest_poll", rate, max(rate, 1.0))
+        self.concurrency = concurrency
+        self.pending: Dict[str, PendingQuest] = {}
+        self.heap: List[tuple] = []
+        self.sequence = 0
+        self.in_flight = 0
+        self.requests_total = 0
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+
+    def _ensure_running(self):
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.slots = asyncio.Semaphore(self.concurrency)
+            # Fresh context so the scheduler doesn't inherit the first caller's request ID
+            self.task = asyncio.create_task(self._run(), context=contextvars.Context())
+
+    def _schedule(self, pending: PendingQuest, due: float):
+        self.sequence += 1
+        heapq.heappush(self.heap, (min(due, pending.deadline), self.sequence, pending.quest_id))
+        self.wakeup.set()
+
+    async def wait(self, quest_id: str, strategy: PollingStrategy, model: str, started: float, deadline: float,
+                   on_update: Optional[QuestUpdateCallback] = None,
+                   first_check: Optional[float] = None) -> Dict[str, Any]:
+        """Register a quest (or join an existing registration) and wait for its final payload"""
+        self._ensure_running()
+        pending = self.pending.get(quest_id)
+        if pending is None:
+            pending = PendingQuest(quest_id, strategy, model, started, deadline)
+            self.pending[quest_id] = pending
+            self._schedule(pending, first_check or time.monotonic())
+        if on_update:
+            pending.callbacks.append(on_update)
+        pending.waiters += 1
+        try:
+            return await asyncio.shield(pending.future)
+        finally:
+            pending.waiters -= 1
+            if on_update in pending.callbacks:
+                pending.callbacks.remove(on_update)
+            if pending.waiters == 0 and not pending.future.done():
+                # Last waiter went away (client disconnected); stop polling
+                pending.future.cancel()
+                self.pending.pop(quest_id, None)
+
+    def _resolve(self, pending: PendingQuest, data: Optional[Dict[str, Any]] = None,
+                 error: Optional[Exception] = None):
+        self.pending.pop(pending.quest_id, None)
+        if pending.future.done():
+            return
+        metrics.quest_polls.observe(pending.attempt)
+        if error:
+            pending.future.set_exception(error)
+        else:
+            pending.future.set_result(data)
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.heap:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                    continue
+                due = self.heap[0][0]
+                now = time.monotonic()
+                if due > now:
+                    self.wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), due - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                _, _, quest_id = heapq.heappop(self.heap)
+                pending = self.pending.get(quest_id)
+                if pending is None or pending.future.done():
+                    continue
+                if now >= pending.deadline:
+                    self._resolve(pending, error=HTTPException(status_code=504, detail="bike4mind quest timeout"))
+                    continue
+
+                await self.budget.acquire()
+                await self.slots.acquire()
+                self.in_flight += 1
+                asyncio.create_task(self._check(pending))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                quest_log.exception("⚠️ Quest scheduler error")
+
+    async def _check(self, pending: PendingQuest):
+        request_id_var.set(pending.request_id)
+        pending.attempt += 1
+        self.requests_total += 1
+        if pending.attempt == 1:
+            metrics.quest_first_poll_seconds.observe(time.monotonic() - pending.started)
+        try:
+            data = await fetch_quest_status(pending.quest_id)
+            status = data.get('status')
+            quest_log.info("Quest poll", extra={"sample": "poll", **log_fields(
+                quest_id=pending.quest_id, attempt=pending.attempt, status=status)})
+            if status in ('done', 'stopped'):
+                self._resolve(pending, data)
+                return
+            if status == 'running':
+                for callback in list(pending.callbacks):
+                    callback(data)
+            else:
+                quest_log.warning("⚠️ Unknown quest status", extra=log_fields(quest_id=pending.quest_id, status=status))
+        except httpx.HTTPError as e:
+            quest_log.warning("⚠️ Polling error", extra=log_fields(
+                quest_id=pending.quest_id, attempt=pending.attempt, error=str(e)))
+            if b4m_breaker.is_open():
+                self._resolve(pending, error=UpstreamUnavailable("bike4mind circuit breaker open"))
+                return
+        except Exception as e:
+            self._resolve(pending, error=e)
+            return
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+
+        if pending.future.done():
+            return
+        now = time.monotonic()
+        delay = pending.strategy.next_delay(pending.model, now - pending.started, pending.attempt)
+        if pending.callbacks:
+            delay = STREAM_POLL_INTERVAL_MS / 1000
+        self._schedule(pending, now + delay)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "pending_quests": len(self.pending),
+            "queue_depth": sum(1 for due, _, quest_id in self.heap if due <= now and quest_id in self.pending),
+            "in_flight": self.in_flight,
+            "requests_total": self.requests_total,
+            "poll_rate_limit": self.budget.rate,
+            "poll_concurrency": self.concurrency,
+        }
+
+    async def stop(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        for pending in list(self.pending.values()):
+            pending.future.cancel()
+        self.pending.clear()
+        self.heap.clear()
+
+
+class QuestCompletionEngine:
+    """Waits for quest completion using the configured strategy and learns latencies"""
+
+    def __init__(self, mode: str):
+        self.latency = QuestLatencyTracker()
+        adaptive = AdaptivePollingStrategy(self.latency)
+        self.strategies = {
+            "poll": PollingStrategy(),
+            "adaptive": adaptive,
+            "longpoll": LongPollStrategy(adaptive),
+            "sse": SSEStrategy(adaptive),
+            "websocket": WebSocketStrategy(adaptive),
+        }
+        if mode not in self.strategies:
+            quest_log.warning("⚠️ Unknown quest_completion_mode, using adaptive", extra=log_fields(mode=mode))
+        self.strategy = self.strategies.get(mode, adaptive)
+
+    async def wait(self, quest_id: str, model: str = B4M_MODEL, started: Optional[float] = None,
+                   on_update: Optional[QuestUpdateCallback] = None) -> Dict[str, Any]:
+        started = started or time.monotonic()
+        deadline = started + TIMEOUT_MS / 1000
+        try:
+            data = await self.strategy.wait(quest_id, model, started, deadline, on_update)
+        except HTTPException as e:
+            if e.status_code == 504:
+                metrics.timeouts.inc("bike4mind")
+            raise
+        if data.get('status') == 'done':
+            latency = time.monotonic() - started
+            self.latency.record(model, latency)
+            metrics.quest_seconds.observe(latency)
+        return data
+
+
+quest_multiplexer = QuestMultiplexer(QUEST_POLL_RATE, QUEST_POLL_CONCURRENCY)
+quest_completion = QuestCompletionEngine(QUEST_COMPLETION_MODE)
+
+
+class QuestJournal:
+    """Append-only journal of quests (prompt, poll timeline, reply) in a memory-mapped file
+
+    Records are JSON lines appended to a file preallocated to max_bytes and
+    mapped into memory. The event loop only enqueues records; a writer thread
+    copies them into the map in batches and flushes once per batch. Unused
+    space is NUL bytes, so after a restart the journal ends at the first NUL.
+    A full segment is renamed to `<path>.1` (replacing the previous one) and
+    the new segment starts with the create records of unfinished quests, so
+    resume and replay see both segments.
+    """
+
+    BATCH_INTERVAL = 0.1  # seconds between writer flushes
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+        self.file = None
+        self.map: Optional[mmap.mmap] = None
+        self.offset = 0
+        self.open: Dict[str, Dict[str, Any]] = {}  # quest_id -> create record (writer thread only)
+        self.resumed: Dict[str, tuple] = {}  # normalized prompt -> (quest_id, created wall time, bike4mind session)
+        self.records_written = 0
+        self.rotations = 0
+
+    @staticmethod
+    def read(path: str) -> List[Dict[str, Any]]:
+        """Records of one journal segment; torn or unreadable lines are skipped"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        end = data.find(b"\0")
+        records = []
+        for line in (data if end < 0 else data[:end]).splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def _map_segment(self):
+        self.file = open(self.path, "a+b")
+        size = max(os.fstat(self.file.fileno()).st_size, self.max_bytes)
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        end = self.map.find(b"\0")
+        self.offset = size if end < 0 else end
+
+    def _close_segment(self):
+        if self.map:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def start(self) -> List[Dict[str, Any]]:
+        """Map the journal, start the writer and return create records of unfinished quests"""
+        horizon = time.time() - TIMEOUT_MS / 1000
+        for record in self.read(f"{self.path}.1") + self.read(self.path):
+            if record.get("e") == "create":
+                self.open[record["q"]] = record
+            elif record.get("e") in ("done", "error"):
+                self.open.pop(record.get("q"), None)
+        self.open = {quest_id: r for quest_id, r in self.open.items() if r["t"] > horizon}
+        self._map_segment()
+        self.thread = threading.Thread(target=self._run, name="quest-journal", daemon=True)
+        self.thread.start()
+        return list(self.open.values())
+
+    def stop(self):
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def record(self, event: str, quest_id: str, **fields: Any):
+        if self.thread:
+            self.queue.put({"t": round(time.time(), 3), "e": event, "q": quest_id, **fields})
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            time.sleep(self.BATCH_INTERVAL)
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = None in batch
+            try:
+                self._write([record for record in batch if record is not None])
+            except (OSError, ValueError) as e:
+                quest_log.warning("⚠️ Quest journal write failed", extra=log_fields(error=str(e)))
+        self._close_segment()
+
+    def _write(self, records: List[Dict[str, Any]]):
+        for record in records:
+            if record["e"] == "create":
+                self.open[record["q"]] = record
+            elif record["e"] in ("done", "error"):
+                self.open.pop(record["q"], None)
+            line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+            if self.offset + len(line) > len(self.map):
+                self._rotate()
+                if self.offset + len(line) > len(self.map):
+                    continue  # A single record larger than the free segment is not journaled
+            self.map[self.offset:self.offset + len(line)] = line
+            self.offset += len(line)
+            self.records_written += 1
+        if records:
+            self.map.flush()
+
+    def _rotate(self):
+        self._close_segment()
+        os.replace(self.path, f"{self.path}.1")
+        self.rotations += 1
+        self._map_segment()
+        horizon = time.time() - TIMEOUT_MS / 1000
+        self.open = {quest_id: r for quest_id, r in self.open.items() if r["t"] > horizon}
+        carried = b"".join(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in self.open.values())
+        carried = carried[:len(self.map) // 2]
+        self.map[:len(carried)] = carried
+        self.offset = len(carried)
+
+    def claim_resumed(self, message: str, session_id: str) -> Optional[str]:
+        """Quest ID of a quest resumed after restart for the same prompt in the same bike4mind session,
+        if still fresh"""
+        key = ResponseCache.normalize(message)
+        entry = self.resumed.get(key)
+        if entry is None or entry[2] != session_id:
+            return None  # Another user's session (session pool): its quest is not theirs to reuse
+        del self.resumed[key]
+        if time.time() - entry[1] < TIMEOUT_MS / 1000:
+            return entry[0]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "segment_bytes": self.max_bytes,
+            "used_bytes": self.offset,
+            "records_written": self.records_written,
+            "rotations": self.rotations,
+            "queued": self.queue.qsize(),
+            "resumable": len(self.resumed),
+        }
+
+
+async def resume_quest(record: Dict[str, Any]):
+    """Finish polling a quest that was in flight when the add-on stopped"""
+    quest_id = record["q"]
+    session_id = record.get("session") or HA_B4M_SESSION_ID
+    remember_quest_session(quest_id, session_id)
+    key = ResponseCache.normalize(record.get("prompt", ""))
+    quest_journal.resumed[key] = (quest_id, record["t"], session_id)
+    started = time.monotonic() - max(time.time() - record["t"], 0.0)
+    try:
+        reply = await poll_b4m_quest(quest_id, started)
+        quest_log.info("💾 Resumed quest finished", extra=log_fields(quest_id=quest_id, chars=len(reply)))
+    except Exception as e:
+        quest_log.warning("⚠️ Resumed quest failed", extra=log_fields(quest_id=quest_id, error=str(e)))
+        if quest_journal.resumed.get(key, (None,))[0] == quest_id:
+            del quest_journal.resumed[key]  # A new quest is created for the prompt instead
+
+
+quest_journal = QuestJournal(QUEST_JOURNAL_PATH, QUEST_JOURNAL_MAX_MB * 1024 * 1024) if QUEST_JOURNAL_PATH else None
+
+
+async def poll_b4m_quest(quest_id: str, started: Optional[float] = None,
+                         on_update: Optional[QuestUpdateCallback] = None) -> Optional[str]:
+    """Wait for bike4mind quest to finish, return response text"""
+    try:
+        data = await quest_completion.wait(quest_id, B4M_MODEL, started, on_update)
+
+        if data.get('status') == 'stopped':
+            raise HTTPException(status_code=500, detail="bike4mind quest stopped")
+
+        ai_reply = extract_quest_reply(data)
+        if not ai_reply:
+            raise HTTPException(status_code=500, detail="bike4mind quest done but no reply found")
+    except HTTPException as e:
+        if quest_journal:
+            quest_journal.record("error", quest_id, code=e.status_code, detail=str(e.detail))
+        raise
+
+    if quest_journal:
+        quest_journal.record("done", quest_id, reply=ai_reply)
+    return ai_reply
+
+
+async def stream_b4m_quest(quest_id: str, started: Optional[float] = None) -> AsyncIterator[str]:
+    """Yield new reply text as a running quest's partial replies grow
+
+    Partial text is read from replies/reply of "running" polls; only the part
+    not yet yielded is emitted. The final reply closes the stream.
+    """
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    def on_update(data: Dict[str, Any]):
+        partial = extract_quest_reply(data)
+        if partial:
+            chunks.put_nowait(partial)
+
+    async def run():
+        try:
+            chunks.put_nowait(await poll_b4m_quest(quest_id, started, on_update))
+            chunks.put_nowait(None)
+        except Exception as e:
+            chunks.put_nowait(e)
+
+    task = asyncio.create_task(run())
+    sent = ""
+    try:
+        while True:
+            item = await chunks.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            if item.startswith(sent):
+                if len(item) > len(sent):
+                    delta, sent = item[len(sent):], item
+                    yield delta
+            else:
+                # Upstream rewrote text we already sent; nothing can be retracted
+                quest_log.warning("⚠️ Partial reply diverged from streamed text", extra=log_fields(quest_id=quest_id))
+    finally:
+        task.cancel()
+
+
+JSON_DECODER = json.JSONDecoder()
+
+
+def tool_call_from_action(data: Any) -> Optional[Dict[str, Any]]:
+    """Translate a bike4mind action JSON object into an OpenAI tool call"""
+    # Check if it's a Home Assistant action
+    if not isinstance(data, dict) or data.get('action') != 'call_service':
+        return None
+    return {
+        "id": f"call_{uuid.uuid4().hex[:8]}",
+        "type": "function",
+        "function": {
+            "name": HA_TOOL_FUNCTION_NAME,
+            "arguments": json.dumps({
+                "domain": data.get('domain'),
+                "service": data.get('service'),
+                "entity_id": data.get('entity_id'),
+                "data": data.get('data', {})
+            })
+        }
+    }
+
+
+class ToolCallScanner:
+    """Incremental tool-call extraction from reply deltas
+
+    Finds JSON objects and arrays in the reply, fenced or bare, in one pass:
+    brackets are matched with a stack and strings/escapes are tracked, so
+    nested "data" objects and braces inside strings are fine. A candidate is
+    abandoned at the first thing that can't appear in JSON outside a string
+    (a word other than true/false/null, a backtick, ...) or at a newline
+    inside a string, so braces in prose never swallow the rest of the
+    reply. Each complete value is decoded; an object with action
+    "call_service" becomes a tool call, and an array yields one per such
+    element. A value that is complete in the delta is decoded directly; the
+    bracket-by-bracket scan only runs for values split across deltas or
+    malformed ones. Only the text of the open candidate is kept between
+    feeds.
+    """
+
+    OPEN = re.compile(r'[{\[]')
+    LIKELY_JSON = re.compile(r'[{\[]\s*["{\[\]}]')
+    # Outside strings: the next character that isn't whitespace, a separator or part of a number
+    STRUCTURE = re.compile(r'[^\s:,0-9.+\-]')
+    WORD = re.compile(r'[A-Za-z]+')
+    LITERALS = {"true", "false", "null", "e", "E"}  # e/E: number exponents
+    STRING = re.compile(r'["\\\n]')
+    CLOSERS = {"{": "}", "[": "]"}
+
+    def __init__(self):
+        self.stack: List[str] = []  # Expected closing brackets of the open candidate
+        self.parts: List[str] = []  # Text of the open candidate from earlier deltas
+        self.in_string = False
+        self.escaped = False
+        self.word = ""  # Letters at the end of the previous delta, checked once the word is complete
+
+    def feed(self, delta: str) -> List[Dict[str, Any]]:
+        tool_calls: List[Dict[str, Any]] = []
+        pos, n = 0, len(delta)
+        start = 0  # Where the open candidate begins in this delta
+        if self.word and not self.WORD.match(delta):
+            if self.word not in self.LITERALS:
+                self._abandon()
+            self.word = ""
+        while pos < n:
+            if not self.stack:
+                match = self.OPEN.search(delta, pos)
+                if not match:
+                    break
+                start, pos = match.start(), match.end()
+                # A failed decode costs O(start) to locate the error, so only try what looks like JSON
+                if self.LIKELY_JSON.match(delta, start):
+                    try:
+                        value, end = JSON_DECODER.raw_decode(delta, start)
+                    except ValueError:
+                        pass
+                    else:
+                        tool_calls.extend(self._actions(value))
+                        pos = end
+                        continue
+                self.stack.append(self.CLOSERS[match.group()])
+                continue
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                    pos += 1
+                    continue
+                match = self.STRING.search(delta, pos)
+                if not match:
+                    pos = n
+                    break
+                char, pos = match.group(), match.end()
+                if char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                else:
+                    self._abandon()
+                continue
+            match = self.STRUCTURE.search(delta, pos)
+            if not match:
+                pos = n
+                break
+            char, pos = match.group(), match.end()
+            if char == '"':
+                self.in_string = True
+            elif char in self.CLOSERS:
+                self.stack.append(self.CLOSERS[char])
+            elif char.isascii() and char.isalpha():
+                word = self.WORD.match(delta, pos - 1)
+                pos = word.end()
+                text = self.word + word.group() if word.start() == 0 else word.group()
+                self.word = text if pos == n else ""
+                if pos < n and text not in self.LITERALS:
+                    self._abandon()
+            elif char in "}]" and char == self.stack[-1]:
+                self.stack.pop()
+                if not self.stack:
+                    self.parts.append(delta[start:pos])
+                    tool_calls.extend(self._decode("".join(self.parts)))
+                    self.parts = []
+            else:
+                self._abandon()
+        if self.stack:
+            self.parts.append(delta[start:])
+        return tool_calls
+
+    def _abandon(self):
+        self.stack, self.parts, self.in_string, self.escaped, self.word = [], [], False, False, ""
+
+    @staticmethod
+    def _decode(text: str) -> List[Dict[str, Any]]:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            if '"action"' in text:
+                metrics.tool_call_blocks.inc("malformed")
+                log.warning("⚠️ Malformed tool call JSON ignored", extra=log_fields(error=str(e), chars=len(text)))
+            return []
+        return ToolCallScanner._actions(data)
+
+    @staticmethod
+    def _actions(data: Any) -> List[Dict[str, Any]]:
+        tool_calls = [tool_call for tool_call in map(tool_call_from_action, data if isinstance(data, list) else [data])
+                      if tool_call]
+        if tool_calls:
+            metrics.tool_call_blocks.inc("call")
+        return tool_calls
+
+
+def extract_tool_calls(response_text: str) -> Optional[List[Dict[str, Any]]]:
+    """Extract JSON tool-call from bike4mind response"""
+    with metrics.tool_call_extract_seconds.time():
+        tool_calls = ToolCallScanner().feed(response_text)
+    return tool_calls if tool_calls else None
+
+
+def json_bytes(value: Any) -> bytes:
+    """Compact JSON, with orjson when installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            pass  # e.g. lone surrogates, which the stdlib encoder escapes
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+def json_string_bytes(text: str) -> bytes:
+    """A JSON string literal; the hot path of every streamed chunk
+
+    The stdlib's C escaper is faster than orjson's call overhead for
+    token-sized deltas; orjson wins from a few dozen characters on.
+    """
+    if orjson is not None and len(text) > 32:
+        try:
+            return orjson.dumps(text)
+        except TypeError:
+            pass
+    return encode_basestring_ascii(text).encode()
+
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+
+class CompletionRenderer:
+    """Renders chat.completion bodies and chat.completion.chunk SSE events of one completion
+
+    The envelope (id, object, created, model, choice index) is the same for
+    every chunk, so it is encoded once as a bytes template; a content chunk
+    only escapes its delta and joins five byte strings.
+    """
+
+    __slots__ = ("chunk_head", "completion_head")
+
+    CHUNK_ROLE_CONTENT = b'{"role":"assistant","content":'
+    CHUNK_CONTENT = b'{"content":'
+    CHUNK_TAIL = b'},"finish_reason":null}]}\n\n'
+    COMPLETION_TAIL = b'}],"usage":{"prompt_tokens":0,"completion_tokens":0,"total_tokens":0}}'
+    FINISH_REASONS = {None: b"null", "stop": b'"stop"', "tool_calls": b'"tool_calls"'}
+
+    def __init__(self, completion_id: str, created: Optional[int] = None):
+        envelope = b'{"id":%s,"object":"%%s","created":%d,"model":"bike4mind","choices":[{"index":0,' % (
+            json_string_bytes(completion_id), int(time.time()) if created is None else created)
+        self.chunk_head = b"data: " + envelope % b"chat.completion.chunk" + b'"delta":'
+        self.completion_head = envelope % b"chat.completion" + b'"message":{"role":"assistant","content":'
+
+    def content_chunk(self, text: str, role: bool = False) -> bytes:
+        return b"".join((self.chunk_head, self.CHUNK_ROLE_CONTENT if role else self.CHUNK_CONTENT,
+                         json_string_bytes(text), self.CHUNK_TAIL))
+
+    def tool_calls_chunk(self, tool_calls: List[Dict[str, Any]], finish_reason: Optional[str] = None) -> bytes:
+        return b"".join((self.chunk_head, b'{"tool_calls":', json_bytes(tool_calls), b'},"finish_reason":',
+                         self.FINISH_REASONS[finish_reason], b"}]}\n\n"))
+
+    def finish_chunk(self, finish_reason: str) -> bytes:
+        return b"".join((self.chunk_head, b'{},"finish_reason":', self.FINISH_REASONS[finish_reason], b"}]}\n\n"))
+
+    def completion(self, content: Optional[str], tool_calls: Optional[List[Dict[str, Any]]] = None) -> bytes:
+        """The whole non-streaming chat.completion body"""
+        parts = [self.completion_head, b"null" if content is None else json_string_bytes(content)]
+        if tool_calls:
+            parts += (b',"tool_calls":', json_bytes(tool_calls), b'},"finish_reason":"tool_calls"')
+        else:
+            parts.append(b'},"finish_reason":"stop"')
+        parts.append(self.COMPLETION_TAIL)
+        return b"".join(parts)
+
+
+class ResponseCache:
+    """LRU + TTL cache of bike4mind replies for repeated voice commands
+
+    Keys combine the bike4mind session, shim user, model and the normalized
+    last message (injected date/time prefix removed, case and whitespace
+    folded). Prompts matching the bypass pattern are never cached. Tool calls
+    are re-extracted from the cached text, so every hit gets fresh call_ IDs.
+    """
+
+    DATETIME_PREFIX = re.compile(r'^\s*\[Current date/time:[^\]]*\]\s*')
+    TRAILING_PUNCTUATION = re.compile(r'[\s.!?]+$')
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_sec: float, bypass_pattern: str):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_sec = ttl_sec
+        self.bypass = re.compile(bypass_pattern, re.IGNORECASE) if bypass_pattern else None
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, text, size)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+
+    @classmethod
+    def normalize(cls, message: str) -> str:
+        message = cls.DATETIME_PREFIX.sub('', message)
+        message = ' '.join(message.lower().split())
+        return cls.TRAILING_PUNCTUATION.sub('', message)
+
+    def key(self, message: str, model: str, user: Optional[str]) -> Optional[str]:
+        """Cache key for a prompt, or None if the prompt is time-sensitive"""
+        normalized = self.normalize(message)
+        if not normalized or (self.bypass and self.bypass.search(normalized)):
+            self.bypassed += 1
+            return None
+        return f"{HA_B4M_SESSION_ID}|{user or 'default'}|{model}|{normalized}"
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            metrics.cache_lookups.inc("miss")
+            return None
+        if entry[0] <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            metrics.cache_lookups.inc("miss")
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        metrics.cache_lookups.inc("hit")
+        return entry[1]
+
+    def put(self, key: str, text: str, ttl_sec: Optional[float] = None):
+        size = len(key) + len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + (ttl_sec or self.ttl_sec), text, size)
+        self.bytes += size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL_SEC, RESPONSE_CACHE_BYPASS_PATTERN
+) if RESPONSE_CACHE_ENABLED else None
+
+
+class IntentEngine:
+    """In-process matcher for simple device commands ("turn on office light")
+
+    Command phrases are matched with precompiled regexes; the device name is
+    resolved against an inverted token index of HA entities (friendly name and
+    object_id tokens plus domain synonyms), so matching only scores entities
+    sharing the rarest query token. Returns None below INTENT_MIN_CONFIDENCE
+    or when the best match is ambiguous, and the request goes to bike4mind.
+    """
+
+    STOPWORDS = {"the", "my", "a", "an", "please", "in", "of"}
+    DOMAIN_SYNONYMS = {
+        "light": {"light", "lights", "lamp", "lamps"},
+        "switch": {"switch", "plug", "outlet"},
+        "fan": {"fan"},
+        "input_boolean": set(),
+        "cover": {"cover", "blind", "blinds", "shade", "shades", "curtain", "curtains"},
+        "lock": {"lock"},
+        "scene": {"scene"},
+    }
+    ON_OFF_DOMAINS = ("light", "switch", "fan", "input_boolean")
+    # (pattern, verb group or fixed verb) -> verb selects domains/service below
+    COMMANDS = [
+        (re.compile(r'^(?:turn|switch) (on|off) (?P<name>.+)$'), None),
+        (re.compile(r'^(?:turn|switch) (?P<name>.+) (on|off)$'), None),
+        (re.compile(r'^(open|close) (?P<name>.+)$'), None),
+        (re.compile(r'^(lock|unlock) (?P<name>.+)$'), None),
+        (re.compile(r'^toggle (?P<name>.+)$'), "toggle"),
+        (re.compile(r'^(?:set|dim|brighten) (?P<name>.+) to (?P<pct>\d{1,3}) ?(?:%|percent)$'), "brightness"),
+        (re.compile(r'^activate (?P<name>.+?)(?: scene)?$'), "activate"),
+    ]
+    VERBS = {
+        "on": ({d: "turn_on" for d in ON_OFF_DOMAINS}, "Turning on {name}."),
+        "off": ({d: "turn_off" for d in ON_OFF_DOMAINS}, "Turning off {name}."),
+        "toggle": ({d: "toggle" for d in ON_OFF_DOMAINS}, "Toggling {name}."),
+        "open": ({"cover": "open_cover"}, "Opening {name}."),
+        "close": ({"cover": "close_cover"}, "Closing {name}."),
+        "lock": ({"lock": "lock"}, "Locking {name}."),
+        "unlock": ({"lock": "unlock"}, "Unlocking {name}."),
+        "brightness": ({"light": "turn_on"}, "Setting {name} to {pct}%."),
+        "activate": ({"scene": "turn_on"}, "Activating {name}."),
+    }
+
+    def __init__(self, min_confidence: float):
+        self.min_confidence = min_confidence
+        self.postings: Dict[str, Set[str]] = {}
+        self.entities: Dict[str, tuple] = {}  # entity_id -> (friendly_name, name_tokens, all_tokens)
+        self.loaded_at: Optional[float] = None
+        self.matches = 0
+        self.fallthroughs = 0
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        return [t for t in re.findall(r'[a-z0-9]+', text.lower()) if t not in cls.STOPWORDS]
+
+    def build_index(self, states: List[Dict[str, Any]]):
+        """Precompile the token index from /api/states; swaps in atomically"""
+        postings: Dict[str, Set[str]] = {}
+        entities: Dict[str, tuple] = {}
+        for state in states:
+            entity_id = state.get("entity_id", "")
+            domain, _, object_id = entity_id.partition(".")
+            if domain not in self.DOMAIN_SYNONYMS:
+                continue
+            friendly = (state.get("attributes") or {}).get("friendly_name") or object_id.replace("_", " ")
+            name_tokens = frozenset(self.tokenize(friendly)) | frozenset(self.tokenize(object_id.replace("_", " ")))
+            all_tokens = name_tokens | self.DOMAIN_SYNONYMS[domain]
+            entities[entity_id] = (friendly, name_tokens, all_tokens)
+            for token in all_tokens:
+                postings.setdefault(token, set()).add(entity_id)
+        self.postings, self.entities = postings, entities
+        self.loaded_at = time.monotonic()
+
+    def resolve(self, name: str, domains) -> Optional[tuple]:
+        """Best (entity_id, confidence) for a spoken device name within domains"""
+        query = set(self.tokenize(name))
+        if not query:
+            return None
+        lists = [self.postings.get(token) for token in query]
+        if any(not posting for posting in lists):
+            return None  # some word names no entity at all
+        # Entities explaining every spoken word: intersect postings, smallest first
+        lists.sort(key=len)
+        candidates = lists[0].intersection(*lists[1:])
+        scored = []
+        for entity_id in candidates:
+            if entity_id.partition(".")[0] not in domains:
+                continue
+            _, name_tokens, _ = self.entities[entity_id]
+            # Prefer entities with no extra name words
+            precision = len(query & name_tokens) / max(len(name_tokens), 1)
+            scored.append((0.5 + 0.5 * precision, entity_id))
+        if not scored:
+            return None
+        scored.sort(reverse=True)
+        best_score, best_id = scored[0]
+        if len(scored) > 1 and best_score - scored[1][0] < 0.1:
+            return None  # ambiguous
+        return best_id, best_score
+
+    def match(self, message: str) -> Optional[Dict[str, Any]]:
+        """Return {"action", "text", "confidence"} for a confident local match, else None"""
+        if not self.entities:
+            return None
+        text = ' '.join(ResponseCache.normalize(message).replace(',', ' ').split())
+        text = re.sub(r'^(?:please |hey |can you |could you )+|(?: please)$', '', text)
+        for pattern, fixed_verb in self.COMMANDS:
+            m = pattern.match(text)
+            if not m:
+                continue
+            verb = fixed_verb or next(g for g in m.groups() if g in self.VERBS)
+            services, template = self.VERBS[verb]
+            resolved = self.resolve(m.group('name'), services)
+            if not resolved or resolved[1] < self.min_confidence:
+                break
+            entity_id, confidence = resolved
+            domain = entity_id.partition(".")[0]
+            data: Dict[str, Any] = {}
+            pct = m.groupdict().get('pct')
+            if pct is not None:
+                if int(pct) > 100:
+                    break
+                data["brightness_pct"] = int(pct)
+            self.matches += 1
+            return {
+                "action": {
+                    "action": "call_service",
+                    "domain": domain,
+                    "service": services[domain],
+                    "entity_id": entity_id,
+                    "data": data
+                },
+                "text": template.format(name=self.entities[entity_id][0], pct=pct),
+                "confidence": confidence
+            }
+        self.fallthroughs += 1
+        return None
+
+    async def refresh(self):
+        """Pull entity states from the Home Assistant API and rebuild the index"""
+        response = await ha_client.get(
+            f"{EXTROVERT_HA_URL}/states",
+            headers={"Authorization": f"Bearer {EXTROVERT_HA_TOKEN}"},
+            timeout=10.0
+        )
+        response.raise_for_status()
+        self.build_index(response.json())
+        intent_log.info("🧭 Intent index refreshed", extra=log_fields(entities=len(self.entities)))
+
+    async def refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                intent_log.warning("⚠️ Intent index refresh failed", extra=log_fields(error=f"{type(e).__name__}: {e}"))
+            await asyncio.sleep(INTENT_REFRESH_SEC)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entities": len(self.entities),
+            "tokens": len(self.postings),
+            "matches": self.matches,
+            "fallthroughs": self.fallthroughs,
+            "index_age_sec": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None,
+        }
+
+
+intent_engine = IntentEngine(INTENT_MIN_CONFIDENCE) if INTENT_FASTPATH_ENABLED else None
+
+
+def ha_websocket_url(api_url: str) -> str:
+    """Home Assistant WebSocket API URL for a REST API URL (supervisor proxy or direct)"""
+    url = re.sub(r"^http", "ws", api_url.rstrip("/"))
+    if url.endswith("/core/api"):
+        return url[:-len("/api")] + "/websocket"  # ws://supervisor/core/websocket
+    return url + "/websocket"
+
+
+class PlaybackMonitor:
+    """Tracks media_player states through one Home Assistant WebSocket subscription
+
+    Shared by every request: subscribes to state_changed once, skips events
+    that don't mention a media_player before decoding them, and keeps each
+    player's state and when it last started playing. wait_playback() uses
+    that to wait for real playback instead of a length-based guess; while
+    disconnected, or if a player never reports playing, it falls back to
+    the estimate. Players that didn't report playing once get the estimate
+    right away until they do.
+    """
+
+    PLAYING_STATES = ("playing", "buffering")
+    START_TIMEOUT_SEC = 10.0  # a player that hasn't started by then isn't reporting playback
+    MAX_BACKOFF_SEC = 60.0
+
+    def __init__(self, url: str, token: str):
+        self.url = url
+        self.token = token
+        self.players: Dict[str, tuple] = {}  # entity_id -> (state, sequence when it last started playing)
+        self.sequence = 0
+        self.silent: Set[str] = set()  # players that didn't report playback
+        self.listeners: Set[Callable[[], None]] = set()
+        self.connected = False
+        self.task: Optional[asyncio.Task] = None
+        self.connects = 0
+        self.events = 0
+        self.skipped = 0
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+
+    def mark(self) -> int:
+        """Position to wait from; take it before starting playback"""
+        return self.sequence
+
+    def _changed(self):
+        for listener in list(self.listeners):
+            listener()
+
+    def _update(self, entity_id: str, state: str):
+        previous = self.players.get(entity_id)
+        if previous and previous[0] == state:
+            return  # Attribute-only change (volume, position)
+        self.sequence += 1
+        if state in self.PLAYING_STATES:
+            started = self.sequence
+            self.silent.discard(entity_id)
+        else:
+            started = previous[1] if previous else 0
+        self.players[entity_id] = (state, started)
+        self._changed()
+
+    def outcome(self, players: List[str], mark: int, started: float, estimate: float, now: float) -> tuple:
+        """(outcome or None, when to look again) for speech started at `started` on any of `players`"""
+        if not self.connected or all(player in self.silent for player in players):
+            return ("estimate", now) if now >= started + estimate else (None, started + estimate)
+        states = [self.players.get(player, ("unknown", 0)) for player in players]
+        if any(since > mark for _, since in states):
+            if not any(state in self.PLAYING_STATES for state, _ in states):
+                return "event", now
+            limit = started + max(estimate * 3, estimate + 60)  # a player stuck in "playing"
+            return ("timeout", now) if now >= limit else (None, limit)
+        if now < started + self.START_TIMEOUT_SEC:
+            return None, started + self.START_TIMEOUT_SEC
+        return ("estimate", now) if now >= started + estimate else (None, started + estimate)
+
+    async def wait_playback(self, players: List[str], mark: int, started: float, estimate: float) -> str:
+        """Wait until speech started after `mark` has finished on `players`; returns how that was decided"""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        self.listeners.add(changed.set)
+        try:
+            while True:
+                outcome, wake_at = self.outcome(players, mark, started, estimate, loop.time())
+                if outcome:
+                    if outcome == "estimate" and self.connected:
+                        self.silent.update(players)
+                    return outcome
+                changed.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(changed.wait(), max(wake_at - loop.time(), 0))
+        finally:
+            self.listeners.discard(changed.set)
+
+    async def _run(self):
+        backoff = 1.0
+        while True:
+            try:
+                async with websockets.connect(self.url, max_size=16 * 2**20, close_timeout=1) as ws:
+                    await self._subscribe(ws)
+                    self.connected = True
+                    self.connects += 1
+                    self.players.clear()  # States from before a reconnect may be stale
+                    self._changed()
+                    tts_log.info("📡 Subscribed to Home Assistant playback events", extra=log_fields(url=self.url))
+                    backoff = 1.0
+                    async for message in ws:
+                        # Most state_changed events are sensors; only decode the ones about media players
+                        if '"media_player.' not in message:
+                            self.skipped += 1
+                            continue
+                        data = json.loads(message)
+                        if data.get("type") != "event":
+                            continue
+                        event = data["event"].get("data", {})
+                        entity_id = event.get("entity_id", "")
+                        if entity_id.startswith("media_player."):
+                            self.events += 1
+                            self._update(entity_id, (event.get("new_state") or {}).get("state", "unavailable"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                tts_log.warning("⚠️ Home Assistant playback events unavailable, using estimates", extra=log_fields(
+                    error=f"{type(e).__name__}: {e}", retry_sec=backoff))
+            finally:
+                if self.connected:
+                    self.connected = False
+                    self._changed()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF_SEC)
+
+    async def _subscribe(self, ws):
+        message = json.loads(await ws.recv())
+        if message.get("type") == "auth_required":
+            await ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+            message = json.loads(await ws.recv())
+        if message.get("type") != "auth_ok":
+            raise ValueError(f"authentication failed: {message.get('message', message.get('type'))}")
+        await ws.send(json.dumps({"id": 1, "type": "subscribe_events", "event_type": "state_changed"}))
+        result = json.loads(await ws.recv())
+        if not result.get("success"):
+            raise ValueError(f"subscribe_events failed: {result.get('error')}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": True,
+            "url": self.url,
+            "connected": self.connected,
+            "connects": self.connects,
+            "events": self.events,
+            "skipped": self.skipped,
+            "players": {entity_id: state for entity_id, (state, _) in self.players.items()},
+            "silent_players": sorted(self.silent),
+        }
 
-    headers = {
-        "X-API-Key": B4M_API_KEY,
-        "Content-Type": "application/json"
-    }
 
-    try:
-        response = await http_client.post(
-            f"{B4M_BASE}/ai/llm",
-            json=payload,
-            headers=headers
-        )
-        response.raise_for_status()
-        data = response.json()
+playback_monitor = (PlaybackMonitor(HA_WEBSOCKET_URL or ha_websocket_url(EXTROVERT_HA_URL), EXTROVERT_HA_TOKEN)
+                    if HA_PLAYBACK_EVENTS and websockets is not None and EXTROVERT_HA_TOKEN
+                    and (VISUAL_ASSIST_ENABLED or EXTROVERT_ENABLED) else None)
 
-        # Quest ID may be in multiple locations depending on API response format
-        quest_id = (
-            data.get('questId') or
-            data.get('id') or
-            (data.get('quest', {}).get('id')) or
-            (data.get('quest', {}).get('_id'))
-        )
-        if not quest_id:
-            print(f"⚠️ No quest ID in response: {data}")
-            return None
 
-        return quest_id
-    except httpx.HTTPError as e:
-        print(f"❌ bike4mind quest creation failed: {e}")
-        raise HTTPException(status_code=502, detail=f"bike4mind API error: {str(e)}")
+async def wait_for_playback(players: List[str], mark: int, started: float, estimate: float) -> str:
+    """Wait for speech to end on `players`, from playback events when available, else the estimate"""
+    outcome = None
+    if playback_monitor:
+        try:
+            outcome = await playback_monitor.wait_playback(players, mark, started, estimate)
+        except Exception as e:
+            tts_log.warning("⚠️ Playback wait failed, using the estimate", extra=log_fields(error=repr(e)))
+    if outcome is None:
+        await asyncio.sleep(max(started + estimate - asyncio.get_running_loop().time(), 0))
+        outcome = "estimate"
+    metrics.playback_waits.inc(outcome)
+    return outcome
+
+
+class VisualIdleScheduler:
+    """Returns VISUAL_ASSIST to idle once a chat reply has been spoken, from one long-lived task
+
+    The reply is taken as spoken when a VISUAL_ASSIST_MEDIA_PLAYERS player
+    has played and stopped, or after the length-based estimate without
+    playback events. A newer reply replaces the pending one, and a new
+    request (thinking) cancels it.
+    """
+
+    def __init__(self, players: List[str]):
+        self.players = players
+        self.pending: Optional[tuple] = None  # (mark, started, estimate)
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+
+    def schedule(self, response_text: str):
+        # Estimate: ~16 chars per second (measured from actual Piper TTS)
+        # Min 1 second, max 30 seconds
+        estimate = min(max(len(response_text) / 16, 1.0), 30.0)
+        mark = playback_monitor.mark() if playback_monitor else 0
+        self.pending = (mark, asyncio.get_running_loop().time(), estimate)
+        self.wakeup.set()
+
+    def cancel(self):
+        self.pending = None
+        self.wakeup.set()
+
+    async def _run(self):
+        while True:
+            while self.pending is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            pending = self.pending
+            self.wakeup.clear()
+            wait = asyncio.create_task(wait_for_playback(self.players, *pending))
+            woken = asyncio.create_task(self.wakeup.wait())
+            try:
+                await asyncio.wait((wait, woken), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                woken.cancel()
+                wait.cancel()
+            if not wait.done() or wait.cancelled():
+                continue
+            if wait.exception() is not None:
+                # Don't leave the display on "speaking"
+                tts_log.warning("⚠️ Idle wait failed", extra=log_fields(error=repr(wait.exception())))
+            if self.pending is pending:
+                self.pending = None
+                visual_assist_manager.broadcast_state("idle")
 
 
-async def poll_b4m_quest(quest_id: str) -> Optional[str]:
-    """Poll bike4mind quest until done, return response text"""
-    headers = {
-        "X-API-Key": B4M_API_KEY,
-        "Content-Type": "application/json"
-    }
+visual_idle = VisualIdleScheduler(VISUAL_ASSIST_MEDIA_PLAYERS) if VISUAL_ASSIST_ENABLED else None
 
-    start_time = time.time()
-    timeout_sec = TIMEOUT_MS / 1000
-    poll_interval = POLL_INTERVAL_MS / 1000
-    attempt = 0
 
-    while True:
-        attempt += 1
-        elapsed = time.time() - start_time
+def schedule_visual_idle(response_text: str):
+    """Return VISUAL_ASSIST to idle once the reply has been spoken"""
+    if visual_idle:
+        visual_idle.schedule(response_text)
 
-        if elapsed > timeout_sec:
-            raise HTTPException(status_code=504, detail="bike4mind quest timeout")
 
+async def stream_chat_completion(quest_id: str, cache_key: Optional[str] = None) -> StreamingResponse:
+    """Stream reply text as chat.completion.chunk deltas while the quest runs
+
+    Waits for the first delta before responding so that quest failures still
+    surface as HTTP errors; later failures end the stream early.
+    """
+    render = CompletionRenderer(f"chatcmpl-{uuid.uuid4().hex[:12]}")
+    deltas = stream_b4m_quest(quest_id)
+    try:
+        first_delta = await deltas.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=500, detail="bike4mind quest done but no reply found")
+
+    # Broadcast "speaking" state (TTS can start on the first sentence)
+    if VISUAL_ASSIST_ENABLED and visual_assist_manager:
+        visual_assist_manager.broadcast_state("speaking")
+
+    async def generate_stream():
+        scanner = ToolCallScanner()
+        tool_calls: List[Dict[str, Any]] = []
+        buffer = delta = first_delta
+        completed = False
         try:
-            response = await http_client.get(
-                f"{B4M_BASE}/sessions/{HA_B4M_SESSION_ID}/chat/{quest_id}",
-                headers=headers
-            )
-            response.raise_for_status()
-            data = response.json()
+            yield render.content_chunk(first_delta, role=True)
+            while True:
+                # Tool calls are emitted as soon as their closing bracket arrives
+                for tool_call in scanner.feed(delta):
+                    tool_call["index"] = len(tool_calls)
+                    tool_calls.append(tool_call)
+                    yield render.tool_calls_chunk([tool_call])
+                try:
+                    delta = await deltas.__anext__()
+                except StopAsyncIteration:
+                    completed = True
+                    break
+                buffer += delta
+                yield render.content_chunk(delta)
+        except Exception as e:
+            quest_log.error("❌ Streaming quest failed", extra=log_fields(quest_id=quest_id, error=str(e)))
+        finally:
+            await deltas.aclose()
+            schedule_visual_idle(buffer)
 
-            status = data.get('status')
+        quest_log.info("✅ bike4mind response streamed", extra=log_fields(quest_id=quest_id, chars=len(buffer)))
+        if cache_key and completed:
+            response_cache.put(cache_key, buffer)
+        yield render.finish_chunk('tool_calls' if tool_calls else 'stop')
+        yield SSE_DONE
 
-            if status == 'done':
-                # Extract response (priority order)
-                ai_reply = None
-
-                # 1. Check replies array
-                if data.get('replies') and isinstance(data['replies'], list):
-                    ai_reply = '\n'.join(data['replies'])
-                # 2. Check reply field
-                elif data.get('reply'):
-                    ai_reply = data['reply']
-                # 3. Check questMasterReply
-                elif data.get('questMasterReply'):
-                    ai_reply = data['questMasterReply']
-                # 4. Check researchModeResults
-                elif data.get('researchModeResults'):
-                    results = [r.get('response') for r in data['researchModeResults'] if r.get('response')]
-                    if results:
-                        ai_reply = '\n\n'.join(results)
-
-                if not ai_reply:
-                    raise HTTPException(status_code=500, detail="bike4mind quest done but no reply found")
-
-                return ai_reply
-
-            elif status == 'stopped':
-                raise HTTPException(status_code=500, detail="bike4mind quest stopped")
-
-            elif status == 'running':
-                # Continue polling with backoff
-                await asyncio.sleep(poll_interval)
-                # Exponential backoff up to max
-                poll_interval = min(poll_interval * 1.2, POLL_MAX_INTERVAL_MS / 1000)
+    return StreamingResponse(generate_stream(), media_type="text/event-stream")
 
-            else:
-                print(f"⚠️ Unknown quest status: {status}")
-                await asyncio.sleep(poll_interval)
 
-        except httpx.HTTPError as e:
-            print(f"⚠️ Polling error (attempt {attempt}): {e}")
-            await asyncio.sleep(poll_interval)
+# Speculative quest creation
+JSON_WHITESPACE = " \t\r\n"
 
 
-def extract_tool_calls(response_text: str) -> Optional[List[Dict[str, Any]]]:
-    """Extract JSON tool-call from bike4mind response"""
-    # Look for JSON code blocks
-    pattern = r'```json\s*(\{.*?\})\s*```'
-    matches = re.findall(pattern, response_text, re.DOTALL)
+def find_last_message(body: bytes, max_attempts: int = 256) -> Optional[Dict[str, Any]]:
+    """Decode only the last chat message of a request body
 
-    if not matches:
+    Searches backwards from the end for an object with "role" and "content"
+    that is the final element of an array, so earlier messages in a long
+    history are never decoded. A wrong guess is harmless: the result is
+    checked against the fully validated request before it is used.
+    """
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
         return None
-
-    tool_calls = []
-    for match in matches:
+    position = len(text)
+    for _ in range(max_attempts):
+        position = text.rfind("{", 0, position)
+        if position < 0:
+            return None
         try:
-            data = json.loads(match)
-
-            # Check if it's a Home Assistant action
-            if data.get('action') == 'call_service':
-                tool_call = {
-                    "id": f"call_{uuid.uuid4().hex[:8]}",
-                    "type": "function",
-                    "function": {
-                        "name": HA_TOOL_FUNCTION_NAME,
-                        "arguments": json.dumps({
-                            "domain": data.get('domain'),
-                            "service": data.get('service'),
-                            "entity_id": data.get('entity_id'),
-                            "data": data.get('data', {})
-                        })
-                    }
-                }
-                tool_calls.append(tool_call)
-        except json.JSONDecodeError:
+            candidate, end = JSON_DECODER.raw_decode(text, position)
+        except ValueError:
+            continue
+        if not (isinstance(candidate, dict) and "role" in candidate and "content" in candidate):
             continue
+        before = position - 1
+        while before >= 0 and text[before] in JSON_WHITESPACE:
+            before -= 1
+        after = end
+        while after < len(text) and text[after] in JSON_WHITESPACE:
+            after += 1
+        if before >= 0 and text[before] in "[," and text[after:after + 1] == "]":
+            return candidate
+    return None
+
+
+class SpeculativeQuest:
+    """bike4mind quest started from the raw body's last message, before full validation
+
+    The handler claims it once the validated last message turns out to be the
+    same; otherwise (or when validation fails) it is discarded.
+    """
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.intent: Optional[Dict[str, Any]] = None
+        self.task: Optional[asyncio.Task] = None
+        self.claimed = False
+
+    @classmethod
+    def start(cls, body: bytes) -> Optional["SpeculativeQuest"]:
+        message = find_last_message(body)
+        if message is None:
+            return None
+        role, content = message.get("role"), message.get("content")
+        if not isinstance(role, str) or not isinstance(content, str):
+            return None
+        speculative = cls(role, content)
+        if intent_engine and role == 'user':
+            speculative.intent = intent_engine.match(content)
+            if speculative.intent is not None:
+                return speculative  # Answered locally, no quest needed
+        speculative.task = asyncio.create_task(create_b4m_quest(content))
+        return speculative
+
+    def matches(self, message: Message) -> bool:
+        return message.role == self.role and message.content == self.content
+
+    async def claim(self) -> Optional[str]:
+        self.claimed = True
+        metrics.speculative_quests.inc("used")
+        return await self.task
+
+    def discard(self):
+        if self.claimed or self.task is None:
+            return
+        self.claimed = True
+        metrics.speculative_quests.inc("discarded")
+        if not self.task.done():
+            self.task.cancel()
+        elif not self.task.cancelled() and self.task.exception() is None and self.task.result():
+            quest_log.warning("⚠️ Abandoned speculative quest", extra=log_fields(quest_id=self.task.result()))
 
-    return tool_calls if tool_calls else None
+
+async def validate_chat_request(body: bytes) -> ChatCompletionRequest:
+    """Full Pydantic validation straight from JSON; large bodies are validated off the event loop"""
+    try:
+        if len(body) >= SPECULATIVE_THREAD_MIN_BYTES:
+            return await asyncio.to_thread(ChatCompletionRequest.model_validate_json, body)
+        await asyncio.sleep(0)  # Let a speculative quest's POST go out first
+        return ChatCompletionRequest.model_validate_json(body)
+    except ValidationError as e:
+        # Same shape as FastAPI's own body errors
+        raise RequestValidationError([
+            {"type": error["type"], "loc": ("body", *error["loc"]), "msg": error["msg"],
+             **({"input": error["input"]} if not isinstance(error.get("input"), bytes) else {})}
+            for error in e.errors(include_url=False)
+        ])
 
 
 # API endpoints
@@ -393,13 +3718,36 @@ async def health_check():
     return {"status": "healthy", "service": "bike4mind-shim"}
 
 
-@app.post("/v1/chat/completions", dependencies=[Depends(verify_shim_auth)])
-async def chat_completions(request: ChatCompletionRequest):
-    """OpenAI-compatible chat completions endpoint"""
+@app.post("/v1/chat/completions", dependencies=[Depends(verify_shim_auth)],
+          openapi_extra={"requestBody": {"content": {"application/json": {
+              "schema": ChatCompletionRequest.model_json_schema()}}, "required": True}})
+async def chat_completions(raw_request: Request):
+    """OpenAI-compatible chat completions endpoint
+
+    The body is parsed here rather than by FastAPI so the bike4mind quest
+    for the last message can be created while the full history is validated.
+    """
+    body = await raw_request.body()
+    # The cache lookup, the context plan (history depth is capped by the request's messages and the user's
+    # shim session) and the user's bike4mind session need the validated request
+    speculate = SPECULATIVE_QUESTS and not response_cache and CONTEXT_MODE == "fixed" and not b4m_session_pool
+    speculative = SpeculativeQuest.start(body) if speculate else None
+    try:
+        request = await validate_chat_request(body)
+        return await complete_chat(request, speculative)
+    finally:
+        if speculative:
+            speculative.discard()
+
 
-    # Get or create shim session
-    shim_session = get_or_create_shim_session(request.user)
-    shim_session["turn_count"] += 1
+async def complete_chat(request: ChatCompletionRequest, speculative: Optional[SpeculativeQuest] = None):
+    """Answer a validated chat completion request"""
+    if speculative and not (request.messages and speculative.matches(request.messages[-1])):
+        speculative.discard()
+        speculative = None
+
+    # Count the turn in the user's shim session
+    session_turns, b4m_session_id = await record_shim_turn(request.user)
 
     # Extract last message
     if not request.messages:
@@ -409,162 +3757,565 @@ async def chat_completions(request: ChatCompletionRequest):
 
     # Broadcast "thinking" state if VISUAL_ASSIST enabled (bike4mind is processing)
     if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-        await visual_assist_manager.broadcast_state("thinking")
-
-    try:
-        # Create bike4mind quest
-        print(f"🤖 Creating bike4mind quest: {last_message[:50]}...")
-        quest_id = await create_b4m_quest(last_message)
+        visual_idle.cancel()
+        visual_assist_manager.broadcast_state("thinking")
 
-        if not quest_id:
-            raise HTTPException(status_code=502, detail="Failed to create bike4mind quest")
+    # Simple device commands can be answered locally without a bike4mind quest
+    intent = None
+    if speculative:
+        intent = speculative.intent
+    elif intent_engine and request.messages[-1].role == 'user':
+        intent = intent_engine.match(last_message)
 
-        # Poll for response
-        print(f"⏳ Polling quest {quest_id}...")
-        response_text = await poll_b4m_quest(quest_id)
+    # Repeated voice commands can be answered from the response cache
+    cache_key = response_cache.key(last_message, B4M_MODEL, request.user) if response_cache and not intent else None
+    cached_text = response_cache.get(cache_key) if cache_key else None
 
-        print(f"✅ bike4mind response received ({len(response_text)} chars)")
+    try:
+        tool_calls = None
+        if intent is not None:
+            action = intent['action']
+            intent_log.info("⚡ Local intent", extra=log_fields(
+                confidence=round(intent['confidence'], 2), service=f"{action['domain']}.{action['service']}",
+                entity_id=action['entity_id']))
+            response_text = intent["text"]
+            tool_calls = [tool_call_from_action(intent["action"])]
+        elif cached_text is not None:
+            log.info("⚡ Cache hit", extra=log_fields(message=last_message[:50]))
+            response_text = cached_text
+        else:
+            try:
+                # Create bike4mind quest
+                quest_log.info("🤖 Creating bike4mind quest", extra=log_fields(
+                    message=last_message[:50], speculative=bool(speculative)))
+                if speculative:
+                    quest_id = await speculative.claim()
+                else:
+                    context = context_manager.plan(last_message, request.messages[:-1], session_turns)
+                    quest_id = await create_b4m_quest(last_message, context, b4m_session_id)
+
+                if not quest_id:
+                    raise HTTPException(status_code=502, detail="Failed to create bike4mind quest")
+
+                if request.stream and STREAM_PARTIAL_REPLIES:
+                    quest_log.info("⏳ Streaming quest", extra=log_fields(quest_id=quest_id))
+                    return await stream_chat_completion(quest_id, cache_key)
+
+                # Poll for response
+                quest_log.info("⏳ Polling quest", extra=log_fields(quest_id=quest_id))
+                response_text = await poll_b4m_quest(quest_id)
+
+                quest_log.info("✅ bike4mind response received", extra=log_fields(quest_id=quest_id, chars=len(response_text)))
+                if cache_key:
+                    response_cache.put(cache_key, response_text)
+            except UpstreamUnavailable as e:
+                if not B4M_FALLBACK_REPLY:
+                    raise
+                # Speak a short apology instead of leaving the voice satellite hanging
+                quest_log.warning("🔌 bike4mind unavailable, sending fallback reply", extra=log_fields(reason=e.detail))
+                response_text = B4M_FALLBACK_REPLY
+                tool_calls = []
 
         # Broadcast "speaking" state (TTS will now play the response)
         if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-            await visual_assist_manager.broadcast_state("speaking")
+            visual_assist_manager.broadcast_state("speaking")
 
         # Extract tool calls
-        tool_calls = extract_tool_calls(response_text)
+        if tool_calls is None:
+            tool_calls = extract_tool_calls(response_text)
 
         # Build OpenAI response
-        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        render = CompletionRenderer(f"chatcmpl-{uuid.uuid4().hex[:12]}")
 
         if request.stream:
-            # Streaming response
+            # Streaming response (whole reply in one chunk)
             async def generate_stream():
                 # Send content chunks
                 if response_text:
-                    yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'bike4mind', 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': response_text}, 'finish_reason': None}]})}\n\n"
+                    yield render.content_chunk(response_text, role=True)
 
                 # Send tool_calls in final chunk if present
                 if tool_calls:
-                    yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'bike4mind', 'choices': [{'index': 0, 'delta': {'tool_calls': tool_calls}, 'finish_reason': 'tool_calls'}]})}\n\n"
+                    yield render.tool_calls_chunk(tool_calls, 'tool_calls')
                 else:
-                    yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'bike4mind', 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+                    yield render.finish_chunk('stop')
 
-                yield "data: [DONE]\n\n"
-
-            # Estimate TTS duration based on measured Piper speech rate
-            # For now, use a fixed timeout for TTS playback
-            async def wait_for_tts():
-                # Estimate: ~16 chars per second (measured from actual Piper TTS)
-                # Min 1 second, max 30 seconds
-                estimated_duration = min(max(len(response_text) / 16, 1.0), 30.0)
-                await asyncio.sleep(estimated_duration)
-                if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                    await visual_assist_manager.broadcast_state("idle")
+                yield SSE_DONE
 
             # Start TTS timeout task in background (don't await)
-            if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                asyncio.create_task(wait_for_tts())
+            schedule_visual_idle(response_text)
 
             return StreamingResponse(generate_stream(), media_type="text/event-stream")
 
         else:
-            # Non-streaming response
-            response = {
-                "id": completion_id,
-                "object": "chat.completion",
-                "created": int(time.time()),
-                "model": "bike4mind",
-                "choices": [{
-                    "index": 0,
-                    "message": {
-                        "role": "assistant",
-                        "content": response_text
-                    },
-                    "finish_reason": "tool_calls" if tool_calls else "stop"
-                }],
-                "usage": {
-                    "prompt_tokens": 0,
-                    "completion_tokens": 0,
-                    "total_tokens": 0
-                }
-            }
-
-            # Add tool_calls if present
-            if tool_calls:
-                response["choices"][0]["message"]["tool_calls"] = tool_calls
+            # Non-streaming response, tool_calls included if present
+            body = render.completion(response_text, tool_calls)
 
             # Estimate TTS duration and return to idle after timeout
-            async def wait_for_tts():
-                # Estimate: ~16 chars per second (measured from actual Piper TTS)
-                # Min 1 second, max 30 seconds
-                estimated_duration = min(max(len(response_text) / 16, 1.0), 30.0)
-                await asyncio.sleep(estimated_duration)
-                if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                    await visual_assist_manager.broadcast_state("idle")
+            schedule_visual_idle(response_text)
 
-            # Start TTS timeout task in background (don't await)
-            if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                asyncio.create_task(wait_for_tts())
-
-            return JSONResponse(response)
+            return Response(body, media_type="application/json")
 
     except Exception as e:
         # Return to idle on any error
         if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-            await visual_assist_manager.broadcast_state("idle")
+            visual_assist_manager.broadcast_state("idle")
         raise
 
 
+@app.get("/metrics", dependencies=[Depends(verify_shim_auth)])
+async def metrics_endpoint():
+    """Prometheus text-format metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/admin/reset_session", dependencies=[Depends(verify_shim_auth)])
 async def reset_session(request: Request):
     """Reset internal shim session"""
     data = await request.json()
     user_id = data.get('user_id', 'default')
 
-    if user_id in shim_sessions:
-        del shim_sessions[user_id]
+    deleted = await shim_sessions.delete(user_id) if shared_state else shim_sessions.delete(user_id)
+    if deleted:
         return {"status": "reset", "user_id": user_id}
 
     return {"status": "not_found", "user_id": user_id}
 
 
-# Missing import
-import asyncio
+@app.get("/admin/sessions", dependencies=[Depends(verify_shim_auth)])
+async def session_stats():
+    """Shim session store size and eviction counters"""
+    return shim_sessions.stats()
+
+
+@app.get("/admin/pools", dependencies=[Depends(verify_shim_auth)])
+async def pool_stats():
+    """Per-upstream connection pool wait times"""
+    return {
+        "bike4mind": {**b4m_pool_stats.stats(), "pool_size": B4M_POOL_SIZE,
+                      "http2": B4M_HTTP2 and h2 is not None},
+        "home_assistant": {**ha_pool_stats.stats(), "pool_size": HA_POOL_SIZE},
+    }
+
+
+@app.get("/admin/quests", dependencies=[Depends(verify_shim_auth)])
+async def quest_stats():
+    """Quest multiplexer saturation: pending quests, queue depth, in-flight polls"""
+    return quest_multiplexer.stats()
+
+
+@app.get("/admin/upstream", dependencies=[Depends(verify_shim_auth)])
+async def upstream_stats():
+    """bike4mind circuit breaker state, retry policy and hedge delay"""
+    p95 = quest_create_latency.percentile(0.95)
+    return {
+        "breaker": b4m_breaker.stats(),
+        "retries": B4M_RETRIES,
+        "hedge_enabled": B4M_HEDGE_ENABLED,
+        "hedge_delay_ms": round(max(p95, B4M_HEDGE_MIN_MS / 1000) * 1000) if p95 is not None else None,
+        "create_samples": len(quest_create_latency.samples),
+    }
+
+
+@app.get("/admin/playback", dependencies=[Depends(verify_shim_auth)])
+async def playback_stats():
+    """Home Assistant playback event subscription and the media players it has seen"""
+    return playback_monitor.stats() if playback_monitor else {"enabled": False}
+
+
+@app.get("/admin/journal", dependencies=[Depends(verify_shim_auth)])
+async def journal_stats():
+    """Quest journal size, rotations and resumable quests"""
+    if not quest_journal:
+        return {"enabled": False}
+    return {"enabled": True, **quest_journal.stats()}
+
+
+@app.get("/admin/workers", dependencies=[Depends(verify_shim_auth)])
+async def worker_stats():
+    """Multi-worker mode: the answering worker and the shared state backend"""
+    if not shared_state:
+        return {"enabled": False, "pid": os.getpid()}
+    return {"enabled": True, "workers": WORKERS, "worker": worker_slot, "pid": os.getpid(), **shared_state.stats()}
+
+
+@app.get("/admin/cache", dependencies=[Depends(verify_shim_auth)])
+async def cache_stats():
+    """Response cache hit/miss counters"""
+    if not response_cache:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+
+@app.get("/admin/intents", dependencies=[Depends(verify_shim_auth)])
+async def intent_stats():
+    """Local intent matcher index size and match counters"""
+    if not intent_engine:
+        return {"enabled": False}
+    return {"enabled": True, **intent_engine.stats()}
+
+
+@app.post("/admin/cache/clear", dependencies=[Depends(verify_shim_auth)])
+async def cache_clear():
+    """Drop all cached responses"""
+    if response_cache:
+        response_cache.clear()
+    return {"status": "cleared"}
 
 
 # EXTROVERT endpoints (conditionally registered)
 if EXTROVERT_ENABLED:
+    class TTSSanitizer:
+        """Single-pass cleanup of bike4mind replies for TTS
+
+        Drops code fences and JSON blocks (tool calls), unwraps inline code,
+        **bold**, *italic* and [links](url), collapses runs of blank lines and
+        stops after max_words words with "...". Text is fed whole or as
+        streamed deltas: feed() returns the part that can no longer change and
+        holds back a tail that may still turn into markup (`, *, [ or {) plus
+        trailing whitespace. Inline markup doesn't span a blank line, so at
+        most a paragraph is held. Inside an open fence or JSON block only the
+        scan state is kept, and a block still open at the end is dropped.
+        Braces around ordinary prose are removed but the prose is kept, and
+        "* " list bullets are dropped (* followed by whitespace never opens
+        emphasis).
+        """
+
+        SPECIAL = re.compile(r'[`*\[{]')
+        JSON_START = re.compile(r'\{\s*["}]')
+        JSON_TOKEN = re.compile(r'[{}"\\]')
+        WORD = re.compile(r'\S+')
+        BLANK_LINES = re.compile(r'\n{3,}')
+
+        def __init__(self, max_words: int = 200):
+            self.max_words = max_words
+            self.buffer = ""  # Input from the first construct that isn't complete yet
+            self.skip: Optional[tuple] = None  # ("fence", last chars) or ("json", depth, in_string, escaped)
+            self.line_start = True  # Whether the buffer starts at the beginning of a line
+            self.ws = ""  # Trailing whitespace of the output, released with the next text
+            self.words = 0
+            self.started = False
+            self.done = False
+
+        def feed(self, delta: str) -> str:
+            if self.done:
+                return ""
+            if self.skip:
+                delta = self._skip(delta)
+                if delta is None:
+                    return ""
+                self.line_start = False
+            self.buffer += delta
+            text, stop = self._scan(self.buffer, final=False, line_start=self.line_start)
+            if stop:
+                self.line_start = self.buffer[stop - 1] == "\n"
+            self.buffer = self.buffer[stop:]
+            return self._release(text, final=False)
+
+        def flush(self) -> str:
+            """Everything still held, once the reply is complete"""
+            if self.done:
+                return ""
+            text, _ = self._scan(self.buffer, final=True, line_start=self.line_start)
+            self.buffer, self.skip, self.line_start = "", None, True
+            return self._release(text, final=True)
+
+        def _scan(self, text: str, final: bool, line_start: bool = False) -> tuple:
+            """Sanitized text and the offset of the first construct that may still change"""
+            out: List[str] = []
+            pos, n = 0, len(text)
+            while pos < n:
+                match = self.SPECIAL.search(text, pos)
+                if not match:
+                    out.append(text[pos:])
+                    break
+                i = match.start()
+                out.append(text[pos:i])
+                pos, replacement = self._construct(text, i, final, text[i - 1] == "\n" if i else line_start)
+                if pos is None:
+                    return "".join(out), i
+                out.append(replacement)
+                if self.skip:
+                    break  # The rest is inside a block that isn't closed yet
+            return "".join(out), n
+
+        def _construct(self, text: str, i: int, final: bool, line_start: bool) -> tuple:
+            """(end, replacement) for the markup starting at i, or (None, None) if more input is needed"""
+            char, n = text[i], len(text)
+            if char == "`" and text.startswith("```", i):
+                close = text.find("```", i + 3)
+                if close != -1:
+                    return close + 3, ""
+                if not final:
+                    self.skip = ("fence", text[i + 3:][-2:])
+                return n, ""
+            if char == "`" and not final and n - i < 3:
+                return None, None  # May become a fence
+            if char == "*" and text[i + 1:i + 2].isspace():
+                return i + 1, "" if line_start else char
+            if char in "`*":
+                width = 2 if text.startswith("**", i) else 1
+                close = text.find(char, i + width)
+                if close == -1 or (width == 2 and close == n - 1):
+                    return (i + 1, char) if final or self._blank_line(text, i, n) else (None, None)
+                if close > i + width and (width == 1 or text[close + 1] == "*") \
+                        and not self._blank_line(text, i, close):
+                    return close + width, self._scan(text[i + width:close], final=True)[0]
+                return i + 1, char
+            if char == "[":
+                close = text.find("]", i + 1)
+                paren = text.find(")", close + 2) if close != -1 and text.startswith("(", close + 1) else -1
+                if close == -1 or close == n - 1 or (paren == -1 and text.startswith("(", close + 1)):
+                    return (i + 1, char) if final or self._blank_line(text, i, n) else (None, None)
+                if close > i + 1 and paren > close + 2 and not self._blank_line(text, i, paren):
+                    return paren + 1, self._scan(text[i + 1:close], final=True)[0]
+                return i + 1, char
+            if self.JSON_START.match(text, i):
+                end, state = self._json_end(text, i + 1, 1, False, False)
+                if end is None and not final:
+                    self.skip = state
+                return end or n, ""
+            if not final and not text[i + 1:].strip():
+                return None, None  # May become JSON
+            close = text.find("}", i + 1)
+            if close == -1 or self._blank_line(text, i, close):
+                return (i + 1, char) if final or self._blank_line(text, i, n) else (None, None)
+            return close + 1, self._scan(text[i + 1:close], final=True)[0]
+
+        def _json_end(self, text: str, pos: int, depth: int, in_string: bool, escaped: bool) -> tuple:
+            """End of a JSON value whose scan is at pos, honouring strings; else (None, scan state)"""
+            n = len(text)
+            if escaped:
+                if pos >= n:
+                    return None, ("json", depth, in_string, True)
+                pos += 1
+            while True:
+                token = self.JSON_TOKEN.search(text, pos)
+                if not token:
+                    return None, ("json", depth, in_string, False)
+                char, pos = token.group(), token.end()
+                if char == "\\":
+                    if pos == n:
+                        return None, ("json", depth, in_string, True)
+                    pos += 1
+                elif char == '"':
+                    in_string = not in_string
+                elif in_string:
+                    continue
+                elif char == "{":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        return pos, None
+
+        def _skip(self, delta: str) -> Optional[str]:
+            """Continue through an open fence or JSON block; the input after it, or None if still inside"""
+            if self.skip[0] == "fence":
+                text = self.skip[1] + delta
+                close = text.find("```")
+                if close == -1:
+                    self.skip = ("fence", text[-2:])
+                    return None
+                self.skip = None
+                return text[close + 3:]
+            end, self.skip = self._json_end(delta, 0, *self.skip[1:])
+            return None if end is None else delta[end:]
+
+        @staticmethod
+        def _blank_line(text: str, start: int, end: int) -> bool:
+            return text.find("\n\n", start, end) != -1
+
+        def _release(self, text: str, final: bool) -> str:
+            """Apply leading/trailing whitespace, blank line and word limit rules to new output"""
+            text = self.ws + text
+            continues = self.started and text[:1] and not text[0].isspace()
+            if not self.started:
+                text = text.lstrip()
+            body = text.rstrip()
+            self.ws = "" if final else text[len(body):]
+            if not body:
+                return ""
+            self.started = True
+            if "\n\n\n" in body:
+                body = self.BLANK_LINES.sub('\n\n', body)
+            words = len(body.split()) - bool(continues)
+            if self.words + words <= self.max_words:
+                self.words += words
+                return body
+            cut = 0
+            for match in itertools.islice(self.WORD.finditer(body), self.max_words - self.words + bool(continues)):
+                cut = match.end()
+            self.done, self.buffer, self.ws = True, "", ""
+            return body[:cut] + "..."
+
+
     def sanitize_response_for_tts(text: str, max_words: int = 200) -> str:
         """
         Sanitize bike4mind response for TTS output
         - Strips markdown formatting
         - Removes JSON blocks (prevents tool calls)
         - Truncates to max_words
+        Long replies are scanned in chunks, so text past the word limit isn't processed.
+        """
+        sanitizer = TTSSanitizer(max_words)
+        parts = []
+        for start in range(0, len(text), 4096):
+            parts.append(sanitizer.feed(text[start:start + 4096]))
+            if sanitizer.done:
+                break
+        parts.append(sanitizer.flush())
+        return "".join(parts)
+
+
+    class SentenceSplitter:
+        """Incremental sentence splitter for pipelined speech
+
+        Text is fed as it arrives (whole replies or streamed deltas) and
+        complete sentences are returned as soon as their terminator and the
+        following whitespace are in. A sentence ends at . ! or ? (plus closing
+        quotes/brackets) followed by whitespace, or at a newline; common
+        abbreviations and single-letter initials don't end one. Boundaries
+        inside code fences or {...} blocks are ignored so the sanitizer sees
+        those blocks whole, and pieces shorter than min_chars are merged into
+        the next sentence. Every character is examined a constant number of
+        times, so splitting is linear in the reply length.
         """
-        # Strip markdown code blocks
-        text = re.sub(r'```[\s\S]*?```', '', text)
-
-        # Strip inline code
-        text = re.sub(r'`([^`]+)`', r'\1', text)
-
-        # Strip bold/italic
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-        text = re.sub(r'\*([^*]+)\*', r'\1', text)
-
-        # Strip markdown links
-        text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-
-        # Strip JSON blocks (tool calls)
-        text = re.sub(r'\{[\s\S]*?\}', '', text)
 
-        # Clean up multiple newlines
-        text = re.sub(r'\n{3,}', '\n\n', text)
+        TERMINATORS = ".!?"
+        CLOSERS = "\"')]*_"
+        ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e", "approx", "no", "jr", "sr"}
+
+        def __init__(self, min_chars: int = 20):
+            self.min_chars = min_chars
+            self.chars: List[str] = []  # Unemitted text, one character per item (amortized O(1) append)
+            self.start = 0  # Beginning of the sentence being collected
+            self.pos = 0  # Next character to examine
+            self.terminator: Optional[int] = None  # Start of a run of terminators/closers being examined
+            self.ticks = 0  # Consecutive backticks seen
+            self.in_fence = False
+            self.depth = 0  # {...} nesting outside fences
+
+        def feed(self, delta: str) -> List[str]:
+            if self.start > len(self.chars) // 2:
+                # Drop emitted text once it is most of the buffer, so each character is moved O(1) times
+                del self.chars[:self.start]
+                self.pos -= self.start
+                if self.terminator is not None:
+                    self.terminator -= self.start
+                self.start = 0
+            self.chars.extend(delta)
+            sentences = []
+            text, n = self.chars, len(self.chars)
+            while self.pos < n:
+                char = text[self.pos]
+                if self.terminator is not None:
+                    # After . ! ?: skip repeated terminators and closers, then require whitespace
+                    if char in self.TERMINATORS or char in self.CLOSERS:
+                        self.pos += 1
+                        continue
+                    if char.isspace() and not self._abbreviation(self.terminator):
+                        self._emit(self.pos, sentences)
+                    self.terminator = None
+                if char == "`":
+                    self.ticks += 1
+                    if self.ticks == 3:
+                        self.in_fence = not self.in_fence
+                        self.ticks = 0
+                    self.pos += 1
+                    continue
+                self.ticks = 0
+                if self.in_fence:
+                    self.pos += 1
+                    continue
+                if char == "{":
+                    self.depth += 1
+                elif char == "}":
+                    self.depth = max(self.depth - 1, 0)
+                if self.depth:
+                    self.pos += 1
+                    continue
+                if char == "\n":
+                    self._emit(self.pos + 1, sentences)
+                    self.pos += 1
+                    continue
+                if char in self.TERMINATORS:
+                    self.terminator = self.pos
+                self.pos += 1
+            return sentences
+
+        def _abbreviation(self, dot: int) -> bool:
+            if self.chars[dot] != ".":
+                return False
+            word_start = dot
+            while word_start > self.start and not self.chars[word_start - 1].isspace():
+                word_start -= 1
+            word = "".join(self.chars[word_start:dot]).lower()
+            return word in self.ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+        def _emit(self, end: int, sentences: List[str]):
+            sentence = "".join(self.chars[self.start:end]).strip()
+            if len(sentence) < self.min_chars:
+                return
+            sentences.append(sentence)
+            self.start = end
+
+        def flush(self) -> List[str]:
+            """Whatever is left once the reply is complete"""
+            rest = "".join(self.chars[self.start:]).strip()
+            self.chars, self.start, self.pos, self.terminator = [], 0, 0, None
+            return [rest] if rest else []
+
+
+    def split_sentences(text: str, min_chars: int = 20) -> List[str]:
+        splitter = SentenceSplitter(min_chars)
+        return splitter.feed(text) + splitter.flush()
+
+
+    def ha_headers() -> Dict[str, str]:
+        return {"Authorization": f"Bearer {EXTROVERT_HA_TOKEN}", "Content-Type": "application/json"}
+
+
+    async def synthesize_tts(text: str, voice_override: Optional[str] = None) -> Optional[str]:
+        """Render speech in Home Assistant without playing it; returns the audio URL
+
+        Uses /api/tts_get_url with caching so the audio is ready when
+        media_player.play_media is called. Returns None if HA refuses (older
+        versions, engines without an entity), so callers can fall back to the
+        combined TTS service call.
+        """
+        voice = voice_override or EXTROVERT_TTS_VOICE or None
+        body: Dict[str, Any] = {"engine_id": EXTROVERT_TTS_ENTITY_ID, "message": text, "cache": True}
+        if voice:
+            body["options"] = {"voice": voice}
+        try:
+            with metrics.tts_seconds.time():
+                response = await ha_client.post(f"{EXTROVERT_HA_URL}/tts_get_url", json=body,
+                                                headers=ha_headers(), timeout=10.0)
+            response.raise_for_status()
+            return response.json().get("url")
+        except (httpx.HTTPError, ValueError) as e:
+            if isinstance(e, httpx.TimeoutException):
+                metrics.timeouts.inc("home_assistant")
+            tts_log.warning("⚠️ TTS synthesis failed, using the TTS service", extra=log_fields(
+                error=f"{type(e).__name__}: {e}"))
+            return None
 
-        # Truncate to max words
-        words = text.split()
-        if len(words) > max_words:
-            text = ' '.join(words[:max_words]) + '...'
 
-        return text.strip()
+    async def play_tts_url(url: str, media_player: str) -> bool:
+        """Start playback of already rendered speech on a media player"""
+        try:
+            response = await ha_client.post(
+                f"{EXTROVERT_HA_URL}/services/media_player/play_media",
+                json={"entity_id": media_player, "media_content_id": url, "media_content_type": "music"},
+                headers=ha_headers(), timeout=10.0
+            )
+            response.raise_for_status()
+            return True
+        except httpx.HTTPError as e:
+            tts_log.warning("⚠️ Playback failed (silent)", extra=log_fields(
+                media_player=media_player, error=f"{type(e).__name__}: {e}"))
+            return False
 
 
     async def trigger_ha_tts(text: str, media_player: Optional[str], voice_override: Optional[str] = None) -> bool:
@@ -604,181 +4355,913 @@ if EXTROVERT_ENABLED:
             service_name = EXTROVERT_TTS_ENTITY_ID.split('.', 1)[1]  # Get part after 'tts.'
             tts_url = f"{EXTROVERT_HA_URL}/services/tts/{service_name}"
 
-            print(f"🔊 EXTROVERT: Calling TTS service")
-            print(f"   URL: {tts_url}")
-            print(f"   TTS Entity: {service_data.get('entity_id')}")
-            print(f"   Media Player: {service_data.get('media_player_entity_id', 'not specified')}")
-            print(f"   Message: {text[:50]}{'...' if len(text) > 50 else ''}")
-            print(f"   Voice: {voice if voice else 'default'}")
-            print(f"   Full service_data: {service_data}")
-
-            response = await http_client.post(
-                tts_url,
-                json=service_data,
-                headers=headers,
-                timeout=10.0
-            )
+            tts_log.info("🔊 Calling TTS service", extra=log_fields(
+                url=tts_url,
+                media_player=media_player,
+                voice=voice or "default",
+                chars=len(text),
+            ))
+            tts_log.debug("TTS service data", extra=log_fields(service_data=service_data))
+
+            with metrics.tts_seconds.time():
+                response = await ha_client.post(
+                    tts_url,
+                    json=service_data,
+                    headers=headers,
+                    timeout=10.0
+                )
 
             response.raise_for_status()
-            voice_msg = f" with voice: {voice}" if voice else ""
-            override_msg = " (overridden)" if voice_override else " (from config)"
-            media_msg = f" to {media_player}" if media_player else ""
-            print(f"✅ EXTROVERT: TTS succeeded{media_msg}{voice_msg}{override_msg if voice else ''}")
+            tts_log.info("✅ TTS succeeded", extra=log_fields(
+                media_player=media_player,
+                voice=voice,
+                voice_source=("override" if voice_override else "config") if voice else None,
+            ))
             return True
 
         except httpx.HTTPStatusError as e:
             # Log detailed error information
-            print(f"⚠️ EXTROVERT: TTS failed (silent)")
-            print(f"   Status: {e.response.status_code}")
-            print(f"   Response: {e.response.text}")
-            print(f"   URL: {tts_url}")
-            print(f"   Request data: {service_data}")
-            print(f"   Headers: Authorization=Bearer ***{EXTROVERT_HA_TOKEN[-8:] if len(EXTROVERT_HA_TOKEN) > 8 else '***'}")
+            tts_log.warning("⚠️ TTS failed (silent)", extra=log_fields(
+                status=e.response.status_code,
+                response=e.response.text[:500],
+                url=tts_url,
+            ))
+            tts_log.debug("Failed TTS service data", extra=log_fields(service_data=service_data))
             return False
         except Exception as e:
-            print(f"⚠️ EXTROVERT: TTS failed (silent) - {type(e).__name__}: {e}")
+            if isinstance(e, httpx.TimeoutException):
+                metrics.timeouts.inc("home_assistant")
+            tts_log.warning("⚠️ TTS failed (silent)", extra=log_fields(error=f"{type(e).__name__}: {e}"))
             return False
 
 
-    @app.post("/v1/extrovert/trigger", dependencies=[Depends(verify_shim_auth)])
-    async def extrovert_trigger(request: ExtrovertRequest):
+    def estimate_tts_duration(text: str, minimum: float = 2) -> float:
+        """Rough spoken length: ~150 words/min = 2.5 words/sec, at least `minimum` seconds"""
+        return max(minimum, len(text.split()) / 2.5)
+
+
+    class ExtrovertJob:
+        """One queued EXTROVERT prompt and its outcome"""
+
+        PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+        def __init__(self, request: ExtrovertRequest, key: tuple):
+            tts_config = request.tts_config or {}
+            self.id = uuid.uuid4().hex[:12]
+            self.key = key
+            self.prompt = request.prompt
+            self.priority = self.PRIORITIES.get(request.priority, 1)
+            self.media_player: Optional[str] = tts_config.get("media_player")
+            self.voice: Optional[str] = tts_config.get("voice")
+            self.request_id = request_id_var.get()
+            self.created = time.time()
+            self.finished_at: Optional[float] = None
+            self.status = "queued"
+            self.quest_id: Optional[str] = None
+            self.response = ""
+            self.tts_triggered = False
+            self.sentences_spoken = 0
+            self.first_audio_at: Optional[float] = None
+            self.error: Optional[str] = None
+            self.coalesced = 0
+            self.sequence = 0
+            self.precomputed_at: Optional[float] = None  # when the scheduler computed the reply
+            self.done = asyncio.Event()
+
+        def to_dict(self) -> Dict[str, Any]:
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "quest_id": self.quest_id,
+                "response": self.response,
+                "tts_triggered": self.tts_triggered,
+                "sentences_spoken": self.sentences_spoken,
+                "first_audio_ms": round((self.first_audio_at - self.created) * 1000) if self.first_audio_at else None,
+                "error": self.error,
+                "media_player": self.media_player,
+                "coalesced": self.coalesced,
+                "precomputed": self.precomputed_at is not None,
+                "precomputed_age_sec": round(self.created - self.precomputed_at) if self.precomputed_at else None,
+                "queue_position": extrovert_queue.position(self),
+                "created": int(self.created),
+                "finished": int(self.finished_at) if self.finished_at else None,
+            }
+
+
+    class ExtrovertQueue:
+        """Bounded priority queue of EXTROVERT prompts
+
+        Up to EXTROVERT_CONCURRENCY quests run at once. Identical prompts for
+        the same media player are coalesced into the job already queued or
+        running. Replies are spoken in the order their quests started, one at
+        a time per media player, each waiting until the previous one has
+        finished playing so announcements don't cut each other off.
+
+        With EXTROVERT_TTS_PIPELINE and a media player, the reply is streamed
+        and spoken sentence by sentence: the first sentence is rendered and
+        played as soon as it is complete, and each following sentence is
+        rendered while the previous one plays.
+
+        A prompt the scheduler has a fresh reply for skips the queue and the
+        quest: it goes straight to its media player.
+
+        In multi-worker mode each worker has its own queue, but the rate
+        limit and the EXTROVERT_CONCURRENCY quest slots are shared, a media
+        player is leased by one worker's announcement at a time, and job
+        status is readable from any worker.
         """
-        EXTROVERT endpoint: Accept prompt from HA automation,
-        send to bike4mind, speak response via TTS
+
+        SHARED_POLL_INTERVAL = 0.1  # seconds between tries for a shared quest slot or player lease
+        PLAYER_LEASE_SEC = 30  # how long a player is held while an announcement renders
+
+        def __init__(self, max_size: int, concurrency: int, rate_limit: int):
+            self.max_size = max_size
+            self.concurrency = concurrency
+            self.rate_limit = make_token_bucket("extrovert", rate_limit / 3600, rate_limit)
+            self.heap: List[tuple] = []
+            self.sequence = 0
+            self.jobs: "OrderedDict[str, ExtrovertJob]" = OrderedDict()
+            self.active: Dict[tuple, ExtrovertJob] = {}
+            self.player_tail: Dict[Optional[str], asyncio.Future] = {}
+            self.running = 0
+            self.speaking = 0
+            self.completed = 0
+            self.wakeup: Optional[asyncio.Event] = None
+            self.workers: List[asyncio.Task] = []
+            self.speakers: Set[asyncio.Task] = set()
+
+        def start(self):
+            self.wakeup = asyncio.Event()
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+        async def stop(self):
+            for task in self.workers + list(self.speakers):
+                task.cancel()
+
+        @staticmethod
+        def job_key(request: ExtrovertRequest) -> tuple:
+            tts_config = request.tts_config or {}
+            return (" ".join(request.prompt.split()).lower(), tts_config.get("media_player"), tts_config.get("voice"))
+
+        async def submit(self, request: ExtrovertRequest) -> tuple:
+            """Queue a prompt; returns (job, outcome) where outcome is queued, coalesced, precomputed, rate_limited or queue_full"""
+            key = self.job_key(request)
+            existing = self.active.get(key)
+            if existing is not None:
+                existing.coalesced += 1
+                return existing, "coalesced"
+            scheduled = extrovert_scheduler.lookup(request.schedule, request.prompt)
+            if scheduled is None and len(self.heap) >= self.max_size:
+                return None, "queue_full"
+            if not await self.rate_limit.take():
+                return None, "rate_limited"
+            existing = self.active.get(key)  # Submitted while the shared bucket was asked
+            if existing is not None:
+                existing.coalesced += 1
+                return existing, "coalesced"
+
+            job = ExtrovertJob(request, key)
+            self.jobs[job.id] = job
+            self.active[key] = job
+            self.sequence += 1
+            job.sequence = self.sequence
+            self._trim_history()
+            if scheduled is not None:
+                job.response, job.precomputed_at = scheduled.response, scheduled.computed_at
+                await self._share(job)
+                self._speak_precomputed(job)
+                return job, "precomputed"
+            heapq.heappush(self.heap, (job.priority, job.sequence, job))
+            self.wakeup.set()
+            await self._share(job)
+            return job, "queued"
+
+        def position(self, job: ExtrovertJob) -> int:
+            """1-based place in the queue, 0 once a worker has picked the job up"""
+            if job.status != "queued":
+                return 0
+            return 1 + sum(1 for priority, sequence, _ in self.heap if (priority, sequence) < (job.priority, job.sequence))
+
+        def _trim_history(self):
+            """Forget the oldest finished jobs beyond EXTROVERT_JOB_HISTORY; queued and running ones stay"""
+            excess = len(self.jobs) - EXTROVERT_JOB_HISTORY
+            if excess <= 0:
+                return
+            finished = [job_id for job_id, job in self.jobs.items() if job.done.is_set()][:excess]
+            for job_id in finished:
+                del self.jobs[job_id]
+
+        async def _share(self, job: ExtrovertJob):
+            """Multi-worker mode: publish the job's status for lookups on other workers"""
+            if shared_state:
+                await shared_state.run(shared_state.put_job, job.id, job.to_dict(), EXTROVERT_JOB_HISTORY)
+
+        async def _quest_slot(self) -> Optional[int]:
+            """Multi-worker mode: wait for one of the EXTROVERT_CONCURRENCY quest slots shared by all workers"""
+            if not shared_state:
+                return None
+            while True:
+                slot = await shared_state.run(shared_state.acquire_slot, "extrovert", self.concurrency)
+                if slot is not None:
+                    return slot
+                await asyncio.sleep(self.SHARED_POLL_INTERVAL)
+
+        @staticmethod
+        async def _release_slot(slot: Optional[int]):
+            if slot is not None:
+                await shared_state.run(shared_state.release_slot, "extrovert", slot)
+
+        async def _hold_player(self, job: ExtrovertJob, seconds: float):
+            """Multi-worker mode: lease the job's media player for `seconds`, waiting out other workers' leases"""
+            if not shared_state:
+                return
+            while True:
+                wait = await shared_state.run(shared_state.claim_lease, f"player:{job.media_player}", job.id, seconds)
+                if wait <= 0:
+                    return
+                await asyncio.sleep(min(wait, self.SHARED_POLL_INTERVAL))
+
+        async def _worker(self):
+            while True:
+                while not self.heap:
+                    self.wakeup.clear()
+                    await self.wakeup.wait()
+                _, _, job = heapq.heappop(self.heap)
+                request_id_var.set(job.request_id)
+                slot = await self._quest_slot()
+                if EXTROVERT_TTS_PIPELINE and job.media_player:
+                    await self._run_pipelined(job, slot)
+                    continue
+                self.running += 1
+                try:
+                    speak = await self._run_quest(job)
+                finally:
+                    self.running -= 1
+                    await self._release_slot(slot)
+                if speak:
+                    # Claim this player's playback slot now, in quest start order
+                    self._start_speaker(job, lambda previous, spoken: self._speak(job, previous, spoken))
+                else:
+                    await self._finish(job)
+
+        def _start_speaker(self, job: ExtrovertJob, speak: Callable[..., Any]):
+            """Take the next place on the job's media player and run `speak(previous, spoken)` in the background"""
+            previous = self.player_tail.get(job.media_player)
+            spoken = asyncio.get_running_loop().create_future()
+            self.player_tail[job.media_player] = spoken
+            speaker = asyncio.create_task(speak(previous, spoken))
+            self.speakers.add(speaker)
+            speaker.add_done_callback(self.speakers.discard)
+
+        def _speak_precomputed(self, job: ExtrovertJob):
+            """Speak a reply the scheduler computed ahead of time; no quest slot or worker is needed"""
+            if EXTROVERT_TTS_PIPELINE and job.media_player:
+                sentences: asyncio.Queue = asyncio.Queue()
+                splitter = SentenceSplitter()
+                for sentence in splitter.feed(job.response) + splitter.flush():
+                    sentences.put_nowait(sentence)
+                sentences.put_nowait(None)
+                self._start_speaker(job, lambda previous, spoken: self._speak_sentences(
+                    job, previous, spoken, sentences))
+            else:
+                self._start_speaker(job, lambda previous, spoken: self._speak(job, previous, spoken))
+
+        async def _run_quest(self, job: ExtrovertJob) -> bool:
+            job.status = "running"
+            await self._share(job)
+            try:
+                if VISUAL_ASSIST_ENABLED and visual_assist_manager:
+                    visual_assist_manager.broadcast_state("thinking")
+
+                job.quest_id = await create_b4m_quest(job.prompt)
+                if not job.quest_id:
+                    job.status, job.error = "error", "Failed to create bike4mind quest"
+                    return False
+                extrovert_log.info("🤖 Created quest", extra=log_fields(job_id=job.id, quest_id=job.quest_id))
+
+                response_text = await poll_b4m_quest(job.quest_id)
+                extrovert_log.info("💬 Got response", extra=log_fields(
+                    job_id=job.id, quest_id=job.quest_id, chars=len(response_text)))
+                job.response = sanitize_response_for_tts(response_text)
+                extrovert_log.debug("✨ Sanitized response", extra=log_fields(chars=len(job.response)))
+                if not job.response:
+                    job.status, job.error = "error", "Empty response from bike4mind"
+                    return False
+                return True
+            except HTTPException as e:
+                if e.status_code == 504:
+                    extrovert_log.warning("⏱️ bike4mind quest timed out", extra=log_fields(job_id=job.id))
+                    job.status = "timeout"
+                else:
+                    extrovert_log.error("❌ Error", extra=log_fields(job_id=job.id, error=e.detail))
+                    job.status, job.error = "error", str(e.detail)
+                return False
+            except Exception as e:
+                extrovert_log.error("❌ Error", extra=log_fields(job_id=job.id, error=str(e)))
+                job.status, job.error = "error", str(e)
+                return False
+
+        async def _run_pipelined(self, job: ExtrovertJob, slot: Optional[int] = None):
+            """Stream the sanitized quest reply into a per-job sentence queue consumed by the speaker"""
+            sentences: asyncio.Queue = asyncio.Queue()
+            self._start_speaker(job, lambda previous, spoken: self._speak_sentences(job, previous, spoken, sentences))
+
+            self.running += 1
+            job.status = "running"
+            await self._share(job)
+            sanitizer = TTSSanitizer()
+            splitter = SentenceSplitter()
+            reply = ""
+            try:
+                if VISUAL_ASSIST_ENABLED and visual_assist_manager:
+                    visual_assist_manager.broadcast_state("thinking")
+                job.quest_id = await create_b4m_quest(job.prompt)
+                if not job.quest_id:
+                    job.status, job.error = "error", "Failed to create bike4mind quest"
+                    return
+                extrovert_log.info("🤖 Created quest", extra=log_fields(job_id=job.id, quest_id=job.quest_id))
+                async for delta in stream_b4m_quest(job.quest_id):
+                    reply += delta
+                    for sentence in splitter.feed(sanitizer.feed(delta)):
+                        sentences.put_nowait(sentence)
+                for sentence in splitter.feed(sanitizer.flush()) + splitter.flush():
+                    sentences.put_nowait(sentence)
+                job.response = sanitize_response_for_tts(reply)
+                extrovert_log.info("💬 Got response", extra=log_fields(
+                    job_id=job.id, quest_id=job.quest_id, chars=len(reply)))
+                if not job.response:
+                    job.status, job.error = "error", "Empty response from bike4mind"
+            except HTTPException as e:
+                job.status = "timeout" if e.status_code == 504 else "error"
+                job.error = None if e.status_code == 504 else str(e.detail)
+                extrovert_log.error("❌ Error", extra=log_fields(job_id=job.id, error=e.detail))
+            except Exception as e:
+                extrovert_log.error("❌ Error", extra=log_fields(job_id=job.id, error=str(e)))
+                job.status, job.error = "error", str(e)
+            finally:
+                self.running -= 1
+                await self._release_slot(slot)
+                sentences.put_nowait(None)
+
+        async def _speak_sentences(self, job: ExtrovertJob, previous: Optional[asyncio.Future],
+                                   spoken: asyncio.Future, sentences: asyncio.Queue):
+            """Render sentence N+1 while sentence N plays; playback stays in order on the player"""
+            loop = asyncio.get_running_loop()
+            started_speaking = False
+            players = [job.media_player] if job.media_player else []
+            playing = None  # (mark, started, estimate) of the sentence on the player
+            try:
+                while True:
+                    sentence = await sentences.get()
+                    if sentence is None:
+                        break
+                    url = await synthesize_tts(sentence, job.voice)
+                    if not started_speaking:
+                        if previous is not None:
+                            await asyncio.shield(previous)
+                        await self._hold_player(job, self.PLAYER_LEASE_SEC)
+                        job.status = "speaking"
+                        await self._share(job)
+                        self.speaking += 1
+                        started_speaking = True
+                        if VISUAL_ASSIST_ENABLED and visual_assist_manager:
+                            visual_assist_manager.broadcast_state("speaking")
+                    if playing:
+                        await wait_for_playback(players, *playing)
+                    mark = playback_monitor.mark() if playback_monitor else 0
+                    if url:
+                        played = await play_tts_url(url, job.media_player)
+                    else:
+                        played = await trigger_ha_tts(sentence, job.media_player, job.voice)
+                    if played:
+                        job.tts_triggered = True
+                        job.sentences_spoken += 1
+                        job.first_audio_at = job.first_audio_at or time.time()
+                        playing = (mark, loop.time(), estimate_tts_duration(sentence, minimum=0.5))
+                        # Keep the player while this sentence plays and the next one renders
+                        await self._hold_player(job, playing[2] + self.PLAYER_LEASE_SEC)
+                await self._finish(job, None if job.status in ("error", "timeout") else "done")
+                if playing:
+                    await wait_for_playback(players, *playing)
+            finally:
+                if started_speaking:
+                    self.speaking -= 1
+                    await self._hold_player(job, 0)
+                if not spoken.done():
+                    spoken.set_result(None)
+                if self.player_tail.get(job.media_player) is spoken:
+                    del self.player_tail[job.media_player]
+                if not job.done.is_set():
+                    await self._finish(job)
+                await self._idle_if_quiet()
+
+        async def _speak(self, job: ExtrovertJob, previous: Optional[asyncio.Future], spoken: asyncio.Future):
+            started_speaking = False
+            try:
+                if previous is not None:
+                    await asyncio.shield(previous)
+                await self._hold_player(job, self.PLAYER_LEASE_SEC)
+                job.status = "speaking"
+                await self._share(job)
+                self.speaking += 1
+                started_speaking = True
+                if VISUAL_ASSIST_ENABLED and visual_assist_manager:
+                    visual_assist_manager.broadcast_state("speaking")
+                mark = playback_monitor.mark() if playback_monitor else 0
+                job.tts_triggered = await trigger_ha_tts(job.response, job.media_player, job.voice)
+                job.first_audio_at = time.time() if job.tts_triggered else None
+                started = asyncio.get_running_loop().time()
+                estimate = estimate_tts_duration(job.response)
+                await self._hold_player(job, estimate + self.PLAYER_LEASE_SEC if job.tts_triggered else 0)
+                await self._finish(job, "done")
+                if job.tts_triggered:
+                    # Without a media player the engine's default speaker plays it; only the estimate applies
+                    await wait_for_playback([job.media_player] if job.media_player else [], mark, started, estimate)
+            finally:
+                if started_speaking:
+                    self.speaking -= 1
+                    await self._hold_player(job, 0)
+                if not spoken.done():
+                    spoken.set_result(None)
+                if self.player_tail.get(job.media_player) is spoken:
+                    del self.player_tail[job.media_player]
+                await self._idle_if_quiet()
+
+        async def _finish(self, job: ExtrovertJob, status: Optional[str] = None):
+            if status:
+                job.status = status
+            job.finished_at = time.time()
+            self.completed += 1
+            self.active.pop(job.key, None)
+            job.done.set()
+            await self._share(job)
+            if status is None:
+                await self._idle_if_quiet()
+
+        async def _idle_if_quiet(self):
+            if VISUAL_ASSIST_ENABLED and visual_assist_manager and not (self.running or self.speaking or self.heap):
+                visual_assist_manager.broadcast_state("idle")
+
+        def stats(self) -> Dict[str, Any]:
+            return {
+                "queued": len(self.heap),
+                "running": self.running,
+                "speaking": self.speaking,
+                "completed": self.completed,
+                "max_queue_size": self.max_size,
+                "concurrency": self.concurrency,
+                "rate_limit_tokens": round(self.rate_limit.tokens, 2),
+            }
+
+
+    extrovert_queue = ExtrovertQueue(EXTROVERT_QUEUE_SIZE, EXTROVERT_CONCURRENCY, EXTROVERT_RATE_LIMIT)
+
+
+    class CronExpression:
+        """Five-field cron expression (minute hour day-of-month month day-of-week) in local time
+
+        Fields take *, numbers, a-b ranges, lists and /steps; months and
+        weekdays also take three-letter names, and Sunday is 0 or 7. As in
+        cron, when both day fields are restricted a day matching either one
+        matches. @hourly, @daily, @weekly, @monthly and @yearly work too.
         """
-        global extrovert_busy, extrovert_request_times
 
-        # Check if assistant is busy
-        if extrovert_busy:
-            return JSONResponse({
-                "status": "ignored",
-                "reason": "assistant_busy",
-                "message": "Assistant is already processing a request"
-            })
+        MACROS = {"@hourly": "0 * * * *", "@daily": "0 0 * * *", "@midnight": "0 0 * * *", "@weekly": "0 0 * * 0",
+                  "@monthly": "0 0 1 * *", "@yearly": "0 0 1 1 *", "@annually": "0 0 1 1 *"}
+        MONTHS = {name: i + 1 for i, name in enumerate(
+            ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"))}
+        WEEKDAYS = {name: i for i, name in enumerate(("sun", "mon", "tue", "wed", "thu", "fri", "sat"))}
+
+        def __init__(self, expression: str):
+            self.expression = expression.strip()
+            fields = self.MACROS.get(self.expression.lower(), self.expression).split()
+            if len(fields) != 5:
+                raise ValueError("expected 5 fields: minute hour day-of-month month day-of-week")
+            self.minutes = self._parse(fields[0], 0, 59)
+            self.hours = self._parse(fields[1], 0, 23)
+            self.days = self._parse(fields[2], 1, 31)
+            self.months = self._parse(fields[3], 1, 12, self.MONTHS)
+            self.weekdays = {day % 7 for day in self._parse(fields[4], 0, 7, self.WEEKDAYS)}
+            self.any_day = fields[2].startswith("*")
+            self.any_weekday = fields[4].startswith("*")
+            self.next_after(time.time())  # Rejects expressions that never match, like 0 0 30 2 *
+
+        @staticmethod
+        def _parse(field: str, low: int, high: int, names: Optional[Dict[str, int]] = None) -> Set[int]:
+            def value(token: str) -> int:
+                if names and token in names:
+                    return names[token]
+                if not token.isdigit():
+                    raise ValueError(f"{token!r} is not a number")
+                return int(token)
+
+            values: Set[int] = set()
+            for part in field.lower().split(","):
+                body, slash, step = part.partition("/")
+                if body == "*":
+                    start, end = low, high
+                elif "-" in body:
+                    start, end = (value(token) for token in body.split("-", 1))
+                else:
+                    start = value(body)
+                    end = high if slash else start
+                step_size = value(step) if slash else 1
+                if not low <= start <= end <= high or step_size < 1:
+                    raise ValueError(f"{part!r} is outside {low}-{high}")
+                values.update(range(start, end + 1, step_size))
+            return values
+
+        def _day_matches(self, day: datetime) -> bool:
+            in_month = day.day in self.days
+            in_week = day.isoweekday() % 7 in self.weekdays
+            if self.any_day or self.any_weekday:
+                return in_month and in_week
+            return in_month or in_week
+
+        def next_after(self, timestamp: float) -> float:
+            """Timestamp of the first matching minute after `timestamp`"""
+            t = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+            limit = t + timedelta(days=5 * 366)  # Covers February 29
+            while t < limit:
+                if t.month not in self.months:
+                    t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                elif not self._day_matches(t):
+                    t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                elif t.hour not in self.hours:
+                    t = t.replace(minute=0) + timedelta(hours=1)
+                elif t.minute not in self.minutes:
+                    t += timedelta(minutes=1)
+                else:
+                    return t.timestamp()
+            raise ValueError(f"{self.expression!r} never matches")
+
+
+    class ScheduledPrompt:
+        """A registered prompt and the reply last computed for it"""
+
+        def __init__(self, name: str, prompt: str, cron: str, lead_sec: Optional[float] = None,
+                     max_age_sec: Optional[float] = None):
+            self.name = name
+            self.prompt = prompt
+            self.key = " ".join(prompt.split()).lower()  # As in ExtrovertQueue.job_key
+            self.cron = CronExpression(cron)
+            self.lead_sec = EXTROVERT_SCHEDULE_LEAD_SEC if lead_sec is None else lead_sec
+            self.max_age_sec = EXTROVERT_SCHEDULE_MAX_AGE_SEC if max_age_sec is None else max_age_sec
+            if self.lead_sec < 0:
+                raise ValueError("lead_sec must not be negative")
+            if self.max_age_sec <= self.lead_sec:
+                raise ValueError("max_age_sec must be longer than lead_sec, or the reply is stale when it is needed")
+            # A fixed offset per name spreads prompts scheduled for the same minute (up to a minute earlier)
+            digest = int(hashlib.sha1(name.encode()).hexdigest()[:8], 16)
+            self.offset = digest / 2**32 * min(self.lead_sec / 4, 60)
+            self.next_fire = self.cron.next_after(time.time())
+            self.response = ""
+            self.computed_at: Optional[float] = None
+            self.computed_for: Optional[float] = None  # the fire time the last run was for
+            self.quest_ms: Optional[int] = None
+            self.error: Optional[str] = None
+            self.runs = 0
+
+        @property
+        def run_at(self) -> float:
+            return self.next_fire - self.lead_sec - self.offset
+
+        def fresh(self, now: float) -> bool:
+            return bool(self.response) and now - self.computed_at <= self.max_age_sec
+
+        def to_dict(self) -> Dict[str, Any]:
+            return {
+                "name": self.name,
+                "prompt": self.prompt,
+                "cron": self.cron.expression,
+                "lead_sec": self.lead_sec,
+                "max_age_sec": self.max_age_sec,
+                "next_fire": datetime.fromtimestamp(self.next_fire).isoformat(timespec="seconds"),
+                "next_run": datetime.fromtimestamp(self.run_at).isoformat(timespec="seconds"),
+                "response": self.response,
+                "computed_at": self.computed_at,
+                "computed_for": self.computed_for,
+                "quest_ms": self.quest_ms,
+                "error": self.error,
+                "runs": self.runs,
+            }
 
-        # Rate limiting: Check recent request count
-        current_time = time.time()
-        one_hour_ago = current_time - 3600
-        extrovert_request_times = [t for t in extrovert_request_times if t > one_hour_ago]
+        @classmethod
+        def from_dict(cls, data: Dict[str, Any]) -> "ScheduledPrompt":
+            entry = cls(data["name"], data["prompt"], data["cron"], data["lead_sec"], data["max_age_sec"])
+            for field in ("response", "computed_at", "computed_for", "quest_ms", "error", "runs"):
+                setattr(entry, field, data.get(field, getattr(entry, field)))
+            return entry
 
-        if len(extrovert_request_times) >= EXTROVERT_RATE_LIMIT:
-            return JSONResponse({
-                "status": "rate_limited",
-                "reason": "rate_limit_exceeded",
-                "message": f"Rate limit of {EXTROVERT_RATE_LIMIT} requests per hour exceeded"
-            }, status_code=429)
 
-        extrovert_request_times.append(current_time)
-        extrovert_busy = True
+    class ExtrovertScheduler:
+        """Runs scheduled EXTROVERT prompts ahead of time and keeps the sanitized replies
 
-        try:
-            # Set VISUAL_ASSIST to thinking state
-            if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                await visual_assist_manager.broadcast_state("thinking")
-
-            # Create bike4mind quest with prompt
-            quest_id = await create_b4m_quest(request.prompt)
-            if not quest_id:
-                return JSONResponse({
-                    "status": "error",
-                    "error": "Failed to create bike4mind quest"
-                })
-
-            print(f"🤖 EXTROVERT: Created quest {quest_id}")
-
-            # Poll for response
-            response_text = await poll_b4m_quest(quest_id)
-            if not response_text:
-                return JSONResponse({
-                    "status": "error",
-                    "error": "No response from bike4mind"
-                })
-
-            print(f"💬 EXTROVERT: Got response ({len(response_text)} chars)")
-
-            # Sanitize response
-            sanitized = sanitize_response_for_tts(response_text)
-            print(f"✨ EXTROVERT: Sanitized to ({len(sanitized)} chars)")
-
-            # Set VISUAL_ASSIST to speaking state
-            if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                await visual_assist_manager.broadcast_state("speaking")
-
-            # Trigger TTS
-            tts_config = request.tts_config or {}
-            media_player = tts_config.get("media_player")
-            voice_override = tts_config.get("voice")
+        Each prompt's quest runs lead_sec before every time its cron
+        expression fires, so the trigger at that time is answered without a
+        quest. Runs never stampede bike4mind: one quest at a time, at least
+        EXTROVERT_SCHEDULE_STAGGER_SEC between starts, and prompts due in the
+        same minute are spread by a fixed offset per name. A reply older than
+        the prompt's max_age_sec is not used; the trigger then runs a live
+        quest. A failed run keeps the previous reply until it goes stale.
 
-            tts_triggered = await trigger_ha_tts(
-                sanitized,
-                media_player,
-                voice_override
-            )
+        Schedules and replies are kept in EXTROVERT_SCHEDULE_PATH across
+        restarts. In multi-worker mode one worker (holding a lease) runs the
+        quests and every change is published to the other workers.
+        """
 
-            # Set VISUAL_ASSIST back to idle after brief delay
-            if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                async def wait_and_idle():
-                    # Estimate TTS duration: ~150 words/min = 2.5 words/sec
-                    word_count = len(sanitized.split())
-                    tts_duration = max(2, word_count / 2.5)
-                    await asyncio.sleep(tts_duration)
-                    await visual_assist_manager.broadcast_state("idle")
+        LEADER_LEASE_SEC = 30
+
+        def __init__(self, path: str, stagger_sec: float):
+            self.path = path
+            self.stagger_sec = stagger_sec
+            self.entries: Dict[str, ScheduledPrompt] = {}
+            self.holder = uuid.uuid4().hex
+            self.last_start = float("-inf")
+            self.running: Optional[str] = None
+            self.wakeup: Optional[asyncio.Event] = None
+            self.task: Optional[asyncio.Task] = None
+
+        def start(self):
+            self.wakeup = asyncio.Event()
+            self._load()
+            if shared_state:
+                shared_state.subscribe("extrovert_schedule", self._apply)
+            self.task = asyncio.create_task(self._run())
+
+        async def stop(self):
+            if self.task:
+                self.task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self.task
+
+        def register(self, name: str, request: ExtrovertScheduleRequest) -> ScheduledPrompt:
+            """Add or replace a schedule; raises ValueError for a bad cron expression or limits"""
+            entry = ScheduledPrompt(name, request.prompt, request.cron, request.lead_sec, request.max_age_sec)
+            previous = self.entries.get(name)
+            if previous and previous.key == entry.key:
+                # Same prompt: the reply already computed stays usable
+                entry.response, entry.computed_at, entry.quest_ms = previous.response, previous.computed_at, previous.quest_ms
+            self.entries[name] = entry
+            self._changed(name)
+            return entry
+
+        def remove(self, name: str) -> bool:
+            if self.entries.pop(name, None) is None:
+                return False
+            self._changed(name)
+            return True
 
-                asyncio.create_task(wait_and_idle())
+        def lookup(self, name: Optional[str], prompt: str) -> Optional[ScheduledPrompt]:
+            """The schedule whose fresh reply answers this trigger, or None to run a live quest"""
+            if name:
+                entry = self.entries.get(name)
+            else:
+                key = " ".join(prompt.split()).lower()
+                entry = next((e for e in self.entries.values() if e.key == key), None)
+            if entry is None:
+                return None
+            event = "hit" if entry.fresh(time.time()) else ("stale" if entry.response else "not_ready")
+            metrics.extrovert_schedule.inc(event)
+            if event != "hit":
+                extrovert_log.info("🗓️ Scheduled reply not usable, running a live quest", extra=log_fields(
+                    schedule=entry.name, reason=event,
+                    age_sec=round(time.time() - entry.computed_at) if entry.computed_at else None))
+                return None
+            return entry
+
+        def _changed(self, name: str):
+            entry = self.entries.get(name)
+            if shared_state:
+                shared_state.publish_soon("extrovert_schedule", {"name": name, "entry": entry.to_dict() if entry else None})
+            self._save()
+            self.wakeup.set()
+
+        def _apply(self, message: Dict[str, Any]):
+            """A schedule changed on another worker"""
+            if message["entry"] is None:
+                self.entries.pop(message["name"], None)
+            else:
+                self.entries[message["name"]] = ScheduledPrompt.from_dict(message["entry"])
+            self.wakeup.set()
 
-            return JSONResponse({
-                "status": "success",
-                "quest_id": quest_id,
-                "response": sanitized,
-                "tts_triggered": tts_triggered
-            })
+        def _load(self):
+            if not self.path or not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path) as f:
+                    schedules = json.load(f)["schedules"]
+            except (OSError, ValueError, KeyError) as e:
+                extrovert_log.warning("⚠️ Could not read schedules", extra=log_fields(path=self.path, error=str(e)))
+                return
+            for data in schedules:
+                try:
+                    entry = ScheduledPrompt.from_dict(data)
+                except (KeyError, TypeError, ValueError) as e:
+                    extrovert_log.warning("⚠️ Skipping invalid schedule", extra=log_fields(
+                        schedule=data.get("name"), error=str(e)))
+                    continue
+                self.entries[entry.name] = entry
+            extrovert_log.info("🗓️ Loaded schedules", extra=log_fields(count=len(self.entries)))
+
+        def _save(self):
+            if not self.path:
+                return
+            try:
+                temporary = f"{self.path}.{os.getpid()}.tmp"
+                with open(temporary, "w") as f:
+                    json.dump({"schedules": [entry.to_dict() for entry in self.entries.values()]}, f)
+                os.replace(temporary, self.path)
+            except OSError as e:
+                extrovert_log.warning("⚠️ Could not save schedules", extra=log_fields(path=self.path, error=str(e)))
+
+        async def _lead(self, seconds: float) -> bool:
+            """Multi-worker mode: whether this worker runs the quests (renewing its lease)"""
+            if not shared_state:
+                return True
+            return await shared_state.run(shared_state.claim_lease, "extrovert_scheduler", self.holder, seconds) <= 0
+
+        def _next(self, now: float) -> Optional[ScheduledPrompt]:
+            """The schedule whose run is due first; prompts without a usable reply go before refreshes"""
+            pending = []
+            for entry in self.entries.values():
+                if now >= entry.next_fire:
+                    entry.next_fire = entry.cron.next_after(now)
+                if entry.computed_for != entry.next_fire:
+                    pending.append(entry)
+            return min(pending, key=lambda entry: (entry.fresh(now), entry.run_at), default=None)
+
+        async def _run(self):
+            while True:
+                now = time.time()
+                entry = self._next(now) if await self._lead(self.LEADER_LEASE_SEC) else None
+                wake_at = now + self.LEADER_LEASE_SEC / 3
+                if entry is not None:
+                    start_at = max(entry.run_at, now + self.last_start + self.stagger_sec - time.monotonic())
+                    if start_at <= now:
+                        await self._precompute(entry)
+                        continue
+                    wake_at = min(wake_at, start_at)
+                self.wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.wakeup.wait(), max(wake_at - time.time(), 0))
+
+        async def _precompute(self, entry: ScheduledPrompt):
+            fire = entry.next_fire
+            self.last_start = time.monotonic()
+            self.running = entry.name
+            await self._lead(TIMEOUT_MS / 1000 + self.LEADER_LEASE_SEC)  # Hold the lease for the whole quest
+            extrovert_log.info("🗓️ Running scheduled prompt", extra=log_fields(
+                schedule=entry.name, fires_at=datetime.fromtimestamp(fire).isoformat(timespec="seconds")))
+            try:
+                quest_id = await create_b4m_quest(entry.prompt)
+                if not quest_id:
+                    raise RuntimeError("Failed to create bike4mind quest")
+                response = sanitize_response_for_tts(await poll_b4m_quest(quest_id))
+                if not response:
+                    raise RuntimeError("Empty reply")
+            except Exception as e:
+                entry.error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+                metrics.extrovert_schedule.inc("run_failed")
+                extrovert_log.warning("⚠️ Scheduled prompt failed", extra=log_fields(
+                    schedule=entry.name, error=entry.error))
+            else:
+                entry.response, entry.computed_at, entry.error = response, time.time(), None
+                entry.quest_ms = round((time.monotonic() - self.last_start) * 1000)
+                metrics.extrovert_schedule.inc("run")
+                extrovert_log.info("🗓️ Scheduled reply ready", extra=log_fields(
+                    schedule=entry.name, chars=len(response), quest_ms=entry.quest_ms))
+            finally:
+                self.running = None
+            entry.computed_for = fire
+            entry.runs += 1
+            if self.entries.get(entry.name) is entry:  # Not replaced or removed meanwhile
+                self._changed(entry.name)
+
+        def stats(self) -> Dict[str, Any]:
+            return {
+                "schedules": [entry.to_dict() for entry in sorted(self.entries.values(), key=lambda e: e.run_at)],
+                "running": self.running,
+                "stagger_sec": self.stagger_sec,
+            }
 
-        except asyncio.TimeoutError:
-            if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                await visual_assist_manager.broadcast_state("idle")
 
-            print(f"⏱️ EXTROVERT: bike4mind quest timed out")
+    extrovert_scheduler = ExtrovertScheduler(EXTROVERT_SCHEDULE_PATH, EXTROVERT_SCHEDULE_STAGGER_SEC)
 
-            return JSONResponse({
-                "status": "success",
-                "quest_id": quest_id if 'quest_id' in locals() else None,
-                "response": "",
-                "tts_triggered": False,
-                "timeout": True
-            })
 
-        except Exception as e:
-            if VISUAL_ASSIST_ENABLED and visual_assist_manager:
-                await visual_assist_manager.broadcast_state("idle")
+    @app.on_event("startup")
+    async def start_extrovert_queue():
+        extrovert_queue.start()
+        extrovert_scheduler.start()
+
+
+    @app.on_event("shutdown")
+    async def stop_extrovert_queue():
+        await extrovert_queue.stop()
+        await extrovert_scheduler.stop()
+
+
+    @app.post("/v1/extrovert/trigger", dependencies=[Depends(verify_shim_auth)])
+    async def extrovert_trigger(request: ExtrovertRequest):
+        """
+        EXTROVERT endpoint: Accept prompt from HA automation and queue it;
+        the reply is spoken via TTS once bike4mind answers. Returns 202 with
+        a job ID unless the request sets "wait": true.
+        """
+        job, outcome = await extrovert_queue.submit(request)
 
-            print(f"❌ EXTROVERT: Error - {e}")
+        if outcome == "rate_limited":
+            metrics.rate_limited.inc("extrovert")
+            return JSONResponse({
+                "status": "rate_limited",
+                "reason": "rate_limit_exceeded",
+                "message": f"Rate limit of {EXTROVERT_RATE_LIMIT} requests per hour exceeded"
+            }, status_code=429)
 
+        if outcome == "queue_full":
+            metrics.rate_limited.inc("extrovert_queue")
             return JSONResponse({
-                "status": "success",
-                "quest_id": None,
-                "response": "",
-                "tts_triggered": False,
-                "error": str(e)
-            })
+                "status": "ignored",
+                "reason": "queue_full",
+                "message": f"EXTROVERT queue is full ({EXTROVERT_QUEUE_SIZE} pending prompts)"
+            }, status_code=503)
+
+        message = {"queued": "📥 Prompt queued", "coalesced": "📎 Prompt coalesced",
+                   "precomputed": "⚡ Prompt answered from schedule"}[outcome]
+        extrovert_log.info(message, extra=log_fields(job_id=job.id, priority=request.priority))
+
+        if request.wait:
+            await job.done.wait()
+            return JSONResponse({"status": "success", **job.to_dict()})
+
+        return JSONResponse({
+            "status": "queued",
+            "job_id": job.id,
+            "coalesced": outcome == "coalesced",
+            "precomputed": outcome == "precomputed",
+            "queue_position": extrovert_queue.position(job)
+        }, status_code=202)
+
+
+    @app.get("/v1/extrovert/jobs/{job_id}", dependencies=[Depends(verify_shim_auth)])
+    async def extrovert_job_status(job_id: str):
+        """Status of a queued, running or recently finished EXTROVERT job"""
+        job = extrovert_queue.jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        # Multi-worker mode: the job may belong to another worker
+        data = await shared_state.run(shared_state.get_job, job_id) if shared_state else None
+        if data is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return data
+
+
+    @app.get("/admin/extrovert", dependencies=[Depends(verify_shim_auth)])
+    async def extrovert_stats():
+        """EXTROVERT queue depth and worker counters"""
+        return extrovert_queue.stats()
+
+
+    @app.put("/v1/extrovert/schedules/{name}", dependencies=[Depends(verify_shim_auth)])
+    async def put_extrovert_schedule(name: str, request: ExtrovertScheduleRequest):
+        """Register a prompt to be answered ahead of the times its cron expression gives"""
+        try:
+            entry = extrovert_scheduler.register(name, request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid schedule: {e}")
+        extrovert_log.info("🗓️ Schedule registered", extra=log_fields(
+            schedule=name, cron=request.cron, next_run=entry.to_dict()["next_run"]))
+        return entry.to_dict()
 
-        finally:
-            # Always clear busy flag
-            extrovert_busy = False
+
+    @app.get("/v1/extrovert/schedules", dependencies=[Depends(verify_shim_auth)])
+    async def list_extrovert_schedules():
+        """Registered schedules, their next runs and the replies computed so far"""
+        return extrovert_scheduler.stats()
+
+
+    @app.delete("/v1/extrovert/schedules/{name}", dependencies=[Depends(verify_shim_auth)])
+    async def delete_extrovert_schedule(name: str):
+        if not extrovert_scheduler.remove(name):
+            raise HTTPException(status_code=404, detail="Unknown schedule")
+        return {"status": "deleted", "name": name}
 
 
 # VISUAL_ASSIST endpoints (conditionally registered)
 if VISUAL_ASSIST_ENABLED:
-    @app.get("/visual", response_class=HTMLResponse)
-    async def visual_page():
-        """Serve HTML viewer page with embedded GIF URLs"""
-        html_content = f"""
-<!DOCTYPE html>
+    VISUAL_GIF_URLS = {
+        "thinking": VISUAL_ASSIST_THINKING_GIF_URL,
+        "speaking": VISUAL_ASSIST_SPEAKING_GIF_URL,
+        "idle": VISUAL_ASSIST_IDLE_GIF_URL,
+    }
+
+    VISUAL_PAGE_TEMPLATE = """<!DOCTYPE html>
 <html>
 <head>
     <title>Voice Assistant Visual</title>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <style>
-        body {{
+        body {
             margin: 0;
             padding: 0;
             background: black;
@@ -787,97 +5270,335 @@ if VISUAL_ASSIST_ENABLED:
             align-items: center;
             height: 100vh;
             overflow: hidden;
-        }}
-        #assistant-gif {{
+        }
+        .assistant-gif {
             max-width: 100%;
             max-height: 100vh;
             object-fit: contain;
-        }}
-        .status {{
+        }
+        .status {
             position: fixed;
             top: 10px;
             right: 10px;
             color: white;
             font-family: monospace;
             font-size: 12px;
-        }}
+        }
     </style>
 </head>
 <body>
-    <img id="assistant-gif" src="{VISUAL_ASSIST_IDLE_GIF_URL}" alt="Assistant">
     <div class="status">
         <span id="connection-status">Connecting...</span>
     </div>
     <script>
-        // Embed GIF URLs from server configuration
-        const THINKING_GIF_URL = "{VISUAL_ASSIST_THINKING_GIF_URL}";
-        const SPEAKING_GIF_URL = "{VISUAL_ASSIST_SPEAKING_GIF_URL}";
-        const IDLE_GIF_URL = "{VISUAL_ASSIST_IDLE_GIF_URL}";
+        // GIF URLs from server configuration (local cached copies when available)
+        const GIF_URLS = __GIF_URLS__;
 
         // WebSocket client
-        class VisualAssistClient {{
-            constructor() {{
+        class VisualAssistClient {
+            constructor() {
                 this.ws = null;
                 this.reconnectInterval = 2000;
-                this.gifElement = document.getElementById('assistant-gif');
                 this.statusElement = document.getElementById('connection-status');
+                // One image per state, all loaded up front; a state change only switches which one is shown
+                this.images = {};
+                for (const [state, url] of Object.entries(GIF_URLS)) {
+                    if (!url) continue;
+                    const img = document.createElement('img');
+                    img.className = 'assistant-gif';
+                    img.alt = 'Assistant';
+                    img.src = url;
+                    img.hidden = state !== 'idle';
+                    img.decode().catch(() => {});
+                    document.body.appendChild(img);
+                    this.images[state] = img;
+                }
                 this.connect();
-            }}
+            }
 
-            connect() {{
-                const wsUrl = `ws://${{window.location.host}}/ws`;
+            connect() {
+                const wsUrl = `ws://${window.location.host}/ws`;
                 this.ws = new WebSocket(wsUrl);
 
-                this.ws.onopen = () => {{
+                this.ws.onopen = () => {
                     console.log('Connected to Visual Assist');
                     this.statusElement.textContent = 'Connected';
                     this.statusElement.style.color = 'lime';
-                }};
+                };
 
-                this.ws.onmessage = (event) => {{
+                this.ws.onmessage = (event) => {
                     const data = JSON.parse(event.data);
-                    if (data.type === 'state_change') {{
+                    if (data.type === 'state_change') {
                         this.updateGif(data.state);
-                    }}
-                }};
+                    }
+                };
 
-                this.ws.onerror = (error) => {{
+                this.ws.onerror = (error) => {
                     console.error('WebSocket error:', error);
                     this.statusElement.textContent = 'Error';
                     this.statusElement.style.color = 'red';
-                }};
+                };
 
-                this.ws.onclose = () => {{
+                this.ws.onclose = () => {
                     console.log('Disconnected, reconnecting...');
                     this.statusElement.textContent = 'Reconnecting...';
                     this.statusElement.style.color = 'yellow';
                     setTimeout(() => this.connect(), this.reconnectInterval);
-                }};
-            }}
-
-            updateGif(state) {{
-                let gifSrc;
-                if (state === 'thinking') {{
-                    gifSrc = THINKING_GIF_URL;
-                }} else if (state === 'speaking') {{
-                    gifSrc = SPEAKING_GIF_URL;
-                }} else {{
-                    gifSrc = IDLE_GIF_URL;
-                }}
-
-                if (this.gifElement.src !== gifSrc) {{
-                    this.gifElement.src = gifSrc + '?t=' + Date.now(); // Cache bust
-                }}
-            }}
-        }}
+                };
+            }
+
+            updateGif(state) {
+                const shown = this.images[state] ? state : 'idle';
+                for (const [name, img] of Object.entries(this.images)) {
+                    img.hidden = name !== shown;
+                }
+            }
+        }
 
         // Initialize client
         const client = new VisualAssistClient();
     </script>
 </body>
 </html>
+"""
+
+
+    def etag_matches(request: Request, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match", "")
+        return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+    def accepted_encodings(request: Request) -> Set[str]:
+        """Content codings from Accept-Encoding, without those refused with q=0"""
+        accepted = set()
+        for item in request.headers.get("accept-encoding", "").split(","):
+            name, _, params = item.partition(";")
+            if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(name.strip().lower())
+        return accepted
+
+
+    class VisualAsset:
+        __slots__ = ("url", "body", "content_type", "digest", "upstream_etag", "last_modified")
+
+        def __init__(self, url: str, body: bytes, content_type: str, upstream_etag: Optional[str] = None,
+                     last_modified: Optional[str] = None):
+            self.url = url
+            self.body = body
+            self.content_type = content_type
+            self.digest = hashlib.sha256(body).hexdigest()[:16]
+            self.upstream_etag = upstream_etag
+            self.last_modified = last_modified
+
+
+    class VisualAssets:
+        """Local copies of the state GIFs, served from /visual/assets/{state}
+
+        Each configured http(s) URL is fetched once at startup and kept in
+        VISUAL_ASSIST_ASSET_DIR, so a restart only revalidates it with the
+        origin's ETag / Last-Modified. The page links each copy with its
+        content hash in the URL, so tablets can cache it for a year. Until
+        a copy exists the asset URL redirects to the origin.
         """
-        return HTMLResponse(content=html_content)
+
+        MAX_BYTES = 32 * 1024 * 1024
+        MAX_BACKOFF_SEC = 900.0
+
+        def __init__(self, urls: Dict[str, str], directory: str):
+            self.urls = {state: url for state, url in urls.items() if url.startswith(("http://", "https://"))}
+            self.directory = directory
+            self.assets: Dict[str, VisualAsset] = {}
+            self.on_change: Callable[[], None] = lambda: None
+            self.task: Optional[asyncio.Task] = None
+            self.fetched = 0
+            self.not_modified = 0
+            self.fetch_failures = 0
+
+        def url_for(self, state: str) -> str:
+            """The page's URL for a state: the local copy if there is one, else the configured URL"""
+            asset = self.assets.get(state)
+            return f"/visual/assets/{state}?v={asset.digest}" if asset else VISUAL_GIF_URLS[state]
+
+        async def start(self):
+            await asyncio.to_thread(self._load_saved)
+            if self.assets:
+                self.on_change()
+            self.task = asyncio.create_task(self._run())
+
+        async def stop(self):
+            if self.task:
+                self.task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await self.task
+
+        async def _run(self):
+            pending = list(self.urls)
+            backoff = 30.0
+            async with httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(30.0, connect=10.0)) as client:
+                while pending:
+                    results = await asyncio.gather(*(self._fetch(client, state) for state in pending))
+                    pending = [state for state, ok in zip(pending, results) if not ok]
+                    if pending:
+                        await asyncio.sleep(backoff)
+                        backoff = min(backoff * 2, self.MAX_BACKOFF_SEC)
+
+        async def _fetch(self, client: httpx.AsyncClient, state: str) -> bool:
+            url = self.urls[state]
+            cached = self.assets.get(state)
+            headers = {}
+            if cached and cached.upstream_etag:
+                headers["If-None-Match"] = cached.upstream_etag
+            if cached and cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+            try:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached:
+                        self.not_modified += 1
+                        return True
+                    response.raise_for_status()
+                    chunks = []
+                    size = 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.MAX_BYTES:
+                            raise ValueError(f"larger than {self.MAX_BYTES // 2**20} MB")
+                        chunks.append(chunk)
+                    asset = VisualAsset(url, b"".join(chunks), response.headers.get("content-type", "image/gif"),
+                                        response.headers.get("etag"), response.headers.get("last-modified"))
+            except (httpx.HTTPError, ValueError) as e:
+                self.fetch_failures += 1
+                log.warning("⚠️ VISUAL_ASSIST asset fetch failed", extra=log_fields(
+                    state=state, url=url, error=f"{type(e).__name__}: {e}"))
+                return False
+            self.fetched += 1
+            self.assets[state] = asset
+            log.info("🖼️ VISUAL_ASSIST asset cached", extra=log_fields(
+                state=state, bytes=len(asset.body), digest=asset.digest))
+            if cached is None or cached.digest != asset.digest:
+                await asyncio.to_thread(self._save, state, asset)
+                self.on_change()
+            elif cached.upstream_etag != asset.upstream_etag:
+                await asyncio.to_thread(self._save, state, asset)
+            return True
+
+        def _paths(self, state: str) -> tuple:
+            return os.path.join(self.directory, f"{state}.bin"), os.path.join(self.directory, f"{state}.json")
+
+        def _load_saved(self):
+            for state, url in self.urls.items():
+                body_path, meta_path = self._paths(state)
+                try:
+                    with open(meta_path) as f:
+                        meta = json.load(f)
+                    if meta.get("url") != url:
+                        continue
+                    with open(body_path, "rb") as f:
+                        asset = VisualAsset(url, f.read(), meta["content_type"], meta.get("etag"),
+                                            meta.get("last_modified"))
+                except (OSError, ValueError, KeyError):
+                    continue
+                if asset.digest == meta.get("digest"):
+                    self.assets[state] = asset
+
+        def _save(self, state: str, asset: VisualAsset):
+            body_path, meta_path = self._paths(state)
+            meta = {"url": asset.url, "content_type": asset.content_type, "digest": asset.digest,
+                    "etag": asset.upstream_etag, "last_modified": asset.last_modified}
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for path, data in ((body_path, asset.body), (meta_path, json.dumps(meta).encode())):
+                    with open(path + ".tmp", "wb") as f:
+                        f.write(data)
+                    os.replace(path + ".tmp", path)
+            except OSError as e:
+                log.warning("⚠️ Could not save VISUAL_ASSIST asset", extra=log_fields(state=state, error=str(e)))
+
+        def stats(self) -> Dict[str, Any]:
+            return {
+                "cached": {state: {"digest": asset.digest, "bytes": len(asset.body)}
+                           for state, asset in self.assets.items()},
+                "fetched": self.fetched,
+                "not_modified": self.not_modified,
+                "fetch_failures": self.fetch_failures,
+            }
+
+
+    class VisualPage:
+        """The /visual page, rendered once per set of GIF URLs in every content coding"""
+
+        def __init__(self):
+            self.etag = ""
+            self.variants: Dict[str, bytes] = {}
+
+        def render(self, urls: Dict[str, str]):
+            html = VISUAL_PAGE_TEMPLATE.replace("__GIF_URLS__", json.dumps(urls).replace("</", "<\\/")).encode()
+            self.etag = hashlib.sha256(html).hexdigest()[:16]
+            variants = {"identity": html, "gzip": gzip.compress(html, 9, mtime=0)}
+            if brotli is not None:
+                variants["br"] = brotli.compress(html, quality=11)
+            self.variants = variants
+
+        def response(self, request: Request) -> Response:
+            accepted = accepted_encodings(request)
+            encoding = next((e for e in ("br", "gzip") if e in accepted and e in self.variants), "identity")
+            etag = f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+            headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+            if etag_matches(request, etag):
+                metrics.visual_responses.inc("not_modified")
+                return Response(status_code=304, headers=headers)
+            if encoding != "identity":
+                headers["Content-Encoding"] = encoding
+            metrics.visual_responses.inc("sent")
+            return Response(self.variants[encoding], media_type="text/html; charset=utf-8", headers=headers)
+
+
+    visual_assets = VisualAssets(VISUAL_GIF_URLS, VISUAL_ASSIST_ASSET_DIR) if VISUAL_ASSIST_ASSET_CACHE else None
+    visual_page = VisualPage()
+
+
+    def render_visual_page():
+        visual_page.render({state: visual_assets.url_for(state) if visual_assets else url
+                            for state, url in VISUAL_GIF_URLS.items()})
+
+
+    @app.on_event("startup")
+    async def start_visual_assets():
+        render_visual_page()
+        if visual_assets:
+            visual_assets.on_change = render_visual_page
+            await visual_assets.start()
+
+
+    @app.on_event("shutdown")
+    async def stop_visual_assets():
+        if visual_assets:
+            await visual_assets.stop()
+
+
+    @app.get("/visual", response_class=HTMLResponse)
+    async def visual_page_endpoint(request: Request):
+        """Serve the viewer page (pre-rendered and pre-compressed)"""
+        return visual_page.response(request)
+
+    @app.get("/visual/assets/{state}")
+    async def visual_asset(state: str, request: Request, v: Optional[str] = None):
+        """Serve a cached state GIF; immutable when requested by its content hash"""
+        if state not in VISUAL_GIF_URLS:
+            raise HTTPException(status_code=404, detail="Unknown state")
+        asset = visual_assets.assets.get(state) if visual_assets else None
+        if asset is None:
+            if not VISUAL_GIF_URLS[state]:
+                raise HTTPException(status_code=404, detail="No GIF configured for this state")
+            metrics.visual_responses.inc("redirect")
+            return RedirectResponse(VISUAL_GIF_URLS[state], status_code=307, headers={"Cache-Control": "no-store"})
+        etag = f'"{asset.digest}"'
+        headers = {"ETag": etag,
+                   "Cache-Control": "public, max-age=31536000, immutable" if v == asset.digest else "no-cache"}
+        if etag_matches(request, etag):
+            metrics.visual_responses.inc("not_modified")
+            return Response(status_code=304, headers=headers)
+        metrics.visual_responses.inc("sent")
+        return Response(asset.body, media_type=asset.content_type, headers=headers)
 
     @app.websocket("/ws")
     async def websocket_endpoint(websocket: WebSocket):
@@ -885,28 +5606,34 @@ if VISUAL_ASSIST_ENABLED:
         await visual_assist_manager.connect(websocket)
         try:
             while True:
-                # Keep connection alive and handle pings
+                # Keep connection alive and handle pings; the client's sender task sends the pong
                 data = await websocket.receive_json()
                 if data.get("type") == "ping":
-                    await websocket.send_json({{
-                        "type": "pong",
-                        "state": visual_assist_manager.current_state
-                    }})
+                    visual_assist_manager.ping(websocket)
         except WebSocketDisconnect:
+            pass
+        finally:
             visual_assist_manager.disconnect(websocket)
 
     @app.get("/visual/status")
     async def visual_status():
         """Return current assistant state and configuration"""
-        return {{
+        return {
             "state": visual_assist_manager.current_state,
             "visual_assist_enabled": True,
             "thinking_gif_url": VISUAL_ASSIST_THINKING_GIF_URL,
             "speaking_gif_url": VISUAL_ASSIST_SPEAKING_GIF_URL,
-            "idle_gif_url": VISUAL_ASSIST_IDLE_GIF_URL
-        }}
+            "idle_gif_url": VISUAL_ASSIST_IDLE_GIF_URL,
+            "assets": visual_assets.stats() if visual_assets else None
+        }
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=3000)
+    if WORKERS > 1:
+        # Workers import the app by name; slots and leases of a previous run are stale
+        shared_state.reset()
+        uvicorn.run("app:app", host="0.0.0.0", port=3000, workers=WORKERS,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=3000)
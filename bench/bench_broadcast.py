@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+VISUAL_ASSIST broadcast benchmark: sequential send_json vs. the fan-out engine
+
+Connects --clients simulated WebSocket clients to the ConnectionManager, of
+which --slow take --slow-ms per send (a wall tablet on bad Wi-Fi), and
+broadcasts --bursts rounds of thinking -> speaking -> idle. "sequential" is
+the manager as of 1.4.17 (send_json to each client in turn, awaited by the
+caller); "fan-out" is the shipped one. Reported per mode:
+
+  call       time the broadcasting request spends in broadcast_state (p50 / max)
+  fast       time until every fast client has the final idle state
+  slow       time until every slow client has it, and frames each slow client received
+  encodes    json.dumps calls per broadcast
+
+    python bench/bench_broadcast.py --clients 500 --slow 10 --slow-ms 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import load_app, summarize  # noqa: E402
+
+STATES = ("thinking", "speaking", "idle")
+
+
+class FakeWebSocket:
+    """Records received states; each send yields to the loop and may be slow"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.states = []
+        self.last_at = 0.0
+
+    async def accept(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.delay)
+        self.states.append(json.loads(text)["state"])
+        self.last_at = time.perf_counter()
+
+    async def send_json(self, data):
+        await self.send_text(json.dumps(data))
+
+
+class SequentialManager:
+    """ConnectionManager.broadcast_state as of 1.4.17"""
+
+    def __init__(self):
+        self.active_connections = set()
+        self.current_state = "idle"
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.add(websocket)
+        await websocket.send_json({"type": "state_change", "state": self.current_state,
+                                   "timestamp": int(time.time())})
+
+    async def broadcast_state(self, state: str):
+        self.current_state = state
+        message = {"type": "state_change", "state": state, "timestamp": int(time.time())}
+        disconnected = set()
+        for connection in self.active_connections:
+            try:
+                await connection.send_json(message)
+            except Exception:
+                disconnected.add(connection)
+        self.active_connections -= disconnected
+
+
+class CountingDumps:
+    """Wraps json.dumps to count encodes"""
+
+    def __init__(self):
+        self.calls = 0
+        self.original = json.dumps
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return self.original(*args, **kwargs)
+
+
+async def run(manager, args, dumps: CountingDumps) -> dict:
+    sockets = [FakeWebSocket(args.slow_ms / 1000 if i < args.slow else 0) for i in range(args.clients)]
+    for websocket in sockets:
+        await manager.connect(websocket)
+    await asyncio.sleep(args.slow_ms / 1000 + 0.05)  # Let the initial state frames go out
+    for websocket in sockets:
+        websocket.states.clear()
+
+    dumps.calls = 0
+    calls = []
+    started = time.perf_counter()
+    for _ in range(args.bursts):
+        for state in STATES:
+            call_started = time.perf_counter()
+            result = manager.broadcast_state(state)
+            if asyncio.iscoroutine(result):
+                await result
+            calls.append(time.perf_counter() - call_started)
+            await asyncio.sleep(args.gap_ms / 1000)
+    broadcasts = len(calls)
+    encodes = dumps.calls / broadcasts
+
+    deadline = time.perf_counter() + 30
+    while time.perf_counter() < deadline and not all(s.states and s.states[-1] == "idle" for s in sockets):
+        await asyncio.sleep(0.005)
+    fast, slow = sockets[args.slow:], sockets[:args.slow]
+    return {
+        "call": summarize(calls),
+        "fast": max(s.last_at for s in fast) - started,
+        "slow": max(s.last_at for s in slow) - started if slow else 0.0,
+        "slow_frames": sum(len(s.states) for s in slow) / len(slow) if slow else 0.0,
+        "fast_frames": sum(len(s.states) for s in fast) / len(fast),
+        "encodes": encodes,
+        "broadcasts": broadcasts,
+    }
+
+
+async def main(args):
+    app = load_app("http://127.0.0.1:9/api", VISUAL_ASSIST_ENABLED="true", LOG_LEVEL="warning",
+                   VISUAL_ASSIST_SEND_TIMEOUT_SEC="30")
+    dumps = CountingDumps()
+    json.dumps = dumps
+    results = {
+        "sequential": await run(SequentialManager(), args, dumps),
+        "fan-out": await run(app.ConnectionManager(app.VISUAL_ASSIST_CLIENT_QUEUE, 30.0), args, dumps),
+    }
+    json.dumps = dumps.original
+
+    print(f"{args.clients} clients ({args.slow} at {args.slow_ms:g}ms per send), "
+          f"{args.bursts * len(STATES)} broadcasts {args.gap_ms:g}ms apart")
+    print(f"{'mode':<12} {'call p50':>10} {'call max':>10} {'fast done':>10} {'slow done':>10} "
+          f"{'frames fast/slow':>17} {'encodes':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<12} {r['call']['p50'] * 1000:>8.2f}ms {r['call']['max'] * 1000:>8.1f}ms "
+              f"{r['fast'] * 1000:>8.0f}ms {r['slow'] * 1000:>8.0f}ms "
+              f"{r['fast_frames']:>8.1f}/{r['slow_frames']:<8.1f} {r['encodes']:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--slow", type=int, default=10, help="clients whose sends take --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=200)
+    parser.add_argument("--bursts", type=int, default=5, help="rounds of thinking/speaking/idle")
+    parser.add_argument("--gap-ms", type=float, default=20, help="time between broadcasts")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Quest completion benchmark: time from "quest done" to "shim has the reply"
+
+Runs every quest_completion_mode against the fake bike4mind server and
+reports p50/p95 completion lag plus status requests per quest. The `poll`
+mode is the original fixed-interval loop and serves as the baseline.
+
+    python bench/bench_completion.py --quests 40 --latency 3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+MODES = ["poll", "adaptive", "longpoll", "sse", "websocket"]
+
+
+async def run_mode(app, fake: FakeB4M, mode: str, quests: int, warmup: int, concurrency: int):
+    engine = app.QuestCompletionEngine(mode)
+    app.quest_completion = engine
+    semaphore = asyncio.Semaphore(concurrency)
+    lags = []
+
+    async def one(record: bool):
+        async with semaphore:
+            quest_id = await app.create_b4m_quest("benchmark prompt")
+            await app.poll_b4m_quest(quest_id)
+            if record:
+                lags.append(time.monotonic() - fake.quests[quest_id].done_at)
+
+    # Warm-up quests let the adaptive schedule learn the latency distribution
+    await asyncio.gather(*(one(False) for _ in range(warmup)))
+    before = sum(fake.requests.values()) - fake.requests["create"]
+    await asyncio.gather(*(one(True) for _ in range(quests)))
+    requests = sum(fake.requests.values()) - fake.requests["create"] - before
+
+    result = summarize(lags)
+    result["status_requests_per_quest"] = requests / quests
+    return result
+
+
+async def main(args):
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=args.sigma, seed=1,
+                   longpoll=not args.no_longpoll, push=not args.no_push)
+    base = f"http://127.0.0.1:{args.port}/api"
+    app = load_app(base, QUEST_EVENTS_URL="{base}/sessions/{session_id}/chat/{quest_id}/events")
+    server = await serve(fake.app, args.port)
+    app.http_client = app.httpx.AsyncClient(timeout=app.httpx.Timeout(15.0, connect=5.0))
+
+    results = {}
+    for mode in args.modes:
+        if mode == "websocket":
+            app.QUEST_EVENTS_URL = "ws://127.0.0.1:%d/api/sessions/{session_id}/chat/{quest_id}/ws" % args.port
+        else:
+            app.QUEST_EVENTS_URL = "{base}/sessions/{session_id}/chat/{quest_id}/events"
+        results[mode] = await run_mode(app, fake, mode, args.quests, args.warmup, args.concurrency)
+        r = results[mode]
+        print(f"{mode:>10}: p50 {r['p50'] * 1000:7.1f} ms  p95 {r['p95'] * 1000:7.1f} ms  "
+              f"status requests/quest {r['status_requests_per_quest']:.1f}")
+
+    await app.http_client.aclose()
+    await shutdown(server)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--quests", type=int, default=40)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=3.0, help="mean quest latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.35)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--no-push", action="store_true", help="fake backend without SSE/WebSocket")
+    parser.add_argument("--no-longpoll", action="store_true", help="fake backend that ignores ?wait=")
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Conversation context benchmark: fixed historyCount vs. token-budgeted context
+
+Runs --conversations scripted conversations one after another (device
+commands, questions, follow-ups and long-form requests), each request
+carrying a Home Assistant style system prompt and the conversation so far,
+against the fake bike4mind with prompt-size dependent latency
+(--prefill-per-1k seconds per 1000 prompt tokens, --decode-per-token seconds
+per reply token; the fake reply is long enough that max_tokens matters).
+All conversations share one bike4mind session, as they do in the add-on.
+For each CONTEXT_MODE it reports request latency by prompt kind, prompt and reply tokens per quest,
+and how many follow-ups had the previous user turn in the prompt bike4mind
+saw. Speculative quests are off so every mode plans from the full request;
+a last check sends a first-turn follow-up ("What is it?") in budget mode
+with speculative quests turned on, which must not let them plan from the
+last message alone, and reports the historyCount it got (the request
+carries no earlier turns, so it should be 0).
+
+    python bench/bench_context.py --conversations 6
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import REPLY_SENTENCES, FakeB4M  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+SYSTEM_PROMPT = ("You are a voice assistant for Home Assistant. Answer briefly. Available devices: "
+                 + ", ".join(f"light.room_{i} (Room {i} light)" for i in range(40)))
+
+# (prompt, kind); a follow-up refers to the `{topic}` of the user turn before it
+SCRIPT = [
+    ("Turn on the {topic} light", "command"),
+    ("What is the weather like in {topic} this weekend?", "question"),
+    ("And what about next week there?", "followup"),
+    ("Set the {topic} thermostat to 21 degrees", "command"),
+    ("Explain how a heat pump works in detail", "long"),
+    ("Why is it more efficient than that?", "followup"),
+    ("Switch off the {topic} fan", "command"),
+]
+TOPICS = ["garage", "kitchen", "porch", "attic", "cellar", "studio", "lounge", "nursery"]
+
+
+async def conversation(client: httpx.AsyncClient, url: str, index: int, latencies: dict, fake: FakeB4M,
+                       followups: list):
+    topic = TOPICS[index % len(TOPICS)]
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    previous_user = ""
+    for prompt, kind in SCRIPT:
+        prompt = prompt.format(topic=topic)
+        messages.append({"role": "user", "content": prompt})
+        started = time.monotonic()
+        response = await client.post(url, json={"messages": messages, "user": f"user-{index}"})
+        response.raise_for_status()
+        latencies.setdefault(kind, []).append(time.monotonic() - started)
+        reply = response.json()["choices"][0]["message"]["content"] or ""
+        messages.append({"role": "assistant", "content": reply})
+        if kind == "followup":
+            followups.append(previous_user in fake.prompts[-1]["prompt"])
+        previous_user = prompt
+
+
+async def main(args):
+    reply = " ".join(REPLY_SENTENCES * 12)
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.1, reply=reply, prefill_per_1k=args.prefill_per_1k,
+                   decode_per_token=args.decode_per_token, seed=20)
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api", QUEST_COMPLETION_MODE="longpoll",
+                   SPECULATIVE_QUESTS="false", LOG_LEVEL="warning")
+    fake_server = await serve(fake.app, args.fake_port)
+    shim_server = await serve(app.app, args.port)
+    url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+
+    results = {}
+    async with httpx.AsyncClient(timeout=120) as client:
+        for mode in ("fixed", "budget", "summary"):
+            app.context_manager.mode = mode
+            fake.prompts.clear()
+            fake.sessions.clear()
+            latencies: dict = {}
+            followups: list = []
+            for i in range(args.conversations):
+                await conversation(client, url, i, latencies, fake, followups)
+            everything = [value for values in latencies.values() for value in values]
+            results[mode] = {
+                "latency": summarize(everything),
+                "by_kind": {kind: summarize(values)["p50"] for kind, values in latencies.items()},
+                "prompt_tokens": sum(p["prompt_tokens"] for p in fake.prompts) / len(fake.prompts),
+                "reply_tokens": sum(p["reply_tokens"] for p in fake.prompts) / len(fake.prompts),
+                "followup_context": f"{sum(followups)}/{len(followups)}",
+            }
+
+        # Speculative quests turned on in budget mode; the shared session has plenty of turns by now
+        app.SPECULATIVE_QUESTS = True
+        app.context_manager.mode = "budget"
+        response = await client.post(url, json={"messages": [{"role": "system", "content": SYSTEM_PROMPT},
+                                                             {"role": "user", "content": "What is it?"}],
+                                                "user": "first-turn"})
+        response.raise_for_status()
+        first_turn_history = fake.prompts[-1]["history_count"]
+
+    await shutdown(shim_server)
+    await shutdown(fake_server)
+
+    print(f"{args.conversations} conversations x {len(SCRIPT)} turns, budget {app.CONTEXT_TOKEN_BUDGET} tokens")
+    kinds = ("command", "question", "followup", "long")
+    print(f"{'mode':<8} {'p50':>6} {'p95':>6} " + " ".join(f"{kind:>9}" for kind in kinds)
+          + f" {'prompt tok':>10} {'reply tok':>9} {'follow-up ctx':>13}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['latency']['p50']:>5.2f}s {r['latency']['p95']:>5.2f}s "
+              + " ".join(f"{r['by_kind'][kind]:>8.2f}s" for kind in kinds)
+              + f" {r['prompt_tokens']:>10.0f} {r['reply_tokens']:>9.0f} {r['followup_context']:>13}")
+    print(f"first-turn follow-up with speculative quests on: historyCount {first_turn_history} (expected 0)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--conversations", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.3, help="mean quest latency before prompt and reply costs")
+    parser.add_argument("--prefill-per-1k", type=float, default=0.4, help="seconds per 1000 prompt tokens")
+    parser.add_argument("--decode-per-token", type=float, default=0.005, help="seconds per reply token")
+    parser.add_argument("--port", type=int, default=8921)
+    parser.add_argument("--fake-port", type=int, default=8920)
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
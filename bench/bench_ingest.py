@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Ingest benchmark: time and memory until the last message of a long history is known
+
+Compares the default FastAPI path (json.loads of the whole body, then
+Pydantic validation of every message) with the speculative path (decode only
+the last element of "messages", found by searching backwards), plus the cost
+of the full model_validate_json that now runs while the quest is created.
+
+    python bench/bench_ingest.py --messages 100 500 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import load_app  # noqa: E402
+
+FILLER = ("The living room lights were turned on at sunset and the thermostat was set to twenty one degrees. "
+          "Remind me about the \"garage door\" if it stays open.")
+
+
+def make_body(count: int) -> bytes:
+    messages = [{"role": "system", "content": "You are a helpful smart home assistant. " * 20}]
+    for i in range(count - 2):
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": f"{i}: {FILLER}"})
+    messages.append({"role": "user", "content": "turn on the kitchen lights"})
+    return json.dumps({"model": "bike4mind", "messages": messages, "stream": False}).encode()
+
+
+def measure(func, body: bytes, repeat: int):
+    func(body)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(body)
+    elapsed = (time.perf_counter() - started) / repeat
+    tracemalloc.start()
+    func(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024
+
+
+def in_process(app, sizes, repeat: int):
+    def fastapi_path(body):
+        return app.ChatCompletionRequest.model_validate(json.loads(body)).messages[-1].content
+
+    def speculative_path(body):
+        return app.find_last_message(body)["content"]
+
+    def full_validation(body):
+        return app.ChatCompletionRequest.model_validate_json(body)
+
+    results = {}
+    for count in sizes:
+        body = make_body(count)
+        row = {"body_kb": len(body) / 1024}
+        for name, func in (("fastapi", fastapi_path), ("speculative", speculative_path),
+                           ("validate_json", full_validation)):
+            ms, peak_kb = measure(func, body, repeat)
+            row[name] = {"ms": ms, "peak_kb": peak_kb}
+        results[count] = row
+        print(f"{count:>5} messages ({row['body_kb']:.0f} KB): "
+              f"fastapi {row['fastapi']['ms']:.3f} ms / {row['fastapi']['peak_kb']:.0f} KB | "
+              f"speculative {row['speculative']['ms']:.3f} ms / {row['speculative']['peak_kb']:.0f} KB | "
+              f"validate_json {row['validate_json']['ms']:.3f} ms / {row['validate_json']['peak_kb']:.0f} KB")
+    return results
+
+
+def main(args):
+    app = load_app("http://127.0.0.1:9/api", LOG_LEVEL="warning")
+    results = in_process(app, args.messages, args.repeat)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--json", help="write results to this file")
+    main(parser.parse_args())
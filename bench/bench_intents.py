@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Intent fast-path benchmark
+
+1. Microbenchmark: IntentEngine.match() latency against synthetic entity
+   indexes of increasing size.
+2. End to end: /v1/chat/completions for simple device commands with the
+   fast path on (answered locally) vs. off (bike4mind round-trip through the
+   fake server).
+
+    python bench/bench_intents.py --sizes 1000 5000 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from fake_ha import FakeHA, synthetic_states  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+
+def phrases_for(states, count):
+    """Commands naming real entities, plus some that must fall through"""
+    phrases = []
+    verbs = {"light": "turn on the {}", "switch": "turn off {}", "fan": "switch on the {}",
+             "cover": "open the {}", "lock": "lock the {}"}
+    for state in states:
+        domain = state["entity_id"].split(".")[0]
+        if domain in verbs:
+            phrases.append(verbs[domain].format(state["attributes"]["friendly_name"].lower()))
+        if len(phrases) >= count:
+            break
+    phrases += ["what should I cook for dinner", "tell me a joke", "turn on the spaceship"]
+    return phrases
+
+
+def micro(app, sizes, iterations):
+    results = {}
+    for size in sizes:
+        states = synthetic_states(size)
+        engine = app.IntentEngine(app.INTENT_MIN_CONFIDENCE)
+        started = time.perf_counter()
+        engine.build_index(states)
+        build_ms = (time.perf_counter() - started) * 1000
+        phrases = phrases_for(states, 50)
+        timings = []
+        for _ in range(iterations):
+            for phrase in phrases:
+                t = time.perf_counter()
+                engine.match(phrase)
+                timings.append((time.perf_counter() - t) * 1e6)
+        r = summarize(timings)
+        results[size] = {"build_ms": build_ms, "match_us": r,
+                         "matched": engine.matches / iterations, "fell_through": engine.fallthroughs / iterations}
+        print(f"{size:>7} entities: index build {build_ms:7.1f} ms | match p50 {r['p50']:6.1f} us "
+              f"p99 {r['p99']:6.1f} us | matched {engine.matches // iterations}/{len(phrases)}")
+    return results
+
+
+async def end_to_end(app, args):
+    fake_b4m = FakeB4M(latency_mean=args.latency, seed=3)
+    fake_ha = FakeHA(entities=500)
+    b4m_server = await serve(fake_b4m.app, args.fake_port)
+    ha_server = await serve(fake_ha.app, args.ha_port)
+    app.EXTROVERT_HA_URL = f"http://127.0.0.1:{args.ha_port}/api"
+    shim_server = await serve(app.app, args.port)
+    engine = app.IntentEngine(app.INTENT_MIN_CONFIDENCE)
+    await engine.refresh()
+    phrases = [p for p in phrases_for(fake_ha.states, args.requests) if engine.match(p)][:args.requests]
+
+    results = {}
+    async with httpx.AsyncClient(timeout=120) as client:
+        for name, fast in (("cloud", None), ("fast-path", engine)):
+            app.intent_engine = fast
+            latencies = []
+
+            async def one(phrase):
+                t = time.monotonic()
+                r = await client.post(f"http://127.0.0.1:{args.port}/v1/chat/completions",
+                                      json={"messages": [{"role": "user", "content": phrase}]})
+                r.raise_for_status()
+                latencies.append(time.monotonic() - t)
+
+            await asyncio.gather(*(one(p) for p in phrases))
+            results[name] = summarize(latencies)
+            print(f"{name:>10}: p50 {results[name]['p50'] * 1000:8.1f} ms  p95 {results[name]['p95'] * 1000:8.1f} ms")
+
+    for server in (shim_server, ha_server, b4m_server):
+        await shutdown(server)
+    return results
+
+
+async def main(args):
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api")
+    results = {"match": micro(app, args.sizes, args.iterations)}
+    if not args.micro_only:
+        results["end_to_end"] = await end_to_end(app, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 5000, 20000])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=3.0, help="mean fake bike4mind quest latency")
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--fake-port", type=int, default=8930)
+    parser.add_argument("--ha-port", type=int, default=8932)
+    parser.add_argument("--micro-only", action="store_true")
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Logging benchmark: event-loop stall caused by writing logs to a slow pipe
+
+Runs the same chat-completion load twice against the fake bike4mind server
+with stdout replaced by a stream whose writes take --write-ms (a congested
+supervisor log pipe). "blocking" writes each record from the event loop, as
+the old print() calls did; "background" is the shipped queue-backed handler.
+A probe task sleeps 1 ms in a loop and records how late it wakes up.
+
+    python bench/bench_logging.py --requests 200 --write-ms 2
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+
+class SlowStream:
+    """File-like object whose writes block like a full pipe"""
+
+    def __init__(self, write_ms: float):
+        self.delay = write_ms / 1000
+        self.lines = 0
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        self.lines += text.count("\n")
+
+    def flush(self):
+        pass
+
+
+def install_blocking_handler(app, stream):
+    """Same records and formatting, written synchronously from the caller"""
+    root = logging.getLogger("b4m")
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(app.JsonLogFormatter())
+    handler.addFilter(app.RequestContextFilter(app.LOG_POLL_SAMPLE))
+    root.addHandler(handler)
+
+
+async def probe_loop(lags, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(max(time.perf_counter() - started - 0.001, 0.0))
+
+
+async def run_load(client: httpx.AsyncClient, url: str, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        body = {"messages": [{"role": "user", "content": f"what's the status of the garage {i}"}]}
+        async with semaphore:
+            started = time.monotonic()
+            response = await client.post(url, json=body)
+            response.raise_for_status()
+            return time.monotonic() - started
+
+    return await asyncio.gather(*(one(i) for i in range(requests)))
+
+
+async def main(args):
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.2, seed=5)
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api", LOG_POLL_SAMPLE=str(args.poll_sample))
+    fake_server = await serve(fake.app, args.fake_port)
+    shim_server = await serve(app.app, args.port)
+    url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+
+    results = {}
+    async with httpx.AsyncClient(timeout=120) as client:
+        for mode in ("blocking", "background"):
+            stream = SlowStream(args.write_ms)
+            if mode == "blocking":
+                install_blocking_handler(app, stream)
+            else:
+                app.setup_logging(stream)
+
+            lags = []
+            stop = asyncio.Event()
+            probe = asyncio.create_task(probe_loop(lags, stop))
+            latencies = await run_load(client, url, args.requests, args.concurrency)
+            stop.set()
+            await probe
+            for handler in logging.getLogger("b4m").handlers:
+                handler.close()
+
+            lag = summarize([value * 1000 for value in lags])
+            results[mode] = {
+                "loop_lag_ms": lag,
+                "loop_stall_total_ms": sum(lags) * 1000,
+                "request_seconds": summarize(latencies),
+                "log_lines": stream.lines,
+            }
+            print(f"{mode:>10}: loop lag p50 {lag['p50']:.2f} ms  p99 {lag['p99']:.2f} ms  max {lag['max']:.2f} ms | "
+                  f"stalled {sum(lags) * 1000:.0f} ms total | request p95 {results[mode]['request_seconds']['p95']:.2f}s | "
+                  f"{stream.lines} log lines")
+
+    await shutdown(shim_server)
+    await shutdown(fake_server)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8921)
+    parser.add_argument("--fake-port", type=int, default=8920)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0, help="mean quest latency in seconds")
+    parser.add_argument("--write-ms", type=float, default=2.0, help="time each log write blocks")
+    parser.add_argument("--poll-sample", type=int, default=10, help="log one in N quest polls")
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
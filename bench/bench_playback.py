@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Playback benchmark: estimated speech lengths vs. Home Assistant media_player events
+
+The fake Home Assistant plays speech on its media players at
+--rates words/s (the add-on's estimate assumes 2.5) after a
+--start-delay, reports the state changes on its WebSocket API among
+--noise sensor updates per second, and records when each playback really
+started and ended. Compared with HA_PLAYBACK_EVENTS=false (estimate) and
+true (events):
+
+  announcements  --announcements EXTROVERT prompts queued for one player:
+                 cut-offs (an announcement interrupted by the next one) and
+                 the silent gap between announcements (p50 / max)
+  chat idle      --chats chat replies spoken on a voice satellite listed in
+                 VISUAL_ASSIST_MEDIA_PLAYERS: when /ws went back to idle,
+                 relative to the end of playback (negative = too early)
+
+    python bench/bench_playback.py --announcements 4 --chats 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from fake_ha import FakeHA  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+ANNOUNCEMENT = "The washing machine has finished and the laundry can be hung up now."
+SATELLITE = "media_player.kitchen_satellite"
+SPEAKER = "media_player.living_room"
+
+
+async def watch_visual(url: str, states: list):
+    async with websockets.connect(url) as ws:
+        async for message in ws:
+            states.append((time.monotonic(), json.loads(message)["state"]))
+
+
+async def announcements(client: httpx.AsyncClient, base: str, ha: FakeHA, count: int) -> dict:
+    ha.playbacks.clear()
+    for i in range(count):
+        response = await client.post(f"{base}/v1/extrovert/trigger", json={
+            "prompt": f"laundry announcement {i}", "tts_config": {"media_player": SPEAKER}})
+        response.raise_for_status()
+    while len(ha.playbacks) < count or any(p["ended"] is None for p in ha.playbacks):
+        await asyncio.sleep(0.05)
+    played = sorted((p for p in ha.playbacks if p["started"]), key=lambda p: p["started"])
+    gaps = [max(b["started"] - a["ended"], 0.0) for a, b in zip(played, played[1:]) if not a["interrupted"]]
+    return {"cut_offs": sum(p["interrupted"] for p in ha.playbacks), "gap": summarize(gaps or [0.0])}
+
+
+async def chats(client: httpx.AsyncClient, base: str, ha: FakeHA, ha_base: str, count: int, states: list) -> dict:
+    errors = []
+    for i in range(count):
+        response = await client.post(f"{base}/v1/chat/completions", json={
+            "messages": [{"role": "user", "content": f"What is the weather like today? ({i})"}]})
+        response.raise_for_status()
+        reply = response.json()["choices"][0]["message"]["content"]
+        # The voice satellite speaks the reply, as the Assist pipeline does
+        ha.playbacks.clear()
+        await client.post(f"{ha_base}/services/tts/speak", json={"media_player_entity_id": SATELLITE,
+                                                                 "message": reply})
+        while not ha.playbacks or ha.playbacks[0]["ended"] is None:
+            await asyncio.sleep(0.02)
+        ended = ha.playbacks[0]["ended"]
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline and (not states or states[-1][1] != "idle"):
+            await asyncio.sleep(0.02)
+        errors.append(states[-1][0] - ended)
+        await asyncio.sleep(0.5)
+    return {"error": summarize(errors), "early": sum(e < 0 for e in errors)}
+
+
+async def run(args, events: bool, rate: float) -> dict:
+    ha = FakeHA(entities=50, service_latency=0.02, speech_words_per_sec=rate,
+                playback_start_delay=args.start_delay, noise_per_sec=args.noise)
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.1, reply=ANNOUNCEMENT, seed=24)
+    ha_base = f"http://127.0.0.1:{args.ha_port}/api"
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api", LOG_LEVEL="warning", EXTROVERT_ENABLED="true",
+                   EXTROVERT_HA_URL=ha_base, EXTROVERT_RATE_LIMIT="1000", EXTROVERT_CONCURRENCY="4",
+                   VISUAL_ASSIST_ENABLED="true", VISUAL_ASSIST_MEDIA_PLAYERS=SATELLITE,
+                   HA_PLAYBACK_EVENTS="true" if events else "false", QUEST_COMPLETION_MODE="longpoll")
+    ha_server = await serve(ha.app, args.ha_port)
+    fake_server = await serve(fake.app, args.fake_port)
+    shim_server = await serve(app.app, args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    states: list = []
+    watcher = asyncio.create_task(watch_visual(f"ws://127.0.0.1:{args.port}/ws", states))
+    async with httpx.AsyncClient(timeout=120) as client:
+        while events and not (await client.get(f"{base}/admin/playback")).json()["connected"]:
+            await asyncio.sleep(0.05)
+        result = {**await announcements(client, base, ha, args.announcements),
+                  **await chats(client, base, ha, ha_base, args.chats, states)}
+        playback = (await client.get(f"{base}/admin/playback")).json()
+    watcher.cancel()
+    await shutdown(shim_server)
+    await shutdown(fake_server)
+    await shutdown(ha_server)
+    result["decoded"] = f"{playback.get('events', 0)}/{playback.get('events', 0) + playback.get('skipped', 0)}"
+    return result
+
+
+async def main(args):
+    results = {}
+    for rate in args.rates:
+        for events in (False, True):
+            results[(rate, "events" if events else "estimate")] = await run(args, events, rate)
+
+    print(f"{args.announcements} announcements of {len(ANNOUNCEMENT.split())} words on one player, {args.chats} chat "
+          f"replies on a satellite, {args.start_delay:g}s start delay, {args.noise:g} sensor events/s")
+    print(f"{'words/s':>7} {'mode':<9} {'cut-offs':>8} {'gap p50':>8} {'gap max':>8} "
+          f"{'idle err p50':>12} {'idle err max':>12} {'early':>5} {'decoded':>10}")
+    for (rate, mode), r in results.items():
+        print(f"{rate:>7g} {mode:<9} {r['cut_offs']:>8} {r['gap']['p50']:>7.2f}s {r['gap']['max']:>7.2f}s "
+              f"{r['error']['p50']:>+11.2f}s {r['error']['max']:>+11.2f}s {r['early']:>5} {r['decoded']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--announcements", type=int, default=4)
+    parser.add_argument("--chats", type=int, default=4)
+    parser.add_argument("--rates", type=float, nargs="+", default=[2.0, 3.2],
+                        help="words per second the fake media players really speak at")
+    parser.add_argument("--start-delay", type=float, default=0.4, help="seconds before a player starts playing")
+    parser.add_argument("--noise", type=float, default=200, help="sensor state_changed events per second")
+    parser.add_argument("--latency", type=float, default=0.3, help="mean quest latency")
+    parser.add_argument("--port", type=int, default=8952)
+    parser.add_argument("--fake-port", type=int, default=8950)
+    parser.add_argument("--ha-port", type=int, default=8951)
+    asyncio.run(main(parser.parse_args()))
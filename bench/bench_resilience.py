@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Resilience benchmark: chat latency and failures while bike4mind misbehaves
+
+Runs chat completions through the shim against the fake bike4mind server in
+three scenarios, each with the resilience layer off (no retries, breaker
+never opens, no hedging; the behaviour before 1.4.11) and on:
+
+  errors    a fraction of create/status requests return 503
+  outage    every request hangs until the upstream timeout
+  slow_tail a fraction of quest creations take --slow-delay seconds
+
+    python bench/bench_resilience.py --requests 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+SCENARIOS = ["errors", "outage", "slow_tail"]
+
+
+def configure(app, resilient: bool, hedge: bool, upstream_timeout: float, fallback: str):
+    """Reset the shim's resilience state for one run"""
+    app.B4M_RETRIES = 2 if resilient else 0
+    app.B4M_FALLBACK_REPLY = fallback if resilient else ""
+    app.B4M_HEDGE_ENABLED = resilient and hedge
+    app.b4m_breaker = app.CircuitBreaker(
+        app.B4M_BREAKER_ERROR_RATE, app.B4M_BREAKER_MIN_REQUESTS if resilient else 10 ** 9,
+        app.B4M_BREAKER_WINDOW_SEC, app.B4M_BREAKER_COOLDOWN_SEC)
+    app.quest_create_latency = app.LatencyWindow()
+    app.http_client = app.build_upstream_client(
+        app.b4m_pool_stats, app.B4M_POOL_SIZE, app.B4M_KEEPALIVE_SEC,
+        httpx.Timeout(upstream_timeout, connect=1.0))
+
+
+async def run_load(client: httpx.AsyncClient, url: str, requests: int, concurrency: int, fallback: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = {"ok": 0, "fallback": 0, "error": 0}
+
+    async def one(i: int):
+        body = {"messages": [{"role": "user", "content": f"is the garage door open {i}"}]}
+        async with semaphore:
+            started = time.monotonic()
+            response = await client.post(url, json=body)
+            latencies.append(time.monotonic() - started)
+            if response.status_code != 200:
+                outcomes["error"] += 1
+            elif response.json()["choices"][0]["message"]["content"] == fallback:
+                outcomes["fallback"] += 1
+            else:
+                outcomes["ok"] += 1
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return latencies, outcomes
+
+
+async def main(args):
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.2, seed=7)
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api", LOG_LEVEL="error",
+                   QUEST_COMPLETION_MODE="poll", POLL_INTERVAL_MS="500")
+    fake_server = await serve(fake.app, args.fake_port)
+    shim_server = await serve(app.app, args.port)
+    url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+    fallback = app.B4M_FALLBACK_REPLY
+
+    results = {}
+    async with httpx.AsyncClient(timeout=300) as client:
+        for scenario in args.scenarios:
+            results[scenario] = {}
+            for resilient in (False, True):
+                mode = "resilient" if resilient else "baseline"
+                fake.error_rate, fake.slow_rate, fake.fault_endpoints = 0.0, 0.0, {"create", "status"}
+                configure(app, resilient, hedge=scenario == "slow_tail", upstream_timeout=args.upstream_timeout,
+                          fallback=fallback)
+                if scenario == "slow_tail":
+                    # Fill the latency window so a p95 hedge delay exists
+                    await run_load(client, url, 25, args.concurrency, fallback)
+                    fake.slow_rate, fake.slow_delay, fake.fault_endpoints = args.slow_rate, args.slow_delay, {"create"}
+                elif scenario == "errors":
+                    fake.error_rate = args.error_rate
+                else:
+                    fake.slow_rate, fake.slow_delay = 1.0, args.upstream_timeout * 2
+
+                creates_before = fake.requests["create"]
+                latencies, outcomes = await run_load(client, url, args.requests, args.concurrency, fallback)
+                row = {**summarize(latencies), **outcomes,
+                       "creates_per_request": (fake.requests["create"] - creates_before) / args.requests,
+                       "breaker": app.b4m_breaker.stats()["state"]}
+                results[scenario][mode] = row
+                print(f"{scenario:>9} {mode:>9}: p50 {row['p50']:6.2f}s  p95 {row['p95']:6.2f}s  "
+                      f"max {row['max']:6.2f}s | ok {row['ok']:3d}  fallback {row['fallback']:3d}  "
+                      f"error {row['error']:3d} | creates/request {row['creates_per_request']:.2f}  "
+                      f"breaker {row['breaker']}")
+                await app.http_client.aclose()
+
+    await shutdown(shim_server)
+    await shutdown(fake_server)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--fake-port", type=int, default=8930)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean quest latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="fraction of requests failed in 'errors'")
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="fraction of slow creations in 'slow_tail'")
+    parser.add_argument("--slow-delay", type=float, default=2.0)
+    parser.add_argument("--upstream-timeout", type=float, default=3.0, help="shim read timeout for bike4mind")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
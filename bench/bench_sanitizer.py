@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+TTS sanitizer benchmark: single-pass TTSSanitizer vs. the seven-regex version
+
+1. Equivalence: every reply in tts_corpus.jsonl (or --corpus) is sanitized by
+   both; outputs must match up to whitespace (the old version re-joined words
+   with single spaces when truncating). Entries with a "differs" note are
+   cases the old version got wrong and must differ.
+2. Streaming: each reply fed in random chunks must give exactly the same
+   output as feeding it whole.
+3. Microbenchmark: time per call for the corpus, and for a long reply that
+   is cut at the word limit.
+
+    python bench/bench_sanitizer.py --repeat 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import load_app  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_corpus.jsonl")
+
+
+def legacy_sanitize(text: str, max_words: int = 200) -> str:
+    """sanitize_response_for_tts as of 1.4.14"""
+    text = re.sub(r'```[\s\S]*?```', '', text)
+    text = re.sub(r'`([^`]+)`', r'\1', text)
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)
+    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+    text = re.sub(r'\{[\s\S]*?\}', '', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    words = text.split()
+    if len(words) > max_words:
+        text = ' '.join(words[:max_words]) + '...'
+    return text.strip()
+
+
+def spoken(text: str) -> str:
+    return " ".join(text.split())
+
+
+def streamed(app, text: str, rng: random.Random) -> str:
+    sanitizer = app.TTSSanitizer()
+    parts, pos = [], 0
+    while pos < len(text):
+        size = rng.randint(1, 12)
+        parts.append(sanitizer.feed(text[pos:pos + size]))
+        pos += size
+    return "".join(parts) + sanitizer.flush()
+
+
+def per_call_us(function, texts, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            function(text)
+    return (time.perf_counter() - started) / (repeat * len(texts)) * 1e6
+
+
+def main(args) -> int:
+    app = load_app("http://127.0.0.1:1/api", LOG_LEVEL="error", EXTROVERT_ENABLED="true")
+    with open(args.corpus) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    failures = 0
+    for entry in corpus:
+        new, old = app.sanitize_response_for_tts(entry["reply"]), legacy_sanitize(entry["reply"])
+        if (spoken(new) == spoken(old)) == bool(entry.get("differs")):
+            failures += 1
+            print(f"MISMATCH {entry['reply']!r}\n     old {old!r}\n     new {new!r}")
+        elif entry.get("differs"):
+            print(f"differs as intended ({entry['differs']}):\n     old {old!r}\n     new {new!r}")
+    print(f"equivalence: {len(corpus) - failures}/{len(corpus)} replies as expected")
+
+    rng = random.Random(5)
+    long_reply = " ".join(entry["reply"] for entry in corpus) * 20
+    streaming_failures = 0
+    for text in [entry["reply"] for entry in corpus] + [long_reply]:
+        whole = app.sanitize_response_for_tts(text)
+        for _ in range(args.chunkings):
+            if streamed(app, text, rng) != whole:
+                streaming_failures += 1
+                print(f"STREAMING MISMATCH {text[:60]!r}")
+                break
+    print(f"streaming: {streaming_failures} mismatches over {args.chunkings} chunkings per reply")
+
+    texts = [entry["reply"] for entry in corpus]
+    old_us = per_call_us(legacy_sanitize, texts, args.repeat)
+    new_us = per_call_us(app.sanitize_response_for_tts, texts, args.repeat)
+    print(f"corpus     ({sum(map(len, texts)) // len(texts)} chars avg): "
+          f"7 regex {old_us:6.1f} us  single pass {new_us:6.1f} us")
+    old_us = per_call_us(legacy_sanitize, [long_reply], max(args.repeat // 20, 1))
+    new_us = per_call_us(app.sanitize_response_for_tts, [long_reply], max(args.repeat // 20, 1))
+    print(f"long reply ({len(long_reply)} chars, cut at 200 words): "
+          f"7 regex {old_us:6.1f} us  single pass {new_us:6.1f} us")
+    return 1 if failures or streaming_failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=CORPUS, help="JSON lines with a 'reply' field")
+    parser.add_argument("--chunkings", type=int, default=50, help="random chunkings per reply")
+    parser.add_argument("--repeat", type=int, default=1000)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Scheduled EXTROVERT prompt benchmark: live quests vs. replies computed ahead
+
+Registers --schedules prompts that are all due at once ("* * * * *" with a
+two-minute lead, so every one should run immediately) and watches the fake
+bike4mind: how many quests ran at the same time and how far apart they
+started (EXTROVERT_SCHEDULE_STAGGER_SEC is --stagger). Then triggers each
+prompt the way an automation would, in three rounds:
+
+  live       prompts that have no schedule: queued and answered by a quest
+  scheduled  the registered prompts: spoken from the reply computed ahead
+  stale      the same prompts after their replies were aged past
+             max_age_sec: fall back to a live quest
+
+Reported per round: time from the trigger to the TTS call reaching Home
+Assistant (p50 / max) and quests bike4mind ran for the round.
+
+    python bench/bench_schedule.py --schedules 8 --latency 2
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from fake_ha import FakeHA  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+REPLY = "Good morning. It is eight degrees and dry, and the bins go out tonight."
+
+
+def max_overlap(intervals: list) -> int:
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    running = peak = 0
+    for _, step in events:
+        running += step
+        peak = max(peak, running)
+    return peak
+
+
+async def trigger_round(client: httpx.AsyncClient, base: str, ha: FakeHA, fake: FakeB4M, prompts: list,
+                        label: str) -> dict:
+    quests_before = set(fake.quests)
+    waits = []
+    outcomes = []
+    for i, prompt in enumerate(prompts):
+        ha.calls.clear()
+        started = time.monotonic()
+        response = await client.post(f"{base}/v1/extrovert/trigger", json={
+            "prompt": prompt, "tts_config": {"media_player": f"media_player.{label}_{i}"}})
+        response.raise_for_status()
+        outcomes.append(response.json().get("precomputed", False))
+        while not any(call["domain"] == "tts" for call in ha.calls):
+            await asyncio.sleep(0.005)
+        waits.append(next(call for call in ha.calls if call["domain"] == "tts")["received"] - started)
+    # Scheduled runs for the next minute may start meanwhile; only count quests for the triggers
+    live = [q for quest_id, q in fake.quests.items() if quest_id not in quests_before and any(prompt in q.message for prompt in prompts)]
+    return {"wait": summarize(waits), "quests": len(live), "precomputed": sum(outcomes)}
+
+
+async def main(args):
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.2, reply=REPLY, seed=25)
+    ha = FakeHA(entities=10, service_latency=0.02, speech_words_per_sec=50)
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api", LOG_LEVEL="warning", EXTROVERT_ENABLED="true",
+                   EXTROVERT_HA_URL=f"http://127.0.0.1:{args.ha_port}/api", EXTROVERT_RATE_LIMIT="1000",
+                   EXTROVERT_CONCURRENCY="4", EXTROVERT_SCHEDULE_STAGGER_SEC=str(args.stagger),
+                   HA_PLAYBACK_EVENTS="false", QUEST_COMPLETION_MODE="longpoll")
+    ha_server = await serve(ha.app, args.ha_port)
+    fake_server = await serve(fake.app, args.fake_port)
+    shim_server = await serve(app.app, args.port)
+    base = f"http://127.0.0.1:{args.port}"
+    scheduled = [f"Morning briefing for room {i}" for i in range(args.schedules)]
+    unscheduled = [f"Evening briefing for room {i}" for i in range(args.schedules)]
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        registered = time.monotonic()
+        for i, prompt in enumerate(scheduled):
+            response = await client.put(f"{base}/v1/extrovert/schedules/room-{i}", json={
+                "prompt": prompt, "cron": "* * * * *", "lead_sec": 120, "max_age_sec": 600})
+            response.raise_for_status()
+        while any(not s["response"] for s in (await client.get(f"{base}/v1/extrovert/schedules")).json()["schedules"]):
+            await asyncio.sleep(0.05)
+        ready = time.monotonic() - registered
+        runs = sorted((q.created, q.done_at) for q in fake.quests.values())[:args.schedules]
+        starts = [start for start, _ in runs]
+        spacing = [b - a for a, b in zip(starts, starts[1:])]
+
+        # Each round speaks on its own media players, so no announcement waits for the previous round's
+        results = {"live": await trigger_round(client, base, ha, fake, unscheduled, "live")}
+        results["scheduled"] = await trigger_round(client, base, ha, fake, scheduled, "scheduled")
+        await app.extrovert_scheduler.stop()  # No refresh for the next minute may bring them back meanwhile
+        for entry in app.extrovert_scheduler.entries.values():
+            entry.computed_at -= entry.max_age_sec + 1
+        results["stale"] = await trigger_round(client, base, ha, fake, scheduled, "stale")
+
+    await shutdown(shim_server)
+    await shutdown(fake_server)
+    await shutdown(ha_server)
+
+    print(f"{args.schedules} schedules due at once, {args.latency:g}s mean quest latency, stagger {args.stagger:g}s")
+    print(f"ahead-of-time runs: {len(runs)} quests, at most {max_overlap(runs)} at once, "
+          f"start spacing min {min(spacing or [0]):.2f}s, all ready after {ready:.1f}s")
+    print(f"{'round':<10} {'first audio p50':>15} {'max':>7} {'quests':>6} {'precomputed':>11}")
+    for label, r in results.items():
+        print(f"{label:<10} {r['wait']['p50'] * 1000:>13.0f}ms {r['wait']['max'] * 1000:>5.0f}ms "
+              f"{r['quests']:>6} {r['precomputed']:>11}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--schedules", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=2.0, help="mean quest latency")
+    parser.add_argument("--stagger", type=float, default=0.5, help="EXTROVERT_SCHEDULE_STAGGER_SEC")
+    parser.add_argument("--port", type=int, default=8992)
+    parser.add_argument("--fake-port", type=int, default=8990)
+    parser.add_argument("--ha-port", type=int, default=8991)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark: per-chunk dicts vs. pre-encoded templates
+
+Renders a token-level stream (--chunks deltas of a few characters, like a
+streamed reply) and --bodies non-streaming chat.completion bodies of a long
+reply, with:
+
+  dict+json     the 1.4.20 code: a nested dict per chunk through json.dumps,
+                JSONResponse for whole completions
+  templates     CompletionRenderer with the stdlib encoder
+  orjson        CompletionRenderer with orjson (when installed)
+
+Reported: chunks/sec, bodies/sec, and the peak memory allocated while
+rendering one chunk (tracemalloc; what each chunk allocates besides the
+bytes it returns).
+
+    python bench/bench_serialization.py --chunks 200000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import REPLY_SENTENCES  # noqa: E402
+from harness import load_app  # noqa: E402
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+
+def legacy_chunk(completion_id: str, delta: dict, finish_reason=None) -> str:
+    """completion_chunk as of 1.4.20"""
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "bike4mind",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def legacy_body(completion_id: str, content: str) -> bytes:
+    """The 1.4.20 non-streaming response"""
+    response = {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "bike4mind",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+    return JSONResponse(response).body
+
+
+def token_deltas(count: int) -> list:
+    """Reply text cut into token-sized deltas (a word with its leading space)"""
+    words = " ".join(REPLY_SENTENCES).replace("degrees", "°C").split(" ")
+    return [(" " if i else "") + words[i % len(words)] for i in range(count)]
+
+
+def alloc_peak(render_chunk, deltas: list) -> float:
+    """Mean peak bytes allocated while rendering one chunk, excluding the result"""
+    tracemalloc.start()
+    total = 0
+    for delta in deltas:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        chunk = render_chunk(delta)
+        total += tracemalloc.get_traced_memory()[1] - base - sys.getsizeof(chunk)
+    tracemalloc.stop()
+    return total / len(deltas)
+
+
+def run(render_chunk, render_body, deltas: list, reply: str, bodies: int) -> dict:
+    started = time.perf_counter()
+    for delta in deltas:
+        render_chunk(delta)
+    chunk_sec = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(bodies):
+        render_body(reply)
+    body_sec = time.perf_counter() - started
+    return {
+        "chunks_per_sec": len(deltas) / chunk_sec,
+        "bodies_per_sec": bodies / body_sec,
+        "alloc_per_chunk": alloc_peak(render_chunk, deltas[:2000]),
+        "chunk_bytes": sum(len(render_chunk(d)) for d in deltas[:2000]) / 2000,
+    }
+
+
+def main(args):
+    app = load_app("http://127.0.0.1:9/api", LOG_LEVEL="warning")
+    deltas = token_deltas(args.chunks)
+    reply = "".join(deltas[:args.reply_tokens])
+    completion_id = "chatcmpl-0123456789ab"
+    orjson = app.orjson
+
+    results = {"dict+json": run(lambda d: legacy_chunk(completion_id, {"content": d}),
+                                lambda text: legacy_body(completion_id, text), deltas, reply, args.bodies)}
+    app.orjson = None
+    render = app.CompletionRenderer(completion_id)
+    results["templates"] = run(render.content_chunk, render.completion, deltas, reply, args.bodies)
+    if orjson is not None:
+        app.orjson = orjson
+        results["orjson"] = run(render.content_chunk, render.completion, deltas, reply, args.bodies)
+
+    print(f"{args.chunks} token deltas, {args.bodies} bodies of {len(reply)} chars")
+    print(f"{'mode':<10} {'chunks/s':>10} {'bodies/s':>9} {'alloc B/chunk':>13} {'B/chunk':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['chunks_per_sec']:>10,.0f} {r['bodies_per_sec']:>9,.0f} "
+              f"{r['alloc_per_chunk']:>13.0f} {r['chunk_bytes']:>8.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--bodies", type=int, default=20000)
+    parser.add_argument("--reply-tokens", type=int, default=400, help="length of the non-streaming reply")
+    main(parser.parse_args())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+bike4mind session pool benchmark: one shared session vs. a session per user
+
+Runs --users scripted conversations at the same time (one per room), each
+--turns long, against the fake bike4mind with prompt-size dependent latency
+and a slow session create (--create-delay). Every prompt names its room, so
+the fake's recorded prompts show whose turns each quest saw. Compared with
+HA_B4M_SESSION_ID for everyone and with SESSION_POOL_SIZE=--pool-size, for
+context_mode fixed and budget:
+
+  latency      request p50 / p95
+  prompt tok   prompt tokens per quest (message plus bike4mind session history)
+  cross-talk   quests whose history included another room's turns
+  follow-ups   follow-ups that had the room's previous turn in the prompt
+  fallbacks    shim sessions that found the pool empty and used the shared session
+
+MAX_TURNS is --max-turns, so sessions are rotated during the run (a reset
+session starts without the old history; with the defaults no follow-up is
+the first turn of a session).
+
+    python bench/bench_session_pool.py --users 8 --turns 8
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+ROOMS = ["kitchen", "garage", "porch", "attic", "cellar", "studio", "lounge", "nursery", "office", "bathroom",
+         "hallway", "library"]
+SCRIPT = [
+    ("Turn on the {room} light", False),
+    ("What is the temperature in the {room} right now?", False),
+    ("And what about the humidity in the {room}?", True),
+    ("Set the {room} blinds to 40 percent", False),
+    ("Switch off the {room} fan", False),
+    ("Why is the {room} colder than that?", True),
+]
+
+
+async def conversation(client: httpx.AsyncClient, url: str, room: str, turns: int, latencies: list):
+    messages = [{"role": "system", "content": "You are a voice assistant for Home Assistant."}]
+    for i in range(turns):
+        prompt = SCRIPT[i % len(SCRIPT)][0].format(room=room)
+        messages.append({"role": "user", "content": prompt})
+        started = time.monotonic()
+        response = await client.post(url, json={"messages": messages, "user": f"satellite-{room}"})
+        response.raise_for_status()
+        latencies.append(time.monotonic() - started)
+        messages.append({"role": "assistant", "content": response.json()["choices"][0]["message"]["content"] or ""})
+
+
+def analyze(prompts: list, rooms: list) -> dict:
+    room_pattern = re.compile("|".join(rooms))
+    cross_talk = 0
+    followups = followups_with_context = 0
+    previous = {}
+    for p in prompts:
+        room = room_pattern.search(p["message"]).group(0)
+        history = p["prompt"][:len(p["prompt"]) - len(p["message"])]
+        cross_talk += any(other in history for other in rooms if other != room)
+        text = p["message"].split("] ", 1)[-1]
+        if any(text == line.format(room=room) and followup for line, followup in SCRIPT):
+            followups += 1
+            followups_with_context += previous.get(room, "") in history
+        previous[room] = p["message"]
+    return {"cross_talk": f"{cross_talk}/{len(prompts)}", "followups": f"{followups_with_context}/{followups}"}
+
+
+async def run(args, pool_size: int, context_mode: str) -> dict:
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.1, reply="Done. " * 60,
+                   prefill_per_1k=args.prefill_per_1k, session_create_delay=args.create_delay, seed=21)
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api", SESSION_POOL_SIZE=str(pool_size),
+                   CONTEXT_MODE=context_mode, MAX_TURNS=str(args.max_turns), QUEST_COMPLETION_MODE="longpoll",
+                   LOG_LEVEL="warning")
+    fake_server = await serve(fake.app, args.fake_port)
+    shim_server = await serve(app.app, args.port)
+    await asyncio.sleep(args.create_delay * pool_size + 0.2)  # Pre-warm, as after add-on start
+    latencies: list = []
+    rooms = ROOMS[:args.users]
+    async with httpx.AsyncClient(timeout=120) as client:
+        url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+        await asyncio.gather(*(conversation(client, url, room, args.turns, latencies) for room in rooms))
+        sessions = (await client.get(f"http://127.0.0.1:{args.port}/admin/sessions")).json()
+    await shutdown(shim_server)
+    await shutdown(fake_server)
+    pool = sessions.get("upstream_pool", {})
+    return {
+        "latency": summarize(latencies),
+        "prompt_tokens": sum(p["prompt_tokens"] for p in fake.prompts) / len(fake.prompts),
+        **analyze(fake.prompts, rooms),
+        "fallbacks": pool.get("fallbacks", "-"),
+        "sessions_created": fake.requests["session_create"],
+        "sessions_deleted": fake.requests["session_delete"],
+    }
+
+
+async def main(args):
+    results = {}
+    for context_mode in ("fixed", "budget"):
+        for pool_size in (0, args.pool_size):
+            label = f"{context_mode}/{'pool' if pool_size else 'shared'}"
+            results[label] = await run(args, pool_size, context_mode)
+
+    print(f"{args.users} rooms x {args.turns} turns at once, max_turns {args.max_turns}, pool size {args.pool_size}, "
+          f"{args.create_delay:g}s per session create")
+    print(f"{'mode':<14} {'p50':>6} {'p95':>6} {'prompt tok':>10} {'cross-talk':>11} {'follow-ups':>10} "
+          f"{'fallbacks':>9} {'created/deleted':>15}")
+    for label, r in results.items():
+        print(f"{label:<14} {r['latency']['p50']:>5.2f}s {r['latency']['p95']:>5.2f}s {r['prompt_tokens']:>10.0f} "
+              f"{r['cross_talk']:>11} {r['followups']:>10} {r['fallbacks']:>9} "
+              f"{r['sessions_created']:>7}/{r['sessions_deleted']:<7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=8, help=f"rooms talking at once (up to {len(ROOMS)})")
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--max-turns", type=int, default=4, help="MAX_TURNS; shim sessions reset after this")
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--create-delay", type=float, default=0.5, help="seconds per bike4mind session create")
+    parser.add_argument("--latency", type=float, default=0.3, help="mean quest latency before prompt costs")
+    parser.add_argument("--prefill-per-1k", type=float, default=0.4, help="seconds per 1000 prompt tokens")
+    parser.add_argument("--port", type=int, default=8931)
+    parser.add_argument("--fake-port", type=int, default=8930)
+    asyncio.run(main(parser.parse_args()))
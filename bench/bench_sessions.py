@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Session store memory benchmark
+
+Feeds millions of distinct `user` values through get_or_create_shim_session
+and samples traced memory along the way. The bounded SessionStore should stay
+flat once max_entries is reached; the pre-1.4.5 unbounded dict is run on a
+smaller prefix for comparison.
+
+    python bench/bench_sessions.py --users 2000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import load_app  # noqa: E402
+
+
+def legacy_get_or_create(sessions, user_id):
+    """The original shim_sessions dict behaviour (never pruned)"""
+    if user_id not in sessions:
+        sessions[user_id] = {"created": datetime.now(), "last_access": datetime.now(), "turn_count": 0}
+    else:
+        sessions[user_id]["last_access"] = datetime.now()
+    return sessions[user_id]
+
+
+def run(label, users, samples, step):
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    points = []
+    started = time.perf_counter()
+    for i in range(1, users + 1):
+        step(f"user-{i}")
+        if i % samples == 0:
+            points.append((i, (tracemalloc.get_traced_memory()[0] - baseline) / 1e6))
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+    print(f"{label}: {users / elapsed:,.0f} sessions/sec")
+    for count, mb in points:
+        print(f"   {count:>10,} users  {mb:8.1f} MB")
+    return {"ops_per_sec": users / elapsed, "memory_mb": points}
+
+
+def main(args):
+    app = load_app("http://127.0.0.1:1/api", SESSION_MAX_ENTRIES=str(args.max_entries))
+    store = app.shim_sessions
+    results = {
+        "bounded": run(f"SessionStore (max_entries={args.max_entries})", args.users, args.users // 10,
+                       lambda user: app.get_or_create_shim_session(user)),
+    }
+    store.sweep()
+    print(f"   store stats: {store.stats()}")
+    legacy = {}
+    results["legacy"] = run("unbounded dict", args.legacy_users, args.legacy_users // 5,
+                            lambda user: legacy_get_or_create(legacy, user))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=2_000_000)
+    parser.add_argument("--legacy-users", type=int, default=500_000)
+    parser.add_argument("--max-entries", type=int, default=10_000)
+    parser.add_argument("--json", help="write results to this file")
+    main(parser.parse_args())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Streaming benchmark: time to first content delta vs. full reply
+
+Drives /v1/chat/completions with stream=true against the fake bike4mind
+server (partial replies enabled), once with stream_partial_replies off (one
+chunk after the quest is done) and once with it on (token-level deltas).
+
+    python bench/bench_streaming.py --requests 20 --latency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+
+async def one_request(client: httpx.AsyncClient, url: str):
+    body = {"messages": [{"role": "user", "content": "what's the temperature"}], "stream": True}
+    started = time.monotonic()
+    first = None
+    chunks = 0
+    async with client.stream("POST", url, json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            delta = json.loads(line[6:])["choices"][0]["delta"]
+            if delta.get("content"):
+                chunks += 1
+                if first is None:
+                    first = time.monotonic() - started
+    return first, time.monotonic() - started, chunks
+
+
+async def main(args):
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=args.sigma, partial=True, seed=2)
+    app = load_app(f"http://127.0.0.1:{args.fake_port}/api")
+    fake_server = await serve(fake.app, args.fake_port)
+    shim_server = await serve(app.app, args.port)
+    url = f"http://127.0.0.1:{args.port}/v1/chat/completions"
+
+    results = {}
+    async with httpx.AsyncClient(timeout=120) as client:
+        for partial in (False, True):
+            app.STREAM_PARTIAL_REPLIES = partial
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def limited():
+                async with semaphore:
+                    return await one_request(client, url)
+
+            samples = await asyncio.gather(*(limited() for _ in range(args.requests)))
+            name = "partial" if partial else "single-chunk"
+            results[name] = {
+                "time_to_first_delta": summarize([s[0] for s in samples]),
+                "total": summarize([s[1] for s in samples]),
+                "content_chunks_per_reply": sum(s[2] for s in samples) / len(samples),
+            }
+            r = results[name]
+            print(f"{name:>12}: first delta p50 {r['time_to_first_delta']['p50']:.2f}s "
+                  f"p95 {r['time_to_first_delta']['p95']:.2f}s | total p50 {r['total']['p50']:.2f}s | "
+                  f"{r['content_chunks_per_reply']:.1f} chunks/reply")
+
+    await shutdown(shim_server)
+    await shutdown(fake_server)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--fake-port", type=int, default=8910)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=4.0, help="mean quest latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.25)
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
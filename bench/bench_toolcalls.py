@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tool-call extraction benchmark: bracket-matching scanner vs. the fenced-JSON regex
+
+1. Fuzz: random replies mixing prose, decoy brackets (links, braces around
+   words, citations, malformed JSON) and planted actions (fenced, bare,
+   arrays, nested "data", braces and escapes inside strings). The scanner
+   must return exactly the planted actions, fed whole or in random chunks.
+2. Scaling: extraction time for 100KB+ replies, whole and streamed in
+   50-char deltas (the old scanner re-searched the growing buffer on every
+   delta), for ordinary replies and for replies with an unclosed ```json
+   block near the start and no fences after it.
+
+    python bench/bench_toolcalls.py --replies 500 --sizes 100 200 400 800
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import load_app  # noqa: E402
+
+LEGACY_BLOCK = re.compile(r'```json\s*(\{.*?\})\s*```', re.DOTALL)
+PROSE = ["The kitchen light is on.", "It is 21 degrees inside.", "Sure, I can help with that!",
+         "Here is the action:", "Let me know if you need anything else.", "Done.",
+         "The forecast says rain after 4 PM.", "Your next meeting is at 9:30."]
+DECOYS = ["See [the docs](https://example.com/docs).", "The scene is called {evening relax}.",
+          "as shown in [1] and [2]", "Use {curly} or [square] brackets.", "a {set} of [all] rest",
+          '```json\n{"note": "no action here"}\n```', "score: {1, 2}", "`{not: json}`"]
+
+
+class LegacyScanner:
+    """ToolCallScanner as of 1.4.15: fenced ```json {...}``` only, fed the whole growing buffer"""
+
+    def __init__(self, app):
+        self.app = app
+        self.pos = 0
+
+    def feed(self, buffer: str):
+        tool_calls = []
+        for match in LEGACY_BLOCK.finditer(buffer, self.pos):
+            self.pos = match.end()
+            try:
+                tool_call = self.app.tool_call_from_action(json.loads(match.group(1)))
+            except json.JSONDecodeError:
+                continue
+            if tool_call:
+                tool_calls.append(tool_call)
+        return tool_calls
+
+
+def random_action(rng: random.Random) -> dict:
+    action = {"action": "call_service", "domain": rng.choice(["light", "switch", "cover"]),
+              "service": rng.choice(["turn_on", "turn_off", "toggle"]),
+              "entity_id": f"{rng.choice(['light', 'switch'])}.room_{rng.randint(1, 99)}"}
+    if rng.random() < 0.5:
+        action["data"] = {"brightness": rng.randint(1, 255), "note": rng.choice(["a {brace}", 'say "hi"', "x\\y", "}]"]),
+                          "flash": rng.choice([True, False, None]), "transition": 1.5e-1}
+    return action
+
+
+def planted_block(rng: random.Random) -> tuple:
+    """Text of one block and the actions it holds"""
+    kind = rng.choice(["fenced", "bare", "array", "compact"])
+    actions = [random_action(rng) for _ in range(rng.randint(2, 3) if kind == "array" else 1)]
+    value = actions if kind == "array" else actions[0]
+    text = json.dumps(value, separators=(",", ":")) if kind == "compact" else json.dumps(value, indent=2)
+    if kind in ("fenced", "array"):
+        text = f"```json\n{text}\n```"
+    return text, actions
+
+
+def random_reply(rng: random.Random, target_chars: int) -> tuple:
+    parts, actions = [], []
+    size = 0
+    while size < target_chars:
+        roll = rng.random()
+        if roll < 0.15:
+            text, planted = planted_block(rng)
+            actions.extend(planted)
+        elif roll < 0.3:
+            text = rng.choice(DECOYS)
+        else:
+            text = rng.choice(PROSE)
+        parts.append(text)
+        size += len(text) + 1
+    return rng.choice(["\n\n", " ", "\n"]).join(parts), actions
+
+
+def as_actions(tool_calls) -> list:
+    actions = []
+    for tool_call in tool_calls or []:
+        arguments = json.loads(tool_call["function"]["arguments"])
+        actions.append({"action": "call_service", "domain": arguments["domain"], "service": arguments["service"],
+                        "entity_id": arguments["entity_id"], **({"data": arguments["data"]} if arguments["data"] else {})})
+    return actions
+
+
+def chunks(text: str, rng: random.Random, low: int = 1, high: int = 40):
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(low, high)
+        yield text[pos:pos + size]
+        pos += size
+
+
+def timed(function) -> float:
+    started = time.perf_counter()
+    function()
+    return time.perf_counter() - started
+
+
+def main(args) -> int:
+    app = load_app("http://127.0.0.1:1/api", LOG_LEVEL="error")
+    rng = random.Random(args.seed)
+
+    failures = 0
+    for i in range(args.replies):
+        reply, planted = random_reply(rng, rng.randint(50, 3000))
+        whole = as_actions(app.extract_tool_calls(reply))
+        scanner = app.ToolCallScanner()
+        streamed = as_actions([c for chunk in chunks(reply, rng) for c in scanner.feed(chunk)])
+        if whole != planted or streamed != planted:
+            failures += 1
+            if failures <= 3:
+                print(f"MISMATCH reply {i}: planted {len(planted)}, whole {len(whole)}, streamed {len(streamed)}")
+    print(f"fuzz: {args.replies - failures}/{args.replies} replies returned exactly the planted actions")
+
+    print(f"\n{'reply':>16} {'regex':>10} {'scanner':>10} {'regex stream':>13} {'scanner stream':>15}")
+    for kb in args.sizes:
+        for unclosed in (False, True):
+            reply, _ = random_reply(random.Random(kb), kb * 1024)
+            if unclosed:
+                # A block cut off by the upstream, followed by replies without fences
+                reply = 'Working on it:\n```json\n{"action": "call_service", "domain": "light",\n' + reply.replace("```", "")
+            deltas = [reply[i:i + 50] for i in range(0, len(reply), 50)]
+
+            def legacy_stream():
+                scanner, buffer = LegacyScanner(app), ""
+                for delta in deltas:
+                    buffer += delta
+                    scanner.feed(buffer)
+
+            def stream():
+                scanner = app.ToolCallScanner()
+                for delta in deltas:
+                    scanner.feed(delta)
+
+            label = f"{kb}KB{' unclosed' if unclosed else ''}"
+            print(f"{label:>16} {timed(lambda: LegacyScanner(app).feed(reply)) * 1000:8.1f}ms "
+                  f"{timed(lambda: app.extract_tool_calls(reply)) * 1000:8.1f}ms "
+                  f"{timed(legacy_stream) * 1000:11.1f}ms {timed(stream) * 1000:13.1f}ms")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--replies", type=int, default=500, help="fuzzed replies")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 200, 400, 800], help="reply sizes in KB")
+    parser.add_argument("--seed", type=int, default=17)
+    sys.exit(main(parser.parse_args()))
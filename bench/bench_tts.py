@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+TTS benchmark: time until a long EXTROVERT announcement starts playing
+
+Sends EXTROVERT prompts whose reply is a long announcement and measures, from
+the fake Home Assistant's point of view, when audio starts on the media
+player and when the last sentence finishes (estimated at 2.5 words/s):
+
+  single     one TTS call with the whole reply after the quest is done
+  pipelined  sentence by sentence; sentence N+1 rendered while N plays
+  streamed   pipelined, fed from partial replies while the quest still runs
+
+The fake HA renders speech at --tts-per-word seconds per word, like Piper.
+
+    python bench/bench_tts.py --requests 5 --latency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from fake_ha import FakeHA  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+ANNOUNCEMENT = " ".join([
+    "Good morning, here is your briefing for today.",
+    "The outside temperature is eleven degrees and it will reach nineteen by the afternoon.",
+    "There is a forty percent chance of rain after four, so take an umbrella if you go out later.",
+    "Your first meeting starts at nine thirty and the dentist appointment is at two.",
+    "The dishwasher finished overnight and can be emptied.",
+    "The garage door was left open for twenty minutes yesterday evening before it closed automatically.",
+    "Solar production was twelve kilowatt hours, about average for this time of year.",
+    "The living room plants were watered at seven.",
+    "A package from the hardware store is expected before noon.",
+    "The guest room window sensor reports low battery and should be replaced this week.",
+    "Traffic to the office is light, the drive should take about twenty five minutes.",
+    "Have a great day.",
+])
+MODES = {"single": (False, False), "pipelined": (True, False), "streamed": (True, True)}
+
+
+def words_duration(text: str) -> float:
+    return len(text.split()) / 2.5
+
+
+async def main(args):
+    ha = FakeHA(entities=10, service_latency=0.02, tts_seconds_per_word=args.tts_per_word)
+    ha_server = await serve(ha.app, args.ha_port)
+    results = {}
+
+    for mode in args.modes:
+        pipeline, partial = MODES[mode]
+        fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.1, partial=partial, reply=ANNOUNCEMENT, seed=4)
+        fake_server = await serve(fake.app, args.fake_port)
+        app = load_app(f"http://127.0.0.1:{args.fake_port}/api", LOG_LEVEL="warning", EXTROVERT_ENABLED="true",
+                       EXTROVERT_HA_URL=f"http://127.0.0.1:{args.ha_port}/api", EXTROVERT_RATE_LIMIT="1000",
+                       EXTROVERT_CONCURRENCY="5", EXTROVERT_QUEUE_SIZE="100",
+                       EXTROVERT_TTS_PIPELINE="true" if pipeline else "false",
+                       HA_PLAYBACK_EVENTS="false")  # The fake players don't report playback here
+        shim_server = await serve(app.app, args.port)
+
+        first_audio, speech_end = [], []
+
+        async def one(client: httpx.AsyncClient, i: int):
+            player = f"media_player.bench_{mode}_{i}"
+            started = time.monotonic()
+            response = await client.post(f"http://127.0.0.1:{args.port}/v1/extrovert/trigger", json={
+                "prompt": f"morning briefing {i}", "wait": True, "tts_config": {"media_player": player}})
+            response.raise_for_status()
+            # Audio starts when a play call returns (a TTS service call renders first, then plays)
+            plays = sorted((c for c in ha.calls if c["domain"] in ("tts", "media_player") and player in (
+                c["data"].get("entity_id"), c["data"].get("media_player_entity_id"))), key=lambda c: c["finished"])
+            last = plays[-1]["data"]
+            last_text = last.get("message") or ha.rendered.get(last.get("media_content_id"), "")
+            first_audio.append(plays[0]["finished"] - started)
+            speech_end.append(plays[-1]["finished"] + words_duration(last_text) - started)
+
+        # One media player per request, so requests don't queue behind each other's playback
+        async with httpx.AsyncClient(timeout=300) as client:
+            await asyncio.gather(*(one(client, i) for i in range(args.requests)))
+
+        results[mode] = {"first_audio_s": summarize(first_audio), "speech_end_s": summarize(speech_end)}
+        print(f"{mode:>10}: first audio p50 {results[mode]['first_audio_s']['p50']:.2f}s  "
+              f"p95 {results[mode]['first_audio_s']['p95']:.2f}s | speech ends p50 "
+              f"{results[mode]['speech_end_s']['p50']:.2f}s")
+        await shutdown(shim_server)
+        await shutdown(fake_server)
+
+    await shutdown(ha_server)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8972)
+    parser.add_argument("--fake-port", type=int, default=8970)
+    parser.add_argument("--ha-port", type=int, default=8971)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=4.0, help="mean quest latency in seconds")
+    parser.add_argument("--tts-per-word", type=float, default=0.03, help="fake TTS render time per word")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+VISUAL_ASSIST page benchmark: remote cache-busted GIFs vs. cached local assets
+
+Serves three --gif-kb GIFs from a fake origin limited to --mbps (a wall
+tablet on slow Wi-Fi), then simulates --tablets tablets that each load
+/visual, go through --cycles thinking -> speaking -> idle rounds and reload
+the page --reloads times. The tablets keep a browser-like HTTP cache
+(immutable responses reused, others revalidated with If-None-Match).
+
+  1.4.21     the page as before: sent in full on every load, the GIFs
+             loaded from the origin with ?t= on every state change
+  cached     the shipped page: pre-rendered with ETag and gzip/brotli, the
+             GIFs proxied from /visual/assets and preloaded
+
+Reported per mode: bytes and requests per tablet, time a state change
+waits for its GIF (p50 / max), page bytes on a reload, and requests the
+origin served.
+
+    python bench/bench_visual.py --tablets 5 --cycles 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI, Request, Response
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+STATES = ("thinking", "speaking", "idle")
+
+
+class FakeOrigin:
+    """Serves fixed GIF bodies at --mbps"""
+
+    def __init__(self, size_kb: int, mbps: float):
+        self.bodies = {state: b"GIF89a" + os.urandom(size_kb * 1024 - 6) for state in STATES}
+        self.bytes_per_sec = mbps * 1e6 / 8
+        self.requests = 0
+        self.app = FastAPI()
+
+        @self.app.get("/{state}.gif")
+        async def gif(state: str, request: Request):
+            self.requests += 1
+            if request.headers.get("if-none-match") == f'"{state}-1"':
+                return Response(status_code=304)
+            body = self.bodies[state]
+            await asyncio.sleep(len(body) / self.bytes_per_sec)
+            return Response(body, media_type="image/gif", headers={"ETag": f'"{state}-1"'})
+
+
+class Tablet:
+    """An HTTP client with a browser-like cache"""
+
+    def __init__(self, client: httpx.AsyncClient, base: str):
+        self.client = client
+        self.base = base
+        self.entries = {}
+        self.bytes = 0
+        self.requests = 0
+
+    async def get(self, url: str) -> bytes:
+        url = url if url.startswith("http") else self.base + url
+        entry = self.entries.get(url)
+        if entry and entry["immutable"]:
+            return entry["body"]
+        headers = {"Accept-Encoding": "br, gzip"}
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        response = await self.client.get(url, headers=headers)
+        self.requests += 1 + len(response.history)
+        self.bytes += response.num_bytes_downloaded + sum(r.num_bytes_downloaded for r in response.history)
+        if response.status_code == 304:
+            return entry["body"]
+        response.raise_for_status()
+        cache_control = response.headers.get("cache-control", "")
+        if "no-store" not in cache_control and "?t=" not in url:
+            self.entries[url] = {"body": response.content, "etag": response.headers.get("etag"),
+                                 "immutable": "immutable" in cache_control}
+        return response.content
+
+
+async def legacy_tablet(tablet: Tablet, origin_urls: dict, args, waits: list, page_bytes: list):
+    """Page and GIF traffic of the page as of 1.4.21"""
+    for _ in range(args.reloads + 1):
+        # Always sent in full: no ETag, no compression
+        page = await tablet.client.get(f"{tablet.base}/visual", headers={"Accept-Encoding": "identity"})
+        tablet.requests += 1
+        tablet.bytes += page.num_bytes_downloaded
+        page_bytes.append(page.num_bytes_downloaded)
+        await tablet.get(origin_urls["idle"])
+        for _ in range(args.cycles):
+            for state in STATES:
+                started = time.monotonic()
+                await tablet.get(f"{origin_urls[state]}?t={int(time.time() * 1000)}")
+                waits.append(time.monotonic() - started)
+
+
+async def cached_tablet(tablet: Tablet, origin_urls: dict, args, waits: list, page_bytes: list):
+    """Page and GIF traffic of the shipped page"""
+    for _ in range(args.reloads + 1):
+        before = tablet.bytes
+        html = (await tablet.get("/visual")).decode()
+        page_bytes.append(tablet.bytes - before)
+        urls = json.loads(re.search(r"const GIF_URLS = (\{.*?\});", html).group(1))
+        await asyncio.gather(*(tablet.get(url) for url in urls.values()))  # Preloaded by the page
+        for _ in range(args.cycles):
+            for state in STATES:
+                started = time.monotonic()
+                await tablet.get(urls[state])  # Only shows the preloaded image
+                waits.append(time.monotonic() - started)
+
+
+async def run(mode: str, args) -> dict:
+    origin = FakeOrigin(args.gif_kb, args.mbps)
+    origin_urls = {state: f"http://127.0.0.1:{args.origin_port}/{state}.gif" for state in STATES}
+    with tempfile.TemporaryDirectory() as asset_dir:
+        app = load_app("http://127.0.0.1:9/api", VISUAL_ASSIST_ENABLED="true", LOG_LEVEL="warning",
+                       VISUAL_ASSIST_ASSET_DIR=asset_dir,
+                       **{f"VISUAL_ASSIST_{state.upper()}_GIF_URL": url for state, url in origin_urls.items()})
+        origin_server = await serve(origin.app, args.origin_port)
+        shim_server = await serve(app.app, args.port)
+        base = f"http://127.0.0.1:{args.port}"
+        async with httpx.AsyncClient(timeout=120, follow_redirects=True) as client:
+            while mode == "cached" and len(app.visual_assets.assets) < len(STATES):
+                await asyncio.sleep(0.05)  # The add-on fetches the GIFs once at startup
+            origin.requests = 0
+            waits: list = []
+            page_bytes: list = []
+            tablets = [Tablet(client, base) for _ in range(args.tablets)]
+            play = legacy_tablet if mode == "1.4.21" else cached_tablet
+            await asyncio.gather(*(play(tablet, origin_urls, args, waits, page_bytes) for tablet in tablets))
+        await shutdown(shim_server)
+        await shutdown(origin_server)
+    return {
+        "bytes": sum(t.bytes for t in tablets) / len(tablets),
+        "requests": sum(t.requests for t in tablets) / len(tablets),
+        "wait": summarize(waits),
+        "reload_page_bytes": sum(page_bytes[len(tablets):]) / max(len(page_bytes) - len(tablets), 1),
+        "first_page_bytes": sum(page_bytes[:len(tablets)]) / len(tablets),
+        "origin_requests": origin.requests,
+    }
+
+
+async def main(args):
+    results = {mode: await run(mode, args) for mode in ("1.4.21", "cached")}
+    print(f"{args.tablets} tablets x {args.cycles} state cycles, {args.reloads} reloads, "
+          f"3 GIFs of {args.gif_kb} KB at {args.mbps:g} Mbit/s")
+    print(f"{'mode':<8} {'MB/tablet':>9} {'req/tablet':>10} {'switch p50':>10} {'switch max':>10} "
+          f"{'page body B first/reload':>25} {'origin req':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['bytes'] / 1e6:>9.2f} {r['requests']:>10.0f} {r['wait']['p50'] * 1000:>8.1f}ms "
+              f"{r['wait']['max'] * 1000:>8.1f}ms {r['first_page_bytes']:>15.0f}/{r['reload_page_bytes']:<9.0f} "
+              f"{r['origin_requests']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tablets", type=int, default=5)
+    parser.add_argument("--cycles", type=int, default=10, help="thinking/speaking/idle rounds per page load")
+    parser.add_argument("--reloads", type=int, default=2)
+    parser.add_argument("--gif-kb", type=int, default=800)
+    parser.add_argument("--mbps", type=float, default=40, help="origin bandwidth per request")
+    parser.add_argument("--port", type=int, default=8941)
+    parser.add_argument("--origin-port", type=int, default=8940)
+    asyncio.run(main(parser.parse_args()))
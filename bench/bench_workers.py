@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Multi-worker benchmark: shared state across uvicorn worker processes
+
+Runs the add-on with `--workers N` twice, once with WORKERS=N (shared state
+in SQLite, VISUAL_ASSIST pub/sub) and once with WORKERS=1 (every worker on
+its own, the behaviour before multi-worker mode), and checks what clients
+see when their connections land on different workers:
+
+  workers    distinct worker PIDs answering /admin/workers
+  ws         VISUAL_ASSIST clients that received every broadcast of a chat burst
+  sessions   shim sessions reported by each worker after chats from --users users
+  jobs       EXTROVERT job status lookups answered on a fresh connection
+  rate       EXTROVERT triggers accepted (including the jobs check) with EXTROVERT_RATE_LIMIT=10
+  chat       chat throughput with a fast fake bike4mind
+
+    python bench/bench_workers.py --workers 4
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from fake_ha import FakeHA  # noqa: E402
+from harness import serve, shutdown, spawn_app, stop_app  # noqa: E402
+
+RATE_LIMIT = 10
+
+
+async def fresh_get(url: str) -> httpx.Response:
+    """One request on its own connection, so the kernel picks a worker for it"""
+    async with httpx.AsyncClient(timeout=30) as client:
+        return await client.get(url)
+
+
+async def ws_listener(url: str, received: list, connected: asyncio.Event, stop: asyncio.Event):
+    async with websockets.connect(url) as ws:
+        await ws.recv()  # Current state on connect
+        connected.set()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(ws.recv(), timeout=0.2)
+                received.append(time.monotonic())
+            except asyncio.TimeoutError:
+                continue
+
+
+async def run(args, shared: bool, b4m_base: str, ha_base: str) -> dict:
+    state_dir = tempfile.mkdtemp(prefix="b4m-workers-")
+    env = {
+        "LOG_LEVEL": "warning",
+        "WORKERS": str(args.workers if shared else 1),
+        "SHARED_STATE_PATH": os.path.join(state_dir, "shared.db"),
+        "VISUAL_ASSIST_ENABLED": "true",
+        "EXTROVERT_ENABLED": "true",
+        "EXTROVERT_HA_URL": ha_base,
+        "EXTROVERT_RATE_LIMIT": str(RATE_LIMIT),
+        "EXTROVERT_QUEUE_SIZE": "1000",
+        # The poll budget is shared in multi-worker mode; keep it out of the chat throughput comparison
+        "QUEST_POLL_RATE": "10000",
+    }
+    process = await spawn_app(b4m_base, args.port, workers=args.workers, **env)
+    base = f"http://127.0.0.1:{args.port}"
+    row = {}
+    try:
+        # Sample until every worker has answered (accepts are spread by the kernel)
+        pids = set()
+        for _ in range(200):
+            pids.add((await fresh_get(f"{base}/admin/workers")).json()["pid"])
+            if len(pids) == args.workers:
+                break
+        row["workers"] = len(pids)
+
+        received = [[] for _ in range(args.ws_clients)]
+        stop = asyncio.Event()
+        listeners = []
+        for r in received:
+            connected = asyncio.Event()
+            listeners.append(asyncio.create_task(ws_listener(base.replace("http", "ws") + "/ws", r, connected, stop)))
+            await connected.wait()
+        body = {"messages": [{"role": "user", "content": "hi"}], "user": "bench"}
+        for i in range(args.chats):
+            async with httpx.AsyncClient(timeout=30) as client:
+                await client.post(f"{base}/v1/chat/completions", json=body)
+        await asyncio.sleep(args.idle_wait)  # Idle broadcasts follow the estimated TTS time
+        stop.set()
+        await asyncio.gather(*listeners)
+        most = max(len(r) for r in received)
+        row["ws"] = f"{sum(len(r) == most for r in received)}/{args.ws_clients} clients got all {most} broadcasts"
+
+        for user in range(args.users):
+            async with httpx.AsyncClient(timeout=30) as client:
+                await client.post(f"{base}/v1/chat/completions", json={**body, "user": f"user-{user}"})
+        counts = set()
+        for _ in range(args.workers * 4):
+            counts.add((await fresh_get(f"{base}/admin/sessions")).json()["sessions"])
+        row["sessions"] = f"workers report {sorted(counts)} sessions for {args.users + 1} users"
+
+        async with httpx.AsyncClient(timeout=30) as client:
+            response = await client.post(f"{base}/v1/extrovert/trigger", json={"prompt": "status check"})
+        if response.status_code == 202:
+            job_id = response.json()["job_id"]
+            found = [(await fresh_get(f"{base}/v1/extrovert/jobs/{job_id}")).status_code for _ in range(20)]
+            row["jobs"] = f"{found.count(200)}/20 lookups found the job"
+        else:
+            row["jobs"] = f"trigger returned {response.status_code}"
+
+        async def trigger(i: int) -> int:
+            async with httpx.AsyncClient(timeout=30) as client:
+                response = await client.post(f"{base}/v1/extrovert/trigger", json={"prompt": f"announce {i}"})
+                return response.status_code
+        codes = await asyncio.gather(*(trigger(i) for i in range(args.triggers)))
+        row["rate"] = f"{codes.count(202) + 1}/{args.triggers + 1} accepted (limit {RATE_LIMIT}/h)"
+
+        done = 0
+        deadline = time.monotonic() + args.duration
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+            async def worker():
+                nonlocal done
+                while time.monotonic() < deadline:
+                    response = await client.post(f"{base}/v1/chat/completions", json=body)
+                    done += response.status_code == 200
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        row["chat"] = f"{done / args.duration:.0f} req/s"
+    finally:
+        stop_app(process)
+    return row
+
+
+async def main(args):
+    fake = FakeB4M(latency_mean=args.b4m_latency, latency_sigma=0.1, reply="Done.", seed=18)
+    ha = FakeHA(entities=10, service_latency=0.01)
+    fake_server = await serve(fake.app, args.fake_port)
+    ha_server = await serve(ha.app, args.ha_port)
+    results = {}
+    for shared in (True, False):
+        label = f"WORKERS={args.workers if shared else 1}"
+        results[label] = await run(args, shared, f"http://127.0.0.1:{args.fake_port}/api",
+                                   f"http://127.0.0.1:{args.ha_port}/api")
+    await shutdown(ha_server)
+    await shutdown(fake_server)
+
+    print(f"uvicorn --workers {args.workers}")
+    for key in ("workers", "ws", "sessions", "jobs", "rate", "chat"):
+        print(f"{key:>9}: " + " | ".join(f"{label}: {row[key]}" for label, row in results.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--ws-clients", type=int, default=20)
+    parser.add_argument("--chats", type=int, default=5, help="chat requests whose broadcasts the ws clients count")
+    parser.add_argument("--idle-wait", type=float, default=2.0, help="seconds to wait for idle broadcasts")
+    parser.add_argument("--triggers", type=int, default=40)
+    parser.add_argument("--users", type=int, default=30)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of chat load")
+    parser.add_argument("--concurrency", type=int, default=40)
+    parser.add_argument("--b4m-latency", type=float, default=0.05, help="mean quest latency in seconds")
+    parser.add_argument("--port", type=int, default=8982)
+    parser.add_argument("--fake-port", type=int, default=8980)
+    parser.add_argument("--ha-port", type=int, default=8981)
+    asyncio.run(main(parser.parse_args()))
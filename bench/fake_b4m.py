@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the bike4mind quest API
+
+Quests finish after a latency drawn from a per-model lognormal distribution,
+or after a scripted latency per prompt when replaying a quest journal.
+Besides the plain status GET it supports long-poll (?wait=N), SSE and
+WebSocket subscriptions so every quest_completion_mode can be exercised
+offline. With prefill_per_1k / decode_per_token set, quest latency also
+grows with the prompt (message plus historyCount earlier turns of the
+session) and with the reply, which is cut to max_tokens. Sessions can be
+created and deleted for the add-on's session pool. Faults (error
+responses, slow responses, a full outage) can be injected to exercise
+retries, hedging and the circuit breaker. Run
+standalone with `python bench/fake_b4m.py --port 8900` and point B4M_BASE
+at http://127.0.0.1:8900/api.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+REPLY_SENTENCES = [
+    "Sure, here is what I found.",
+    "The kitchen is currently at twenty one degrees.",
+    "That is about normal for this time of day.",
+    "Let me know if you want me to adjust the thermostat.",
+]
+
+
+class FakeQuest:
+    def __init__(self, quest_id: str, model: str, message: str, latency: float,
+                 partial: bool = False, first_token_ratio: float = 0.3, reply: Optional[str] = None):
+        self.id = quest_id
+        self.model = model
+        self.message = message
+        self.created = time.monotonic()
+        self.done_at = self.created + latency
+        self.first_token_at = self.created + latency * first_token_ratio
+        self.partial = partial
+        self.reply = reply or " ".join(REPLY_SENTENCES)
+        self.done = asyncio.Event()
+
+    def status(self) -> str:
+        return "done" if time.monotonic() >= self.done_at else "running"
+
+    def partial_reply(self) -> str:
+        """Reply text generated so far, revealed linearly between first token and done"""
+        now = time.monotonic()
+        if not self.partial or now < self.first_token_at:
+            return ""
+        progress = (now - self.first_token_at) / max(self.done_at - self.first_token_at, 1e-6)
+        return self.reply[:int(len(self.reply) * min(progress, 1.0))]
+
+    def payload(self) -> Dict[str, Any]:
+        status = self.status()
+        data: Dict[str, Any] = {"id": self.id, "status": status}
+        if status == "done":
+            data["replies"] = [self.reply]
+        elif self.partial_reply():
+            data["replies"] = [self.partial_reply()]
+        return data
+
+
+class FakeB4M:
+    """In-process fake bike4mind server; quests and request counts are inspectable"""
+
+    def __init__(self, latency_mean: float = 3.0, latency_sigma: float = 0.35,
+                 model_latency: Optional[Dict[str, float]] = None,
+                 longpoll: bool = True, push: bool = True, partial: bool = False,
+                 error_rate: float = 0.0, error_status: int = 503,
+                 slow_rate: float = 0.0, slow_delay: float = 5.0, fault_endpoints=("create", "status"),
+                 reply: Optional[str] = None, prefill_per_1k: float = 0.0, decode_per_token: float = 0.0,
+                 session_create_delay: float = 0.0, seed: Optional[int] = None):
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.model_latency = model_latency or {}
+        self.longpoll = longpoll
+        self.push = push
+        self.partial = partial
+        self.reply = reply
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.fault_endpoints = set(fault_endpoints)
+        self.prefill_per_1k = prefill_per_1k  # seconds per 1000 prompt tokens
+        self.decode_per_token = decode_per_token  # seconds per reply token
+        self.session_create_delay = session_create_delay
+        self.sessions: Dict[str, List[tuple]] = {}  # session ID -> (message, reply) turns
+        self.prompts: List[Dict[str, Any]] = []  # per quest: prompt text seen, prompt and reply tokens
+        self.outage = False  # Toggle at runtime: every request fails with error_status
+        self.rng = random.Random(seed)
+        self.quests: Dict[str, FakeQuest] = {}
+        self.idempotency: Dict[str, str] = {}
+        self.script: Dict[str, List[float]] = {}  # prompt -> latencies to use instead of sampling (replay)
+        self.requests: Counter = Counter()
+        self.app = self._build_app()
+
+    def sample_latency(self, model: str) -> float:
+        mean = self.model_latency.get(model, self.latency_mean)
+        # Lognormal with the requested mean
+        mu = math.log(mean) - self.latency_sigma ** 2 / 2
+        return self.rng.lognormvariate(mu, self.latency_sigma)
+
+    def create_quest(self, model: str, message: str, session_id: str = "", history_count: int = 0,
+                     max_tokens: int = 0) -> FakeQuest:
+        scripted = self.script.get(message.split("] ", 1)[-1])  # Ignore the shim's date/time prefix
+        latency = scripted.pop(0) if scripted else self.sample_latency(model)
+        reply = self.reply or " ".join(REPLY_SENTENCES)
+        if self.prefill_per_1k or self.decode_per_token:
+            turns = self.sessions.setdefault(session_id, [])
+            history = turns[-history_count:] if history_count > 0 else []
+            prompt = " ".join([text for turn in history for text in turn] + [message])
+            if max_tokens:
+                reply = reply[:max_tokens * 4]
+            prompt_tokens, reply_tokens = len(prompt) // 4 + 1, len(reply) // 4 + 1
+            latency += prompt_tokens / 1000 * self.prefill_per_1k + reply_tokens * self.decode_per_token
+            turns.append((message, reply))
+            self.prompts.append({"prompt": prompt, "prompt_tokens": prompt_tokens, "reply_tokens": reply_tokens,
+                                 "session": session_id, "message": message, "history_count": history_count})
+        quest = FakeQuest(uuid.uuid4().hex, model, message, latency, self.partial, reply=reply)
+        self.quests[quest.id] = quest
+        asyncio.get_running_loop().call_at(
+            asyncio.get_running_loop().time() + (quest.done_at - time.monotonic()),
+            quest.done.set
+        )
+        return quest
+
+    async def inject_fault(self, kind: str) -> Optional[JSONResponse]:
+        """Delay and/or fail a request according to the configured fault rates"""
+        if kind not in self.fault_endpoints:
+            return None
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            self.requests[f"{kind}_slow"] += 1
+            await asyncio.sleep(self.slow_delay)
+        if self.outage or (self.error_rate and self.rng.random() < self.error_rate):
+            self.requests[f"{kind}_error"] += 1
+            return JSONResponse({"error": "injected fault"}, status_code=self.error_status)
+        return None
+
+    async def events(self, quest: FakeQuest, interval: float = 0.2):
+        """Push events for one quest: running updates (with partials if enabled), then done"""
+        yield {"status": quest.status()}
+        while not quest.done.is_set():
+            if not quest.partial:
+                await quest.done.wait()
+                break
+            try:
+                await asyncio.wait_for(quest.done.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                yield quest.payload()
+        yield quest.payload()
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="fake bike4mind")
+
+        @app.post("/api/ai/llm")
+        async def create(request: Request):
+            self.requests["create"] += 1
+            body = await request.json()
+            fault = await self.inject_fault("create")
+            if fault:
+                return fault
+            key = request.headers.get("Idempotency-Key")
+            if key and key in self.idempotency:
+                self.requests["create_deduplicated"] += 1
+                return {"quest": {"id": self.idempotency[key]}}
+            params = body.get("params", {})
+            quest = self.create_quest(params.get("model", "default"), body.get("message", ""), body.get("sessionId", ""),
+                                      body.get("historyCount", 0), params.get("max_tokens", 0))
+            if key:
+                self.idempotency[key] = quest.id
+            return {"quest": {"id": quest.id}}
+
+        @app.post("/api/sessions")
+        async def create_session():
+            self.requests["session_create"] += 1
+            await asyncio.sleep(self.session_create_delay)
+            session_id = uuid.uuid4().hex[:24]
+            self.sessions[session_id] = []
+            return {"_id": session_id}
+
+        @app.delete("/api/sessions/{session_id}")
+        async def delete_session(session_id: str):
+            self.requests["session_delete"] += 1
+            if self.sessions.pop(session_id, None) is None:
+                return JSONResponse({"error": "not found"}, status_code=404)
+            return {"deleted": session_id}
+
+        @app.get("/api/sessions/{session_id}/chat/{quest_id}")
+        async def status(session_id: str, quest_id: str, wait: int = 0):
+            fault = await self.inject_fault("status")
+            if fault:
+                return fault
+            quest = self.quests.get(quest_id)
+            if not quest:
+                return JSONResponse({"error": "not found"}, status_code=404)
+            if wait and self.longpoll:
+                self.requests["longpoll"] += 1
+                try:
+                    await asyncio.wait_for(quest.done.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                self.requests["poll"] += 1
+            return quest.payload()
+
+        @app.get("/api/sessions/{session_id}/chat/{quest_id}/events")
+        async def events(session_id: str, quest_id: str):
+            quest = self.quests.get(quest_id)
+            if not quest or not self.push:
+                return JSONResponse({"error": "not found"}, status_code=404)
+            self.requests["sse"] += 1
+
+            async def stream():
+                async for payload in self.events(quest):
+                    yield f"data: {json.dumps(payload)}\n\n"
+
+            return StreamingResponse(stream(), media_type="text/event-stream")
+
+        @app.websocket("/api/sessions/{session_id}/chat/{quest_id}/ws")
+        async def ws(websocket: WebSocket, session_id: str, quest_id: str):
+            quest = self.quests.get(quest_id)
+            if not quest or not self.push:
+                await websocket.close(code=4404)
+                return
+            self.requests["websocket"] += 1
+            await websocket.accept()
+            try:
+                async for payload in self.events(quest):
+                    await websocket.send_text(json.dumps(payload))
+                await websocket.close()
+            except WebSocketDisconnect:
+                pass
+
+        return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake bike4mind API")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=3.0, help="mean quest latency in seconds")
+    parser.add_argument("--sigma", type=float, default=0.35, help="lognormal sigma of quest latency")
+    parser.add_argument("--no-push", action="store_true", help="disable SSE/WebSocket endpoints")
+    parser.add_argument("--no-longpoll", action="store_true", help="ignore ?wait= on status GETs")
+    parser.add_argument("--partial", action="store_true", help="include partial replies while running")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-delay")
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    args = parser.parse_args()
+
+    fake = FakeB4M(args.latency, args.sigma, longpoll=not args.no_longpoll, push=not args.no_push,
+                   partial=args.partial, error_rate=args.error_rate, slow_rate=args.slow_rate,
+                   slow_delay=args.slow_delay)
+    uvicorn.run(fake.app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Home Assistant Core API behind the supervisor
+
+Serves /api/states from a synthetic entity set and records every
+/api/services/<domain>/<service> call (including tts.*) with a configurable
+latency (fixed, or lognormal with `service_sigma`). TTS calls and
+/api/tts_get_url additionally take `tts_seconds_per_word` to render the
+message, like Piper. Point EXTROVERT_HA_URL at http://127.0.0.1:<port>/api.
+
+With `speech_words_per_sec`, TTS and media_player.play_media calls also
+play on their media player: it goes to "playing" after `playback_start_delay`
+and back to "idle" when the speech is over (a new call cuts the previous
+one off). State changes are sent to /api/websocket subscribers as
+state_changed events, together with `noise_per_sec` sensor updates, and
+every playback is kept in `playbacks`.
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+
+ROOMS = ["kitchen", "living room", "office", "bedroom", "guest room", "garage", "hallway", "bathroom",
+         "dining room", "basement", "attic", "porch", "patio", "laundry", "nursery", "den"]
+FIXTURES = {
+    "light": ["ceiling light", "lamp", "desk lamp", "strip light", "pendant", "spotlight", "sconce"],
+    "switch": ["plug", "heater switch", "coffee maker", "outlet", "fountain switch"],
+    "fan": ["fan", "ceiling fan", "exhaust fan"],
+    "cover": ["blinds", "shade", "curtain", "garage door"],
+    "lock": ["door lock", "deadbolt"],
+    "sensor": ["temperature", "humidity", "illuminance", "power"],
+}
+
+
+def synthetic_states(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Deterministic set of `count` entities spread over rooms and fixtures"""
+    rng = random.Random(seed)
+    states = []
+    seen = set()
+    while len(states) < count:
+        domain = rng.choice(list(FIXTURES))
+        room = rng.choice(ROOMS)
+        fixture = rng.choice(FIXTURES[domain])
+        suffix = "" if rng.random() < 0.5 else f" {rng.randint(1, 99)}"
+        friendly = f"{room} {fixture}{suffix}".title()
+        entity_id = f"{domain}.{friendly.lower().replace(' ', '_')}"
+        if entity_id in seen:
+            continue
+        seen.add(entity_id)
+        states.append({"entity_id": entity_id, "state": "off", "attributes": {"friendly_name": friendly}})
+    return states
+
+
+class FakeHA:
+    """In-process fake HA API; service calls are kept in `calls`"""
+
+    def __init__(self, entities: int = 200, service_latency: float = 0.05,
+                 states: Optional[List[Dict[str, Any]]] = None, seed: int = 0, service_sigma: float = 0.0,
+                 tts_seconds_per_word: float = 0.0, speech_words_per_sec: float = 0.0,
+                 playback_start_delay: float = 0.3, noise_per_sec: float = 0.0):
+        self.states = states if states is not None else synthetic_states(entities, seed)
+        self.service_latency = service_latency
+        self.service_sigma = service_sigma
+        self.tts_seconds_per_word = tts_seconds_per_word
+        self.rendered: Dict[str, str] = {}  # tts_get_url URL -> message
+        self.speech_words_per_sec = speech_words_per_sec
+        self.playback_start_delay = playback_start_delay
+        self.noise_per_sec = noise_per_sec
+        self.player_states: Dict[str, str] = {}
+        self.player_tasks: Dict[str, asyncio.Task] = {}
+        self.playbacks: List[Dict[str, Any]] = []  # entity_id, message, started, ended, interrupted
+        self.subscribers: List[asyncio.Queue] = []
+        self.noise_task: Optional[asyncio.Task] = None
+        self.rng = random.Random(seed)
+        self.calls: List[Dict[str, Any]] = []
+        self.requests: Counter = Counter()
+        self.app = self._build_app()
+
+    def render_time(self, data: Dict[str, Any]) -> float:
+        return len(str(data.get("message", "")).split()) * self.tts_seconds_per_word
+
+    def sample_latency(self) -> float:
+        if not self.service_sigma:
+            return self.service_latency
+        # Lognormal with the requested mean
+        mu = math.log(self.service_latency) - self.service_sigma ** 2 / 2
+        return self.rng.lognormvariate(mu, self.service_sigma)
+
+    def set_state(self, entity_id: str, state: str):
+        old = self.player_states.get(entity_id, "idle")
+        self.player_states[entity_id] = state
+        self.publish(entity_id, old, state)
+
+    def publish(self, entity_id: str, old: str, new: str):
+        event = {"event_type": "state_changed", "data": {
+            "entity_id": entity_id,
+            "old_state": {"entity_id": entity_id, "state": old, "attributes": {}},
+            "new_state": {"entity_id": entity_id, "state": new, "attributes": {}},
+        }, "origin": "LOCAL", "time_fired": time.time()}
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    def play(self, entity_id: Optional[str], message: str):
+        """Speak `message` on `entity_id`, cutting off whatever it is playing"""
+        if not entity_id or not self.speech_words_per_sec:
+            return
+        previous = self.player_tasks.get(entity_id)
+        if previous and not previous.done():
+            previous.cancel()
+        self.player_tasks[entity_id] = asyncio.create_task(self._playback(entity_id, message))
+
+    async def _playback(self, entity_id: str, message: str):
+        record = {"entity_id": entity_id, "message": message, "started": None, "ended": None,
+                  "interrupted": False}
+        self.playbacks.append(record)
+        try:
+            await asyncio.sleep(self.playback_start_delay)
+            record["started"] = time.monotonic()
+            self.set_state(entity_id, "playing")
+            await asyncio.sleep(len(message.split()) / self.speech_words_per_sec)
+        except asyncio.CancelledError:
+            record["interrupted"] = True
+            raise
+        finally:
+            record["ended"] = time.monotonic()
+            if self.player_tasks.get(entity_id) is asyncio.current_task():
+                self.set_state(entity_id, "idle")
+
+    async def _noise(self):
+        """Sensor updates, which make up most of a real state_changed stream"""
+        while True:
+            await asyncio.sleep(1 / self.noise_per_sec)
+            entity = self.rng.choice(self.states)
+            if not entity["entity_id"].startswith("media_player."):
+                self.publish(entity["entity_id"], "20.0", f"{self.rng.uniform(18, 24):.1f}")
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="fake Home Assistant")
+
+        @app.websocket("/api/websocket")
+        async def websocket_api(websocket: WebSocket):
+            await websocket.accept()
+            self.requests["websocket"] += 1
+            await websocket.send_json({"type": "auth_required", "ha_version": "2024.1.0"})
+            auth = await websocket.receive_json()
+            if not auth.get("access_token"):
+                await websocket.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+                await websocket.close()
+                return
+            await websocket.send_json({"type": "auth_ok", "ha_version": "2024.1.0"})
+            queue: asyncio.Queue = asyncio.Queue()
+            forward = None
+            try:
+                subscribe = await websocket.receive_json()
+                await websocket.send_json({"id": subscribe["id"], "type": "result", "success": True, "result": None})
+
+                async def send_events():
+                    while True:
+                        event = await queue.get()
+                        await websocket.send_json({"id": subscribe["id"], "type": "event", "event": event})
+
+                self.subscribers.append(queue)
+                forward = asyncio.create_task(send_events())
+                if self.noise_per_sec and self.noise_task is None:
+                    self.noise_task = asyncio.create_task(self._noise())
+                while True:
+                    await websocket.receive_text()  # Further commands are ignored; returns on disconnect
+            except WebSocketDisconnect:
+                pass
+            finally:
+                if forward:
+                    forward.cancel()
+                if queue in self.subscribers:
+                    self.subscribers.remove(queue)
+                if not self.subscribers and self.noise_task:
+                    self.noise_task.cancel()
+                    self.noise_task = None
+
+        @app.get("/api/states")
+        async def states():
+            self.requests["states"] += 1
+            return self.states
+
+        @app.post("/api/services/{domain}/{service}")
+        async def call_service(domain: str, service: str, request: Request):
+            self.requests[f"{domain}.{service}"] += 1
+            received = time.monotonic()
+            data = await request.json()
+            await asyncio.sleep(self.sample_latency() + (self.render_time(data) if domain == "tts" else 0))
+            if domain == "tts":
+                self.play(data.get("media_player_entity_id") or data.get("entity_id"), data.get("message", ""))
+            elif (domain, service) == ("media_player", "play_media"):
+                self.play(data.get("entity_id"), self.rendered.get(data.get("media_content_id"), ""))
+            self.calls.append({
+                "domain": domain,
+                "service": service,
+                "data": data,
+                "received": received,
+                "finished": time.monotonic(),
+            })
+            return []
+
+        @app.post("/api/tts_get_url")
+        async def tts_get_url(request: Request):
+            self.requests["tts_get_url"] += 1
+            data = await request.json()
+            await asyncio.sleep(self.sample_latency() + self.render_time(data))
+            path = f"/api/tts_proxy/{len(self.rendered)}.mp3"
+            self.rendered[f"http://127.0.0.1{path}"] = data.get("message", "")
+            return {"url": f"http://127.0.0.1{path}", "path": path}
+
+        return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Home Assistant API")
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--entities", type=int, default=200)
+    parser.add_argument("--service-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    uvicorn.run(FakeHA(args.entities, args.service_latency).app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,118 @@
+"""
+Shared helpers for the benchmark scripts
+
+The add-on reads its configuration from the environment at import time, so
+`load_app()` sets the variables first and then imports app.py from the
+repository root. `spawn_app()` runs it in a separate uvicorn process instead,
+so its latency and memory aren't mixed up with the load generator's.
+"""
+
+import asyncio
+import importlib
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def app_env(b4m_base: str, **env: str) -> Dict[str, str]:
+    defaults = {
+        "B4M_API_KEY": "bench-key",
+        "HA_B4M_SESSION_ID": "bench-session",
+        "B4M_USER_ID": "bench-user",
+        "B4M_BASE": b4m_base,
+        "EXTROVERT_HA_TOKEN": "bench-token",
+    }
+    defaults.update(env)
+    return defaults
+
+
+def load_app(b4m_base: str, **env: str):
+    """Import app.py configured against a local fake bike4mind"""
+    os.environ.update(app_env(b4m_base, **env))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    if "app" in sys.modules:
+        return importlib.reload(sys.modules["app"])
+    return importlib.import_module("app")
+
+
+async def spawn_app(b4m_base: str, port: int, workers: int = 1, **env: str) -> subprocess.Popen:
+    """Run app.py under uvicorn in a child process and wait until /healthz answers"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--workers", str(workers)],
+        cwd=REPO_ROOT, env={**os.environ, **app_env(b4m_base, **env)}
+    )
+    deadline = time.monotonic() + 30
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"app exited with code {process.returncode}")
+            try:
+                if (await client.get(f"http://127.0.0.1:{port}/healthz")).status_code == 200:
+                    return process
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("app did not start within 30s")
+
+
+def stop_app(process: subprocess.Popen):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def rss_bytes(pid: Optional[int] = None) -> int:
+    """Resident set size of a process (Linux /proc), 0 if unavailable"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+
+
+async def serve(asgi_app, port: int):
+    """Start an ASGI app with uvicorn on the running loop; stop with `await shutdown(server)`"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning"))
+    server.task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def shutdown(server):
+    server.should_exit = True
+    await server.task
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Load test: throughput, latency, upstream amplification and memory per endpoint
+
+Starts the fake bike4mind and fake Home Assistant in this process and the
+add-on in a child uvicorn process (VISUAL_ASSIST and EXTROVERT enabled), then
+runs closed-loop load for each scenario:
+
+  chat         POST /v1/chat/completions
+  chat_stream  POST /v1/chat/completions with stream=true (also time to first delta)
+  extrovert    POST /v1/extrovert/trigger with wait=true, one media player per request
+  ws           chat load with --ws-clients VISUAL_ASSIST /ws clients connected
+               (also the spread between first and last client receiving a broadcast)
+
+Each scenario reports throughput, p50/p95/p99 latency, bike4mind and HA
+requests per shim request and the add-on's RSS. Results are written as JSON;
+with --baseline, throughput and p95 are compared against an earlier run and
+the exit code is 1 if either regressed by more than --tolerance.
+
+    python bench/loadtest.py --duration 20 --concurrency 20 --json results-1.4.13.json
+    python bench/loadtest.py --baseline results-1.4.13.json --env POLL_INTERVAL_MS=800
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+import httpx
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from fake_ha import FakeHA  # noqa: E402
+from harness import rss_bytes, serve, shutdown, spawn_app, stop_app, summarize  # noqa: E402
+
+SCENARIOS = ["chat", "chat_stream", "extrovert", "ws"]
+PROMPTS = ["what's the temperature in the kitchen", "is the garage door open", "summarize today's calendar",
+           "how much power did the dryer use", "remind me what the weather is tomorrow"]
+
+
+async def chat(client: httpx.AsyncClient, base: str, n: int) -> Dict[str, Any]:
+    body = {"messages": [{"role": "user", "content": f"{PROMPTS[n % len(PROMPTS)]} ({n})"}]}
+    response = await client.post(f"{base}/v1/chat/completions", json=body)
+    return {"status": response.status_code}
+
+
+async def chat_stream(client: httpx.AsyncClient, base: str, n: int) -> Dict[str, Any]:
+    body = {"messages": [{"role": "user", "content": f"{PROMPTS[n % len(PROMPTS)]} ({n})"}], "stream": True}
+    started = time.monotonic()
+    first = None
+    async with client.stream("POST", f"{base}/v1/chat/completions", json=body) as response:
+        async for line in response.aiter_lines():
+            if first is None and line.startswith("data: ") and '"content"' in line:
+                first = time.monotonic() - started
+    return {"status": response.status_code, "ttfb": first}
+
+
+async def extrovert(client: httpx.AsyncClient, base: str, n: int) -> Dict[str, Any]:
+    body = {"prompt": f"Announce that the laundry is done ({n})", "wait": True,
+            "tts_config": {"media_player": f"media_player.bench_{n}"}}
+    response = await client.post(f"{base}/v1/extrovert/trigger", json=body)
+    return {"status": response.status_code}
+
+
+async def ws_client(url: str, received: List[float], connected: asyncio.Event, stop: asyncio.Event):
+    async with websockets.connect(url) as ws:
+        connected.set()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(ws.recv(), timeout=0.2)
+                received.append(time.monotonic())
+            except asyncio.TimeoutError:
+                continue
+
+
+async def drive(request: Callable, client: httpx.AsyncClient, base: str,
+                duration: float, concurrency: int) -> tuple:
+    """Closed loop: `concurrency` workers send back-to-back requests for `duration` seconds"""
+    results: List[Dict[str, Any]] = []
+    counter = iter(range(10 ** 9))
+    deadline = time.monotonic() + duration
+
+    async def worker():
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            try:
+                result = await request(client, base, next(counter))
+            except httpx.HTTPError as e:
+                result = {"status": type(e).__name__}
+            result["latency"] = time.monotonic() - started
+            results.append(result)
+
+    started = time.monotonic()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.monotonic() - started
+
+
+async def sample_rss(pid: int, samples: List[int], stop: asyncio.Event):
+    while not stop.is_set():
+        samples.append(rss_bytes(pid))
+        await asyncio.sleep(0.25)
+
+
+async def run_scenario(name: str, args, client: httpx.AsyncClient, base: str, pid: int,
+                       fake: FakeB4M, ha: FakeHA) -> Dict[str, Any]:
+    request = {"chat": chat, "chat_stream": chat_stream, "extrovert": extrovert, "ws": chat}[name]
+    b4m_before = sum(fake.requests.values())
+    ha_before = sum(ha.requests.values())
+    rss_start = rss_bytes(pid)
+    rss_samples: List[int] = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_rss(pid, rss_samples, stop))
+
+    ws_received: List[List[float]] = []
+    ws_tasks = []
+    if name == "ws":
+        ws_url = base.replace("http://", "ws://") + "/ws"
+        for _ in range(args.ws_clients):
+            received: List[float] = []
+            connected = asyncio.Event()
+            ws_received.append(received)
+            ws_tasks.append(asyncio.create_task(ws_client(ws_url, received, connected, stop)))
+            await connected.wait()
+
+    results, elapsed = await drive(request, client, base, args.duration, args.concurrency)
+    stop.set()
+    await asyncio.gather(sampler, *ws_tasks)
+
+    statuses = Counter(str(r["status"]) for r in results)
+    ok = [r for r in results if r["status"] in (200, 202)]
+    row: Dict[str, Any] = {
+        "requests": len(results),
+        "ok": len(ok),
+        "status_codes": dict(statuses),
+        "duration_s": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "latency_s": summarize([r["latency"] for r in ok]),
+        "b4m_requests_per_request": (sum(fake.requests.values()) - b4m_before) / max(len(results), 1),
+        "ha_requests_per_request": (sum(ha.requests.values()) - ha_before) / max(len(results), 1),
+        "rss_mb": {"start": rss_start / 2 ** 20, "peak": max(rss_samples, default=0) / 2 ** 20,
+                   "end": rss_bytes(pid) / 2 ** 20},
+    }
+    if name == "chat_stream":
+        row["ttfb_s"] = summarize([r["ttfb"] for r in ok if r.get("ttfb") is not None])
+    if name == "ws":
+        # Broadcasts reach every client in the same order, so message k is the same broadcast everywhere
+        delivered = min((len(r) for r in ws_received), default=0)
+        spreads = [max(r[k] for r in ws_received) - min(r[k] for r in ws_received) for k in range(delivered)]
+        row["ws_clients"] = args.ws_clients
+        row["ws_messages_per_client"] = delivered
+        row["ws_fanout_spread_ms"] = summarize([s * 1000 for s in spreads])
+    return row
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> bool:
+    """Print changes against a previous run; True if something regressed beyond tolerance"""
+    regressed = False
+    print(f"\ncompared with {baseline.get('version', '?')} ({baseline.get('timestamp', '?')}):")
+    for name, row in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        throughput = row["throughput_rps"] / old["throughput_rps"] - 1 if old["throughput_rps"] else 0.0
+        p95 = row["latency_s"]["p95"] / old["latency_s"]["p95"] - 1 if old["latency_s"]["p95"] else 0.0
+        flag = throughput < -tolerance or p95 > tolerance
+        regressed |= flag
+        print(f"{name:>12}: throughput {throughput:+.1%}  p95 {p95:+.1%}{'  REGRESSION' if flag else ''}")
+    return regressed
+
+
+async def main(args) -> int:
+    fake = FakeB4M(latency_mean=args.b4m_latency, latency_sigma=args.b4m_sigma, partial=True, seed=11)
+    ha = FakeHA(entities=50, service_latency=args.ha_latency, service_sigma=args.ha_sigma, seed=11)
+    fake_server = await serve(fake.app, args.fake_port)
+    ha_server = await serve(ha.app, args.ha_port)
+    env = {
+        "LOG_LEVEL": "warning",
+        "VISUAL_ASSIST_ENABLED": "true",
+        "VISUAL_ASSIST_THINKING_GIF_URL": "http://127.0.0.1/thinking.gif",
+        "VISUAL_ASSIST_SPEAKING_GIF_URL": "http://127.0.0.1/speaking.gif",
+        "VISUAL_ASSIST_IDLE_GIF_URL": "http://127.0.0.1/idle.gif",
+        "EXTROVERT_ENABLED": "true",
+        "EXTROVERT_HA_URL": f"http://127.0.0.1:{args.ha_port}/api",
+        "EXTROVERT_RATE_LIMIT": "1000000",
+    }
+    env.update(item.split("=", 1) for item in args.env)
+    process = await spawn_app(f"http://127.0.0.1:{args.fake_port}/api", args.port, **env)
+    base = f"http://127.0.0.1:{args.port}"
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        version = (await client.get(f"{base}/openapi.json")).json()["info"]["version"]
+        results: Dict[str, Any] = {
+            "version": version,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": vars(args),
+            "scenarios": {},
+        }
+        for name in args.scenarios:
+            row = await run_scenario(name, args, client, base, process.pid, fake, ha)
+            results["scenarios"][name] = row
+            lat = row["latency_s"]
+            extra = ""
+            if "ttfb_s" in row:
+                extra = f" | ttfb p50 {row['ttfb_s']['p50']:.2f}s"
+            if "ws_fanout_spread_ms" in row:
+                extra = f" | ws fan-out p95 {row['ws_fanout_spread_ms']['p95']:.1f} ms to {row['ws_clients']} clients"
+            print(f"{name:>12}: {row['throughput_rps']:6.1f} req/s  p50 {lat['p50']:.2f}s  p95 {lat['p95']:.2f}s  "
+                  f"p99 {lat['p99']:.2f}s | ok {row['ok']}/{row['requests']} | b4m x{row['b4m_requests_per_request']:.1f} "
+                  f"ha x{row['ha_requests_per_request']:.1f} | rss peak {row['rss_mb']['peak']:.0f} MB{extra}")
+
+    stop_app(process)
+    await shutdown(ha_server)
+    await shutdown(fake_server)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            return 1 if compare(results, json.load(f), args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load per scenario")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent clients")
+    parser.add_argument("--ws-clients", type=int, default=50, help="VISUAL_ASSIST clients in the ws scenario")
+    parser.add_argument("--b4m-latency", type=float, default=2.0, help="mean quest latency in seconds")
+    parser.add_argument("--b4m-sigma", type=float, default=0.35, help="lognormal sigma of quest latency")
+    parser.add_argument("--ha-latency", type=float, default=0.1, help="mean HA service call latency in seconds")
+    parser.add_argument("--ha-sigma", type=float, default=0.3, help="lognormal sigma of HA latency (0 = fixed)")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="extra add-on settings")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=8962)
+    parser.add_argument("--fake-port", type=int, default=8960)
+    parser.add_argument("--ha-port", type=int, default=8961)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Journal replay: compare polling settings on recorded bike4mind traffic
+
+Reads a quest journal (QUEST_JOURNAL_PATH, plus its rotated `.1` segment),
+estimates each quest's true completion time from its poll timeline (midway
+between the last "running" and the first "done" observation) and replays the
+quests against the fake bike4mind with the recorded arrival times and
+latencies. Each config is `mode[:poll_interval_ms[:poll_max_interval_ms]]`;
+the report shows completion lag (quest done -> shim has the reply) and status
+requests per quest, as in bench_completion.py.
+
+    python bench/replay_journal.py /data/quest_journal.jsonl --configs poll:1500:5000 poll:500:3000 adaptive
+    python bench/replay_journal.py /tmp/journal.jsonl --record 40   # record synthetic traffic first
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_b4m import FakeB4M  # noqa: E402
+from harness import load_app, serve, shutdown, summarize  # noqa: E402
+
+
+def load_quests(app, path: str) -> List[Dict[str, Any]]:
+    """Recorded quests with arrival offset and estimated completion latency, oldest first"""
+    quests: Dict[str, Dict[str, Any]] = {}
+    for record in app.QuestJournal.read(f"{path}.1") + app.QuestJournal.read(path):
+        quest = quests.get(record["q"])
+        if record["e"] == "create":
+            quests[record["q"]] = {"created": record["t"], "prompt": record.get("prompt", ""),
+                                   "model": record.get("model"), "running": record["t"], "done": None}
+        elif quest is None:
+            continue
+        elif record["e"] == "poll" and record.get("status") == "running":
+            quest["running"] = max(quest["running"], record["t"])
+        elif record["e"] in ("poll", "done") and quest["done"] is None and record.get("status", "done") == "done":
+            quest["done"] = record["t"]
+    finished = sorted((q for q in quests.values() if q["done"]), key=lambda q: q["created"])
+    if not finished:
+        return []
+    start = finished[0]["created"]
+    for quest in finished:
+        quest["offset"] = quest["created"] - start
+        quest["latency"] = max((quest["running"] + quest["done"]) / 2 - quest["created"], 0.05)
+    return finished
+
+
+async def record(app, fake: FakeB4M, path: str, count: int, interval: float):
+    """Write a journal of synthetic quests (fake latencies) to replay"""
+    app.quest_journal = app.QuestJournal(path, 8 * 1024 * 1024)
+    app.quest_journal.start()
+
+    async def one(i: int):
+        await asyncio.sleep(i * interval)
+        quest_id = await app.create_b4m_quest(f"recorded prompt {i}")
+        await app.poll_b4m_quest(quest_id)
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+    app.quest_journal.stop()
+    app.quest_journal = None
+    print(f"recorded {count} quests to {path}")
+
+
+async def replay(app, fake: FakeB4M, quests: List[Dict[str, Any]], config: str, speed: float):
+    mode, *intervals = config.split(":")
+    app.POLL_INTERVAL_MS = int(intervals[0]) if intervals else 1500
+    app.POLL_MAX_INTERVAL_MS = int(intervals[1]) if len(intervals) > 1 else 5000
+    app.quest_completion = app.QuestCompletionEngine(mode)
+    fake.script = {}
+    for i, quest in enumerate(quests):
+        fake.script[f"replay {i}"] = [quest["latency"]]
+    lags = []
+    polls_before = fake.requests["poll"]
+
+    async def one(i: int, quest: Dict[str, Any]):
+        await asyncio.sleep(quest["offset"] / speed)
+        quest_id = await app.create_b4m_quest(f"replay {i}")
+        await app.poll_b4m_quest(quest_id)
+        lags.append(time.monotonic() - fake.quests[quest_id].done_at)
+
+    await asyncio.gather(*(one(i, quest) for i, quest in enumerate(quests)))
+    result = summarize(lags)
+    result["status_requests_per_quest"] = (fake.requests["poll"] - polls_before) / len(quests)
+    return result
+
+
+async def main(args):
+    fake = FakeB4M(latency_mean=args.latency, latency_sigma=0.35, seed=3, push=False, longpoll=False)
+    app = load_app(f"http://127.0.0.1:{args.port}/api", LOG_LEVEL="warning", QUEST_JOURNAL_PATH="")
+    server = await serve(fake.app, args.port)
+    app.http_client = app.httpx.AsyncClient(timeout=app.httpx.Timeout(15.0, connect=5.0))
+
+    if args.record:
+        await record(app, fake, args.journal, args.record, args.record_interval)
+    quests = load_quests(app, args.journal)
+    if not quests:
+        print(f"no finished quests in {args.journal}")
+    else:
+        latencies = [q["latency"] for q in quests]
+        span = quests[-1]["offset"]
+        print(f"replaying {len(quests)} quests over {span / args.speed:.1f}s "
+              f"(latency p50 {summarize(latencies)['p50']:.2f}s, max {max(latencies):.2f}s)")
+
+    results = {}
+    for config in args.configs if quests else []:
+        results[config] = await replay(app, fake, quests, config, args.speed)
+        r = results[config]
+        print(f"{config:>18}: lag p50 {r['p50'] * 1000:7.1f} ms  p95 {r['p95'] * 1000:7.1f} ms  "
+              f"status requests/quest {r['status_requests_per_quest']:.1f}")
+
+    await app.http_client.aclose()
+    await shutdown(server)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("journal", help="journal file (its .1 segment is read too)")
+    parser.add_argument("--configs", nargs="+", default=["poll:1500:5000", "poll:500:3000", "adaptive"])
+    parser.add_argument("--speed", type=float, default=1.0, help="replay arrivals N times faster")
+    parser.add_argument("--port", type=int, default=8941)
+    parser.add_argument("--record", type=int, default=0, help="first record N synthetic quests to the journal")
+    parser.add_argument("--record-interval", type=float, default=0.5, help="seconds between recorded quests")
+    parser.add_argument("--latency", type=float, default=3.0, help="mean latency of recorded quests")
+    parser.add_argument("--json", help="write results to this file")
+    asyncio.run(main(parser.parse_args()))
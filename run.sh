@@ -8,9 +8,48 @@ export SHIM_API_KEY=$(bashio::config 'shim_api_key')
 export B4M_MODEL=$(bashio::config 'b4m_model')
 export SESSION_TTL_SEC=$(bashio::config 'session_ttl_sec')
 export MAX_TURNS=$(bashio::config 'max_turns')
+export SESSION_MAX_ENTRIES=$(bashio::config 'session_max_entries')
+if bashio::config.true 'session_snapshot_enabled'; then
+    export SESSION_SNAPSHOT_PATH="/data/shim_sessions.json"
+fi
+export SESSION_POOL_SIZE=$(bashio::config 'session_pool_size')
+export SESSION_POOL_DELETE_RETIRED=$(bashio::config 'session_pool_delete_retired')
+export CONTEXT_MODE=$(bashio::config 'context_mode')
+export CONTEXT_TOKEN_BUDGET=$(bashio::config 'context_token_budget')
+if bashio::config.true 'quest_journal_enabled'; then
+    export QUEST_JOURNAL_PATH="/data/quest_journal.jsonl"
+    export QUEST_JOURNAL_MAX_MB=$(bashio::config 'quest_journal_max_mb')
+fi
 export TIMEOUT_MS=$(bashio::config 'timeout_ms')
 export POLL_INTERVAL_MS=$(bashio::config 'poll_interval_ms')
 export POLL_MAX_INTERVAL_MS=$(bashio::config 'poll_max_interval_ms')
+export QUEST_COMPLETION_MODE=$(bashio::config 'quest_completion_mode')
+export QUEST_EVENTS_URL=$(bashio::config 'quest_events_url')
+export STREAM_PARTIAL_REPLIES=$(bashio::config 'stream_partial_replies')
+export SPECULATIVE_QUESTS=$(bashio::config 'speculative_quests')
+export QUEST_POLL_RATE=$(bashio::config 'quest_poll_rate')
+export QUEST_POLL_CONCURRENCY=$(bashio::config 'quest_poll_concurrency')
+export RESPONSE_CACHE_ENABLED=$(bashio::config 'response_cache_enabled')
+export RESPONSE_CACHE_TTL_SEC=$(bashio::config 'response_cache_ttl_sec')
+export RESPONSE_CACHE_MAX_ENTRIES=$(bashio::config 'response_cache_max_entries')
+export INTENT_FASTPATH_ENABLED=$(bashio::config 'intent_fastpath_enabled')
+export INTENT_MIN_CONFIDENCE=$(bashio::config 'intent_min_confidence')
+export B4M_HTTP2=$(bashio::config 'b4m_http2')
+export B4M_POOL_SIZE=$(bashio::config 'b4m_pool_size')
+export HA_POOL_SIZE=$(bashio::config 'ha_pool_size')
+export B4M_KEEPALIVE_SEC=$(bashio::config 'upstream_keepalive_sec')
+export HA_KEEPALIVE_SEC=$(bashio::config 'upstream_keepalive_sec')
+export B4M_RETRIES=$(bashio::config 'b4m_retries')
+export B4M_HEDGE_ENABLED=$(bashio::config 'b4m_hedge_enabled')
+export B4M_BREAKER_ERROR_RATE=$(bashio::config 'b4m_breaker_error_rate')
+export B4M_BREAKER_COOLDOWN_SEC=$(bashio::config 'b4m_breaker_cooldown_sec')
+export B4M_FALLBACK_REPLY=$(bashio::config 'b4m_fallback_reply')
+export WORKERS=$(bashio::config 'workers')
+export SHARED_STATE_PATH="/data/b4m_shared_state.db"
+export LOG_LEVEL=$(bashio::config 'log_level')
+export LOG_FORMAT=$(bashio::config 'log_format')
+export LOG_MODULE_LEVELS=$(bashio::config 'log_module_levels')
+export LOG_POLL_SAMPLE=$(bashio::config 'log_poll_sample')
 export B4M_BASE=$(bashio::config 'b4m_base')
 export HA_TOOL_FUNCTION_NAME=$(bashio::config 'ha_tool_function_name')
 
@@ -20,6 +59,9 @@ if bashio::config.true 'visual_assist_enabled'; then
     export VISUAL_ASSIST_THINKING_GIF_URL=$(bashio::config 'visual_assist_thinking_gif_url')
     export VISUAL_ASSIST_SPEAKING_GIF_URL=$(bashio::config 'visual_assist_speaking_gif_url')
     export VISUAL_ASSIST_IDLE_GIF_URL=$(bashio::config 'visual_assist_idle_gif_url')
+    export VISUAL_ASSIST_ASSET_CACHE=$(bashio::config 'visual_assist_asset_cache')
+    export VISUAL_ASSIST_ASSET_DIR="/data/visual_assets"
+    export VISUAL_ASSIST_MEDIA_PLAYERS=$(bashio::config 'visual_assist_media_players')
 
     # Validate URLs are non-empty
     if [ -z "$VISUAL_ASSIST_THINKING_GIF_URL" ] || [ -z "$VISUAL_ASSIST_SPEAKING_GIF_URL" ] || [ -z "$VISUAL_ASSIST_IDLE_GIF_URL" ]; then
@@ -42,6 +84,11 @@ if bashio::config.true 'extrovert_enabled'; then
     export EXTROVERT_RATE_LIMIT=$(bashio::config 'extrovert_rate_limit')
     export EXTROVERT_TTS_ENTITY_ID=$(bashio::config 'extrovert_tts_entity_id')
     export EXTROVERT_TTS_VOICE=$(bashio::config 'extrovert_tts_voice')
+    export EXTROVERT_QUEUE_SIZE=$(bashio::config 'extrovert_queue_size')
+    export EXTROVERT_CONCURRENCY=$(bashio::config 'extrovert_concurrency')
+    export EXTROVERT_TTS_PIPELINE=$(bashio::config 'extrovert_tts_pipeline')
+    export EXTROVERT_SCHEDULE_STAGGER_SEC=$(bashio::config 'extrovert_schedule_stagger_sec')
+    export EXTROVERT_SCHEDULE_PATH="/data/extrovert_schedules.json"
 
     bashio::log.info "EXTROVERT enabled - Rate limit: ${EXTROVERT_RATE_LIMIT} requests per hour"
     bashio::log.info "EXTROVERT TTS entity: ${EXTROVERT_TTS_ENTITY_ID}"
@@ -54,6 +101,9 @@ else
     export EXTROVERT_ENABLED=false
 fi
 
+# Media player states over the Home Assistant WebSocket API (VISUAL_ASSIST idle, EXTROVERT playback)
+export HA_PLAYBACK_EVENTS=$(bashio::config 'ha_playback_events')
+
 # Validate required configuration
 if [ -z "$B4M_API_KEY" ]; then
     bashio::log.fatal "b4m_api_key is required"